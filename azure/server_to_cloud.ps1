@@ -35,12 +35,29 @@ Write-Host "Bundling necessary files..." -ForegroundColor Yellow
 # Copy Core Files
 Copy-Item "azure/Dockerfile"          -Destination "$tempDir/Dockerfile"
 Copy-Item "upload_vids.py"      -Destination "$tempDir/upload_vids.py"
+Copy-Item "transcription.py"    -Destination "$tempDir/transcription.py"
+Copy-Item "pipeline.py"         -Destination "$tempDir/pipeline.py"
+Copy-Item "metadata_cache.py"   -Destination "$tempDir/metadata_cache.py"
+Copy-Item "metadata_engine.py"  -Destination "$tempDir/metadata_engine.py"
+Copy-Item "youtube_upload.py"   -Destination "$tempDir/youtube_upload.py"
+Copy-Item "youtube_client.py"   -Destination "$tempDir/youtube_client.py"
+Copy-Item "retry.py"            -Destination "$tempDir/retry.py"
+Copy-Item "instrumentation.py"  -Destination "$tempDir/instrumentation.py"
+Copy-Item "job_ledger.py"       -Destination "$tempDir/job_ledger.py"
+Copy-Item "schedule_planner.py" -Destination "$tempDir/schedule_planner.py"
+Copy-Item "dedup.py"            -Destination "$tempDir/dedup.py"
+Copy-Item "media_prep.py"       -Destination "$tempDir/media_prep.py"
+Copy-Item "watch_daemon.py"     -Destination "$tempDir/watch_daemon.py"
+Copy-Item "channels.py"         -Destination "$tempDir/channels.py"
 Copy-Item "requirements.txt"    -Destination "$tempDir/requirements.txt"
 
 # Copy Auth & Initial State
 # We copy state here, but the server logic decides whether to use it (to prevent overwriting progress)
 Copy-Item "client_secrets.json" -Destination "$tempDir/client_secrets.json"
 Copy-Item "token.json"          -Destination "$tempDir/token.json"
+# Several channels: the channel list and one token per channel
+Copy-Item "token_*.json"        -Destination "$tempDir"
+if (Test-Path "channels.json") { Copy-Item "channels.json" -Destination "$tempDir/channels.json" }
 Copy-Item "schedule_state.json" -Destination "$tempDir/schedule_state.json"
 
 # 3. Upload to Azure
@@ -56,7 +73,7 @@ Write-Host "Building and Configuring on VM..." -ForegroundColor Yellow
 
 $commands = @(
     # A. Setup Persistent Data Folder (If not exists)
-    "mkdir -p ~/scheduler_data/videos",
+    "mkdir -p ~/scheduler_data/videos ~/scheduler_data/cache ~/scheduler_data/quarantine ~/scheduler_data/reports ~/scheduler_data/ledger ~/scheduler_data/duplicates ~/scheduler_data/prepared",
 
     # B. Smart State Handling
     # If state file doesn't exist on server, copy the one we just uploaded.
@@ -72,11 +89,12 @@ $commands = @(
 
     # E. Run New Container
     # Note the Volume Mounts: We map the PERSISTENT data folder, not the build folder.
-    "sudo docker run -d --name scheduler --restart unless-stopped -e OLLAMA_HOST=http://172.17.0.1:11434 -v /etc/timezone:/etc/timezone:ro -v /etc/localtime:/etc/localtime:ro -v ~/scheduler_data/videos:/app/videos -v ~/scheduler_data/schedule_state.json:/app/schedule_state.json youtube-scheduler"
+    # The stop timeout lets uploads in flight finish on a redeploy; the health endpoint is only reachable from the VM.
+    "sudo docker run -d --name scheduler --restart unless-stopped --stop-timeout 300 -p 127.0.0.1:8080:8080 -e OLLAMA_HOST=http://172.17.0.1:11434 -v /etc/timezone:/etc/timezone:ro -v /etc/localtime:/etc/localtime:ro -v ~/scheduler_data/videos:/app/videos -v ~/scheduler_data/schedule_state.json:/app/schedule_state.json -v ~/scheduler_data/cache:/app/cache -e METADATA_CACHE_FILE=/app/cache/metadata_cache.sqlite3 -v ~/scheduler_data/quarantine:/app/quarantine -v ~/scheduler_data/reports:/app/reports -v ~/scheduler_data/ledger:/app/ledger -e JOB_LEDGER_FILE=/app/ledger/jobs.sqlite3 -v ~/scheduler_data/duplicates:/app/duplicates -v ~/scheduler_data/prepared:/app/prepared youtube-scheduler"
 )
 
 ssh -i $keyPath ${remoteUser}@${vmIp} ($commands -join " && ")
 
 # 5. Cleanup Local Temp
 Remove-Item -Recurse -Force $tempDir
-Write-Host "✅ Scheduler Deployed! Running at 11 PM CEST." -ForegroundColor Green
\ No newline at end of file
+Write-Host "✅ Scheduler Deployed! Watching for new videos." -ForegroundColor Green
\ No newline at end of file
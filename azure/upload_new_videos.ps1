@@ -1,3 +1,6 @@
+# Optional channel name (see channels.json): the videos go to that channel's folder
+param([string]$Channel = "")
+
 # Load .env file
 $envPath = "azure/.env"
 if (Test-Path $envPath) {
@@ -19,7 +22,8 @@ $keyPath = "azure/${KEY_NAME}.pem"
 $remoteUser = $VM_USERNAME
 
 # Command to just upload new videos without restarting anything
-scp -i $keyPath ./new_videos/* $remoteUser@$vmIp:~/scheduler_data/videos/
+$target = if ($Channel) { "~/scheduler_data/videos/$Channel/" } else { "~/scheduler_data/videos/" }
+scp -i $keyPath ./new_videos/* "${remoteUser}@${vmIp}:$target"
 
 # Delete all from new_videos folder
 Remove-Item -Path "./new_videos/*" -Recurse -Force
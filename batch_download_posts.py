@@ -1,4 +1,4 @@
-import subprocess
+import instagram_downloader
 
 VIDEO_FOLDER = "new_videos"
 
@@ -6,13 +6,18 @@ VIDEO_FOLDER = "new_videos"
 def batch_install(posts):
     print("Downloading posts...")
 
-    for post in posts:
-        print("Downloading post: " + post)
-        subprocess.run(["instaloader", f"--dirname-pattern={VIDEO_FOLDER}", "+args.txt", "--", "-" + post], check=True)
+    # One shared session for the whole batch; a failed post is reported instead of stopping the rest
+    downloader = instagram_downloader.Downloader(VIDEO_FOLDER)
+    try:
+        results = downloader.download(posts)
+    finally:
+        downloader.finish()
+    instagram_downloader.print_summary(results)
+    return results
 
 def main():
     input_posts = input("Enter posts to download separated by a comma without spaces: ").strip().split(",")
     batch_install(input_posts)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,187 @@
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-ins for the two remote services the scheduler talks to, so a benchmark run
+# exercises the real HTTP clients without a network, a channel or a GPU box.
+#   latency:   seconds added before every response (round trip to the real service)
+#   bandwidth: bytes per second the server reads request bodies at (0 = unlimited)
+
+READ_BLOCK = 64 * 1024
+
+
+class FakeService:
+    def __init__(self, handler, latency=0.0, bandwidth=0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self._server.service = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoints
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output readable
+
+    def read_body(self):
+        # Reads the request body no faster than the configured bandwidth
+        remaining = int(self.headers.get("Content-Length") or 0)
+        chunks = []
+        started = time.perf_counter()
+        received = 0
+        while remaining:
+            block = self.rfile.read(min(READ_BLOCK, remaining))
+            if not block:
+                break
+            chunks.append(block)
+            received += len(block)
+            remaining -= len(block)
+            if self.service.bandwidth:
+                ahead = received / self.service.bandwidth - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+        return b"".join(chunks)
+
+    def respond(self, status, body=None, headers=None):
+        if self.service.latency:
+            time.sleep(self.service.latency)
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if data:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _YouTubeHandler(_Handler):
+    # The resumable upload protocol as used by googleapiclient:
+    #   POST /upload/youtube/v3/videos?uploadType=resumable -> 200 + Location of the session
+    #   PUT <session> with Content-Range "bytes a-b/total"   -> 308 + Range, or 200 + video resource
+    #   PUT <session> with Content-Range "bytes */total"     -> status of the session
+    def do_POST(self):
+        self.service.count_request()
+        metadata = json.loads(self.read_body() or b"{}")
+        if not self.path.startswith("/upload/youtube/v3/videos"):
+            return self.respond(404, {"error": {"code": 404, "message": "unknown path"}})
+        total = int(self.headers.get("X-Upload-Content-Length") or 0)
+        session_id = self.service.open_session(metadata, total)
+        self.respond(200, headers={"Location": f"{self.service.url}upload/session/{session_id}"})
+
+    def do_PUT(self):
+        self.service.count_request()
+        match = re.match(r"/upload/session/(\d+)", self.path)
+        session = self.service.sessions.get(int(match.group(1))) if match else None
+        body = self.read_body()
+        if session is None:
+            return self.respond(404, {"error": {"code": 404, "message": "upload session not found"}})
+
+        content_range = self.headers.get("Content-Range", "")
+        chunk = re.match(r"bytes (\d+)-(\d+)/(\d+|\*)", content_range)
+        if chunk:
+            start = int(chunk.group(1))
+            if start == session["received"]:
+                session["received"] += len(body)
+            if chunk.group(3) != "*":
+                session["total"] = int(chunk.group(3))
+
+        if session["total"] and session["received"] >= session["total"]:
+            video = dict(session["metadata"], id=f"video{session['id']}", kind="youtube#video")
+            self.service.completed.append(video)
+            return self.respond(200, video)
+        headers = {"Range": f"bytes=0-{session['received'] - 1}"} if session["received"] else {}
+        self.respond(308, headers=headers)
+
+
+class FakeYouTube(FakeService):
+    def __init__(self, latency=0.0, bandwidth=0):
+        super().__init__(_YouTubeHandler, latency, bandwidth)
+        self.sessions = {}
+        self.completed = []
+        self._ids = itertools.count(1)
+
+    def open_session(self, metadata, total):
+        with self._lock:
+            session_id = next(self._ids)
+            self.sessions[session_id] = {"id": session_id, "metadata": metadata, "total": total, "received": 0}
+        return session_id
+
+    def discovery_document(self):
+        # The bundled YouTube discovery document, pointed at this server
+        from googleapiclient.discovery_cache import get_static_doc
+
+        document = json.loads(get_static_doc("youtube", "v3"))
+        document["rootUrl"] = self.url
+        document["baseUrl"] = f"{self.url}{document['servicePath']}"
+        return document
+
+
+class _OllamaHandler(_Handler):
+    def do_POST(self):
+        self.service.count_request()
+        request = json.loads(self.read_body() or b"{}")
+        if self.path == "/api/chat":
+            prompt = request["messages"][-1]["content"]
+            if self.service.generation_time:
+                time.sleep(self.service.generation_time)
+            content = json.dumps({
+                "title": f"You NEED to see this #{self.service.requests}",
+                "description": f"Everything you missed in {len(prompt)} characters.",
+            })
+            return self.respond(200, {
+                "model": request.get("model"), "created_at": _now(), "done": True, "done_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            })
+        if self.path == "/api/generate":
+            # release(): unload the model, nothing to generate
+            return self.respond(200, {"model": request.get("model"), "created_at": _now(), "response": "", "done": True})
+        self.respond(404, {"error": "unknown path"})
+
+
+class FakeOllama(FakeService):
+    # generation_time: seconds the "model" spends on each /api/chat answer (on top of latency)
+    def __init__(self, latency=0.0, generation_time=0.0):
+        super().__init__(_OllamaHandler, latency)
+        self.generation_time = generation_time
+
+
+def _now():
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
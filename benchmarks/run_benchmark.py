@@ -0,0 +1,253 @@
+import argparse
+import datetime
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from fake_services import FakeOllama, FakeYouTube
+from synthetic_reels import generate_reels
+
+# Configuration
+RESULTS_FOLDER = os.environ.get("BENCHMARK_RESULTS", os.path.join(BENCH_DIR, "results"))
+REELS_FOLDER = os.environ.get("BENCHMARK_REELS", os.path.join(BENCH_DIR, ".reels"))  # generated once, reused
+REGRESSION_THRESHOLD = 0.10  # relative change reported as a regression
+PERCENTILES = (50, 90, 99)
+NOISE_FLOOR = 0.05  # seconds; stages faster than this are not compared
+
+
+def percentile(values, q):
+    # Linear interpolation between the closest ranks
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def git_revision():
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    dirty = bool(git("status", "--porcelain", "--untracked-files=no"))
+    return commit, dirty
+
+def summarize(report, params):
+    commit, dirty = git_revision()
+    per_stage = {}
+    for stages in report["per_video"].values():
+        for name, stage in stages.items():
+            per_stage.setdefault(name, []).append(stage["wall_seconds"])
+
+    processed = report["videos"]["processed"]
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "params": params,
+        "videos": report["videos"],
+        "wall_seconds": report["wall_seconds"],
+        "videos_per_hour": processed / report["wall_seconds"] * 3600 if report["wall_seconds"] else 0.0,
+        "cpu_seconds": report["cpu_seconds"],
+        "peak_rss_bytes": report["peak_rss_bytes"],
+        "upload_bytes_per_second": report["stages"].get("upload", {}).get("bytes_per_second"),
+        # Per-video latency of every stage (and sub-step such as model_load or ollama)
+        "stages": {
+            name: dict({f"p{q}": percentile(values, q) for q in PERCENTILES},
+                       count=len(values), mean=sum(values) / len(values), max=max(values))
+            for name, values in sorted(per_stage.items())
+        },
+    }
+
+def run(args):
+    durations = [int(d) for d in args.durations.split(",")]
+    names = generate_reels(args.reels_dir, args.videos, durations)
+
+    workdir = tempfile.mkdtemp(prefix="reels-benchmark-")
+    try:
+        # Fresh interpreter for the measured run: clean imports, and peak memory of
+        # child processes does not include the ffmpeg encodes that generated the reels
+        settings = dict(vars(args), names=names, workdir=workdir)
+        process = multiprocessing.get_context("spawn").Process(target=run_scheduler, args=(settings,))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            print(f"Benchmark run failed (exit code {process.exitcode}).")
+            return 1
+        with open(os.path.join(workdir, "benchmark.json")) as f:
+            measured = json.load(f)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    params = dict(measured["params"], videos=args.videos, durations=durations)
+    result = summarize(measured["report"], params)
+    if measured["uploaded"] != args.videos:
+        print(f"Warning: only {measured['uploaded']} of {args.videos} videos reached the YouTube stand-in.")
+
+    path = save_result(result, args.results_dir)
+    print_result(result)
+    print(f"Saved {path}")
+
+    previous = latest_result(args.results_dir, exclude=result_key(result))
+    if previous:
+        regressions = compare(previous, result)
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+def run_scheduler(settings):
+    # Runs upload_vids.main() on the copied reels against the stand-ins (in the spawned process)
+    workdir = settings["workdir"]
+    # Scheduler modules read their configuration at import time
+    os.environ["WHISPER_MODEL_SIZE"] = settings["whisper_model"]
+    os.environ["UPLOAD_CHUNK_SIZE_MB"] = str(settings["chunk_size_mb"])
+    from google.auth.credentials import AnonymousCredentials
+
+    import instrumentation
+    import metadata_cache
+    import metadata_engine
+    import upload_vids
+    import youtube_client
+    import youtube_upload
+
+    videos = os.path.join(workdir, "videos")
+    os.makedirs(videos)
+    for name in settings["names"]:
+        shutil.copy(os.path.join(settings["reels_dir"], name), videos)  # uploaded files get deleted
+
+    upload_vids.VIDEO_FOLDER = videos
+    upload_vids.STATE_FILE = os.path.join(workdir, "schedule_state.json")
+    upload_vids.LEDGER_FILE = os.path.join(workdir, "jobs.sqlite3")
+    metadata_cache.CACHE_FILE = os.path.join(workdir, "metadata_cache.sqlite3")  # cold cache: real transcription
+    instrumentation.RUN_REPORT_FILE = os.path.join(workdir, "run_report.json")
+    instrumentation.RUN_HISTORY_FILE = os.path.join(workdir, "run_history.json")
+    instrumentation.METRICS_TEXTFILE = os.path.join(workdir, "metrics.prom")
+    youtube_upload.QUOTA_DAILY_BUDGET = 10 ** 9  # the stand-in has no quota
+
+    bandwidth = int(settings["upload_mbps"] * 1000 * 1000 / 8)
+    with FakeYouTube(settings["upload_latency"], bandwidth) as youtube, \
+            FakeOllama(settings["ollama_latency"], settings["ollama_generation"]) as ollama:
+        metadata_engine.OLLAMA_HOST = ollama.url.rstrip("/")
+        metadata_engine._engine = None
+        client = youtube_client.YouTubeClient(AnonymousCredentials(), discovery=youtube.discovery_document())
+        upload_vids.get_authenticated_service = lambda: client.service
+        upload_vids.main(["run"])
+        uploaded = len(youtube.completed)
+
+    with open(instrumentation.RUN_REPORT_FILE) as f:
+        report = json.load(f)
+    params = {
+        "whisper_model": settings["whisper_model"],
+        "transcribe_workers": os.environ.get("TRANSCRIBE_WORKERS", "0"),
+        "upload_workers": youtube_upload.UPLOAD_WORKERS,
+        "chunk_size_mb": settings["chunk_size_mb"],
+        "upload_latency": settings["upload_latency"],
+        "upload_mbps": settings["upload_mbps"],
+        "ollama_latency": settings["ollama_latency"],
+        "ollama_generation": settings["ollama_generation"],
+    }
+    with open(os.path.join(workdir, "benchmark.json"), "w") as f:
+        json.dump({"report": report, "uploaded": uploaded, "params": params}, f)
+
+def result_key(result):
+    return result["commit"] + ("-dirty" if result["dirty"] else "")
+
+def save_result(result, folder):
+    # One file per commit, so `git log` order and the results line up
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{result_key(result)}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+def load_result(reference, folder):
+    path = reference if os.path.exists(reference) else os.path.join(folder, f"{reference}.json")
+    with open(path) as f:
+        return json.load(f)
+
+def latest_result(folder, exclude=None):
+    results = []
+    for path in glob.glob(os.path.join(folder, "*.json")):
+        with open(path) as f:
+            result = json.load(f)
+        if result_key(result) != exclude:
+            results.append(result)
+    return max(results, key=lambda result: result["created_at"], default=None)
+
+def print_result(result):
+    print(f"\nCommit {result_key(result)}: {result['videos']['processed']} videos in {result['wall_seconds']:.1f}s "
+          f"-> {result['videos_per_hour']:.1f} videos/hour")
+    rss = result["peak_rss_bytes"]
+    print(f"Peak RSS: {rss['self'] / 2**20:.0f} MiB (scheduler), {rss['children'] / 2**20:.0f} MiB (largest child)")
+    if result["upload_bytes_per_second"]:
+        print(f"Upload: {result['upload_bytes_per_second'] * 8 / 1e6:.1f} Mbit/s")
+    print(f"{'stage':<14}" + "".join(f"{'p' + str(q):>9}" for q in PERCENTILES) + f"{'max':>9}")
+    for name, stage in result["stages"].items():
+        print(f"{name:<14}" + "".join(f"{stage['p' + str(q)]:>8.2f}s" for q in PERCENTILES) + f"{stage['max']:>8.2f}s")
+
+def compare(base, head, threshold=REGRESSION_THRESHOLD):
+    # Prints the relative change of every headline number; returns the ones that got worse than the threshold
+    print(f"\nCompared with {result_key(base)} ({base['created_at']}):")
+    if base["params"] != head["params"]:
+        print("  Note: the runs used different parameters.")
+    rows = [("videos/hour", base["videos_per_hour"], head["videos_per_hour"], True)]
+    rows.append(("peak RSS (MiB)", base["peak_rss_bytes"]["self"] / 2**20, head["peak_rss_bytes"]["self"] / 2**20, False))
+    for name, stage in head["stages"].items():
+        for q in ("p50", "p90"):
+            if name in base["stages"] and max(base["stages"][name][q], stage[q]) >= NOISE_FLOOR:
+                rows.append((f"{name} {q} (s)", base["stages"][name][q], stage[q], False))
+
+    regressions = []
+    for label, before, after, higher_is_better in rows:
+        if not before:
+            continue
+        change = (after - before) / before
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > threshold else ""
+        if flag:
+            regressions.append(label)
+        print(f"  {label:<22} {before:>12.2f} -> {after:>12.2f} ({change:+.1%}){flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the upload scheduler.")
+    parser.add_argument("--results-dir", default=RESULTS_FOLDER)
+    commands = parser.add_subparsers(dest="command")
+
+    run_parser = commands.add_parser("run", help="run the benchmark (default)")
+    run_parser.add_argument("--videos", type=int, default=6)
+    run_parser.add_argument("--durations", default="15,30,60", help="reel lengths in seconds, cycled")
+    run_parser.add_argument("--whisper-model", default=os.environ.get("WHISPER_MODEL_SIZE", "base"),
+                            help="model size or local model directory")
+    run_parser.add_argument("--chunk-size-mb", type=int, default=8)
+    run_parser.add_argument("--upload-latency", type=float, default=0.05, help="seconds per YouTube request")
+    run_parser.add_argument("--upload-mbps", type=float, default=50, help="upload bandwidth (0 = unlimited)")
+    run_parser.add_argument("--ollama-latency", type=float, default=0.01, help="seconds per Ollama request")
+    run_parser.add_argument("--ollama-generation", type=float, default=1.5, help="seconds to 'generate' an answer")
+    run_parser.add_argument("--reels-dir", default=REELS_FOLDER)
+    run_parser.add_argument("--fail-on-regression", action="store_true")
+
+    compare_parser = commands.add_parser("compare", help="compare two stored results (commit or file)")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        return 1 if compare(load_result(args.base, args.results_dir), load_result(args.head, args.results_dir)) else 0
+    if args.command is None:
+        args = parser.parse_args(["--results-dir", args.results_dir, "run"])
+    return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import os
+import shutil
+import subprocess
+import tempfile
+
+# Synthetic reels for benchmarks: vertical 720x1280 H.264 video with an AAC audio track.
+# With espeak-ng (or espeak) installed the audio is real synthesized speech, so Whisper has words
+# to decode; otherwise it is a speech-like signal (a pitch-gliding voiced tone cut into syllables and pauses).
+
+SENTENCES = [
+    "Stop scrolling for a second, because this trick will change how you clean your phone.",
+    "Most people never notice this, but your keyboard has more bacteria than a toilet seat.",
+    "Here is the fastest way to fall asleep, and it only takes about two minutes.",
+    "You have been cutting onions wrong your whole life, so let me show you the right way.",
+    "This tiny habit saves you an hour every single day, and almost nobody knows about it.",
+]
+
+SPEECH_LIKE = (
+    # voiced tone whose pitch glides like intonation, with ~4 syllables per second and phrase pauses
+    "0.4*sin(2*PI*(130+{seed}+25*sin(2*PI*0.6*t))*t)"
+    "*(0.55+0.45*sin(2*PI*(3.7+0.{seed})*t))"
+    "*gt(sin(2*PI*0.23*t+{seed}),-0.5)"
+)
+
+
+def speech_engine():
+    return shutil.which("espeak-ng") or shutil.which("espeak")
+
+def ffmpeg_binary():
+    # Same binary the scheduler uses
+    import transcription
+
+    return transcription.FFMPEG_BINARY
+
+def generate_reel(path, duration, seed=0, ffmpeg=None, speech=None):
+    ffmpeg = ffmpeg or ffmpeg_binary()
+    video = ["-f", "lavfi", "-i", f"testsrc2=size=720x1280:rate=30:duration={duration}"]
+    with tempfile.TemporaryDirectory() as temp:
+        if speech:
+            speech_file = os.path.join(temp, "speech.wav")
+            text = " ".join(SENTENCES[(seed + i) % len(SENTENCES)] for i in range(len(SENTENCES)))
+            subprocess.run([speech, "-w", speech_file, text], check=True, capture_output=True)
+            # Loop the speech to fill the reel
+            audio = ["-stream_loop", "-1", "-i", speech_file]
+        else:
+            audio = ["-f", "lavfi", "-i", f"aevalsrc='{SPEECH_LIKE.format(seed=seed % 10)}':s=44100:d={duration}"]
+        command = [
+            ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+            *video, *audio,
+            "-map", "0:v", "-map", "1:a", "-t", str(duration),
+            "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-b:a", "128k", "-shortest",
+            path,
+        ]
+        subprocess.run(command, check=True, capture_output=True)
+    return path
+
+def generate_reels(folder, count, durations, ffmpeg=None, speech=None):
+    # Reels are named after their parameters and reused when they already exist
+    os.makedirs(folder, exist_ok=True)
+    speech = speech if speech is not None else speech_engine()
+    kind = "speech" if speech else "tone"
+    names = []
+    for index in range(count):
+        duration = durations[index % len(durations)]
+        name = f"reel_{index:03d}_{duration}s_{kind}.mp4"
+        path = os.path.join(folder, name)
+        if not os.path.exists(path):
+            print(f"Generating {name}...")
+            generate_reel(path, duration, index, ffmpeg, speech)
+        names.append(name)
+    return names
@@ -0,0 +1,281 @@
+# Several YouTube channels served by one process. Each channel has its own token file, input folder, job ledger
+# (schedule, upload sessions, duplicate index), quota budget and publish slots, while Whisper, the Ollama model,
+# the metadata cache and the prepared-video cache are shared. Channels take turns, a few videos at a time,
+# so a channel with a large backlog cannot hold up the others.
+
+import argparse
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+
+import dedup
+import instrumentation
+import job_ledger
+import retry
+import schedule_planner
+import upload_vids
+import youtube_client
+import youtube_upload
+
+# Configuration
+# JSON list of channels, e.g. [{"name": "science"}, {"name": "cooking", "quota_budget": 3200}].
+# Without this file there is a single channel configured by the environment, as before.
+CHANNELS_FILE = os.environ.get("CHANNELS_FILE", "channels.json")
+# Videos a channel uploads per turn while another channel is waiting
+CHANNEL_BATCH_SIZE = int(os.environ.get("CHANNEL_BATCH_SIZE", "2"))
+
+CHANNEL_NAME = re.compile(r"^[A-Za-z0-9_-]+$")  # used in file and folder names
+CHANNEL_FIELDS = ("name", "videos", "token_file", "ledger_file", "quota_budget", "publish_slots", "blackout_dates",
+                  "timezone")
+
+_active_lock = threading.Lock()
+
+class Channel:
+    # Where one channel keeps its files, and its settings. name=None is the single-channel setup of the
+    # environment (videos/, token.json, jobs.sqlite3), which only switches the folder when `videos` is given.
+    def __init__(self, name=None, videos=None, token_file=None, ledger_file=None, quota_budget=None,
+                 publish_slots=None, blackout_dates=None, timezone=None):
+        if name is not None and not CHANNEL_NAME.match(name):
+            raise ValueError(f"Invalid channel name {name!r}, use letters, digits, - and _")
+        self.name = name
+        if name is None:
+            self.videos = videos or upload_vids.VIDEO_FOLDER
+            self._own_folder = videos is not None
+            return
+        # Defaults sit next to the single-channel files: videos/<name>/, token_<name>.json, jobs_<name>.sqlite3
+        self.videos = videos or os.path.join(upload_vids.VIDEO_FOLDER, name)
+        self.token_file = token_file or suffixed(youtube_client.TOKEN_FILE, name)
+        self.ledger_file = ledger_file or suffixed(job_ledger.LEDGER_FILE, name)
+        self.quota_budget = youtube_upload.QUOTA_DAILY_BUDGET if quota_budget is None else int(quota_budget)
+        self.publish_slots = publish_slots or schedule_planner.PUBLISH_SLOTS
+        self.blackout_dates = schedule_planner.BLACKOUT_DATES if blackout_dates is None else blackout_dates
+        self.timezone = timezone or schedule_planner.SCHEDULE_TIMEZONE
+        self.quarantine_folder = os.path.join(retry.QUARANTINE_FOLDER, name)
+        self.duplicate_folder = os.path.join(dedup.DUPLICATE_FOLDER, name)
+        # Run report, ETA history and Prometheus textfile: reports/run_report_<name>.json and so on
+        self.report_file = suffixed(instrumentation.RUN_REPORT_FILE, name)
+        self.history_file = suffixed(instrumentation.RUN_HISTORY_FILE, name)
+        self.metrics_file = suffixed(instrumentation.METRICS_TEXTFILE, name)
+        schedule_planner.parse_slots(self.publish_slots)  # a typo fails at start-up, not at the first upload
+
+    @property
+    def label(self):
+        return self.name or "default"
+
+    def settings(self):
+        # The module settings that make up a channel
+        if self.name is None:
+            return [(upload_vids, "VIDEO_FOLDER", self.videos)] if self._own_folder else []
+        return [
+            (upload_vids, "VIDEO_FOLDER", self.videos),
+            (upload_vids, "LEDGER_FILE", self.ledger_file),
+            (upload_vids, "STATE_FILE", ""),  # schedule_state.json belongs to the single-channel setup
+            (youtube_upload, "QUOTA_DAILY_BUDGET", self.quota_budget),
+            (schedule_planner, "PUBLISH_SLOTS", self.publish_slots),
+            (schedule_planner, "BLACKOUT_DATES", self.blackout_dates),
+            (schedule_planner, "SCHEDULE_TIMEZONE", self.timezone),
+            (retry, "QUARANTINE_FOLDER", self.quarantine_folder),
+            (dedup, "DUPLICATE_FOLDER", self.duplicate_folder),
+            (instrumentation, "RUN_REPORT_FILE", self.report_file),
+            (instrumentation, "RUN_HISTORY_FILE", self.history_file),
+            (instrumentation, "METRICS_TEXTFILE", self.metrics_file),
+            (instrumentation, "METRIC_LABELS", {"channel": self.name}),
+        ]
+
+    @contextlib.contextmanager
+    def activate(self):
+        # Points upload_vids and the modules it uses at this channel for the duration of a batch.
+        # One channel is active at a time; the settings are restored afterwards.
+        if not self.settings():
+            yield self
+            return
+        with _active_lock:
+            saved = [(module, attribute, getattr(module, attribute)) for module, attribute, _ in self.settings()]
+            try:
+                for module, attribute, value in self.settings():
+                    setattr(module, attribute, value)
+                yield self
+            finally:
+                for module, attribute, value in saved:
+                    setattr(module, attribute, value)
+
+    def youtube(self):
+        # The channel's own credentials (the single-channel setup uses token.json)
+        return upload_vids.get_authenticated_service(None if self.name is None else self.token_file)
+
+    def queued_videos(self):
+        with self.activate():
+            return upload_vids.queued_videos()
+
+def suffixed(path, name):
+    root, extension = os.path.splitext(path)
+    return f"{root}_{name}{extension}"
+
+def load_channels(path=None):
+    # The channels of CHANNELS_FILE, or the single channel of the environment when there is no such file
+    path = path or CHANNELS_FILE
+    if not os.path.exists(path):
+        return [Channel()]
+    with open(path) as f:
+        entries = json.load(f)
+    if not entries:
+        raise ValueError(f"{path} lists no channels")
+    channels = []
+    for entry in entries:
+        unknown = set(entry) - set(CHANNEL_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown channel fields in {path}: {', '.join(sorted(unknown))}")
+        if "quota_budget" not in entry:
+            # One Google Cloud project (client_secrets.json) has one quota, split evenly by default
+            entry = dict(entry, quota_budget=youtube_upload.QUOTA_DAILY_BUDGET // len(entries))
+        channels.append(Channel(**entry))
+    names = [channel.name for channel in channels]
+    if len(set(names)) != len(names):
+        raise ValueError(f"{path} lists a channel twice")
+    for channel in channels:
+        os.makedirs(channel.videos, exist_ok=True)
+    return channels
+
+def find_channel(channels, name):
+    for channel in channels:
+        if channel.label == name:
+            return channel
+    raise ValueError(f"No channel named {name!r} (channels: {', '.join(channel.label for channel in channels)})")
+
+class RoundRobin:
+    # Per-channel queues served in turns. A turn is at most `batch_size` videos of one channel while another
+    # channel has videos waiting (all of them otherwise), and the channel that went last goes to the back.
+    def __init__(self, channels, batch_size=None):
+        self.channels = list(channels)
+        self.batch_size = batch_size or CHANNEL_BATCH_SIZE
+        self.queues = {channel.label: [] for channel in self.channels}
+        self._next = 0
+
+    def add(self, channel, names):
+        queue = self.queues[channel.label]
+        for name in names:
+            if name not in queue:
+                queue.append(name)
+
+    def drop(self, channel):
+        # The rest of this channel's queue (e.g. out of quota); picked up again by a later scan
+        dropped, self.queues[channel.label] = self.queues[channel.label], []
+        return dropped
+
+    def queued(self, channel=None):
+        if channel is not None:
+            return len(self.queues[channel.label])
+        return sum(len(queue) for queue in self.queues.values())
+
+    def next_turn(self):
+        # (channel, videos) of the next turn, or None when every queue is empty
+        for offset in range(len(self.channels)):
+            index = (self._next + offset) % len(self.channels)
+            channel = self.channels[index]
+            queue = self.queues[channel.label]
+            if not queue:
+                continue
+            self._next = index + 1
+            waiting = any(other for label, other in self.queues.items() if label != channel.label)
+            size = self.batch_size if waiting else len(queue)
+            turn, self.queues[channel.label] = queue[:size], queue[size:]
+            return channel, turn
+        return None
+
+def has_quota(channel):
+    # Checked per turn, so a channel out of quota does not take turns from the others
+    with channel.activate():
+        return upload_vids.get_quota_ledger().remaining() >= youtube_upload.QUOTA_INSERT_COST
+
+def run(channels, batch_size=None, stop_event=None):
+    # One pass over every channel's queue, in turns; the models stay loaded from the first turn to the last
+    schedule = RoundRobin(channels, batch_size)
+    for channel in channels:
+        schedule.add(channel, channel.queued_videos())
+    print(f"Found {schedule.queued()} videos in {len(channels)} channels: "
+          + ", ".join(f"{channel.label} {schedule.queued(channel)}" for channel in channels))
+    services, processed = {}, {channel.label: 0 for channel in channels}
+    try:
+        while not (stop_event and stop_event.is_set()):
+            turn = schedule.next_turn()
+            if turn is None:
+                break
+            channel, videos = turn
+            if not has_quota(channel):
+                left = len(videos) + len(schedule.drop(channel))
+                print(f"[{channel.label}] Daily quota used up, {left} videos wait for tomorrow.")
+                continue
+            print(f"[{channel.label}] Turn: {len(videos)} videos, {schedule.queued(channel)} more queued.")
+            if channel.label not in services:
+                services[channel.label] = channel.youtube()
+            with channel.activate():
+                done = upload_vids.upload_batch(services[channel.label], videos, keep_warm=True, stop_event=stop_event,
+                                                verify_timeout=0)  # checked once; waiting would hold up the others
+            processed[channel.label] += len(done)
+    finally:
+        upload_vids.release_warm_models()
+    wait_for_verification(channels, services, stop_event)
+    print("Uploaded: " + ", ".join(f"{label} {count}" for label, count in processed.items()))
+    return processed
+
+def wait_for_verification(channels, services, stop_event=None):
+    # Once every turn is done: waits for YouTube to process the uploads of all channels together, like a
+    # single-channel run does, for at most VERIFY_TIMEOUT_SECONDS. What is left is checked again next run.
+    deadline = time.monotonic() + youtube_upload.VERIFY_TIMEOUT
+    delay = youtube_upload.VERIFY_POLL_DELAY
+    while not (stop_event and stop_event.is_set()):
+        waiting = 0
+        for channel in channels:
+            if channel.label in services:
+                with channel.activate():
+                    waiting += upload_vids.verify_pending(services[channel.label], stop_event)
+        if not waiting or time.monotonic() + delay > deadline:
+            return
+        if stop_event:
+            stop_event.wait(delay)
+        else:
+            time.sleep(delay)
+        delay = min(delay * 2, youtube_upload.VERIFY_MAX_POLL_DELAY)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upload the queues of several YouTube channels from one process.")
+    parser.add_argument("--file", default=None, help=f"channel list (default: {CHANNELS_FILE})")
+    parser.add_argument("--channel", default=None, help="only this channel")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.add_parser("list", help="show the channels and where their files are")
+    commands.add_parser("status", help="upload_vids.py status for every channel")
+    commands.add_parser("login", help="log in with the channel's Google account (needs --channel)")
+    commands.add_parser("run", help="upload every channel's queue, taking turns (default)")
+    args = parser.parse_args(argv)
+
+    channels = load_channels(args.file)
+    if args.channel:
+        channels = [find_channel(channels, args.channel)]
+
+    if args.command == "list":
+        for channel in channels:
+            if channel.name is None:
+                print(f"default: {channel.videos}/ (no {args.file or CHANNELS_FILE}, single channel)")
+                continue
+            print(f"{channel.label}: {channel.videos}/, {channel.token_file}, {channel.ledger_file}, "
+                  f"{channel.quota_budget} quota units, slots {channel.publish_slots} ({channel.timezone})")
+    elif args.command == "status":
+        for channel in channels:
+            print(f"== {channel.label} ==")
+            with channel.activate():
+                upload_vids.show_status()
+    elif args.command == "login":
+        if len(channels) != 1:
+            parser.error("login needs --channel")
+        channel = channels[0]
+        token_file = None if channel.name is None else channel.token_file
+        youtube_client.login(token_file=token_file)
+        print(f"Success! {token_file or youtube_client.TOKEN_FILE} has been created.")
+    else:
+        run(channels)
+
+if __name__ == "__main__":
+    main()
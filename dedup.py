@@ -0,0 +1,296 @@
+import argparse
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+
+import job_ledger
+import metadata_cache
+import transcription
+
+# Configuration
+# skip: set duplicates aside without uploading them, flag: only report them, off: no duplicate check
+DEDUP_MODE = os.environ.get("DEDUP_MODE", "skip")
+DUPLICATE_FOLDER = os.environ.get("DUPLICATE_FOLDER", "duplicates")
+# Mean differing bits (of 64) between the sampled frames of two copies of the same video
+DEDUP_VIDEO_DISTANCE = float(os.environ.get("DEDUP_VIDEO_DISTANCE", "10"))
+# Share of differing audio fingerprint bits; unrelated audio sits around 0.5
+DEDUP_AUDIO_DISTANCE = float(os.environ.get("DEDUP_AUDIO_DISTANCE", "0.35"))
+
+FRAME_INTERVAL = 2  # seconds between sampled frames
+FRAME_COUNT = 8
+FLAT_CONTRAST = 10  # black or single-colour frames (fades, title cards) say nothing about the video
+AUDIO_SECONDS = 30
+AUDIO_FRAME = 2048  # samples per spectrum, at transcription.SAMPLE_RATE
+AUDIO_HOP = 256
+AUDIO_MAX_SHIFT = 16  # hops; encoders add a little silence at the start
+AUDIO_MIN_FRAMES = 64
+KEY_BANDS = 4  # every frame hash is indexed as 4 x 16 bits, so copies within 3 bits share at least one key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    content_hash TEXT PRIMARY KEY,
+    name TEXT,
+    youtube_id TEXT,
+    uploaded INTEGER NOT NULL DEFAULT 0,
+    frames BLOB NOT NULL,
+    audio BLOB NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS frame_keys (
+    band INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (band, value, content_hash)
+) WITHOUT ROWID;
+"""
+
+def dhash(pixels):
+    # 9x8 grayscale frame -> 64 bits: is each pixel brighter than its left neighbour. 0 for flat frames.
+    import numpy as np
+
+    if isinstance(pixels, bytes):
+        pixels = np.frombuffer(pixels, dtype=np.uint8)
+    pixels = np.asarray(pixels, dtype=np.int16).reshape(8, 9)
+    if pixels.max() - pixels.min() < FLAT_CONTRAST:
+        return 0
+    return int.from_bytes(np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes(), "big")
+
+def extract_frames(video_path):
+    # A few frames at fixed times, scaled down to 9x8 grayscale by ffmpeg itself
+    command = [
+        transcription.FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-i", video_path,
+        "-map", "0:v:0?", "-vf", f"fps=1/{FRAME_INTERVAL},scale=9:8:flags=area,format=gray",
+        "-frames:v", str(FRAME_COUNT), "-f", "rawvideo", "-",
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        error = result.stderr.decode(errors="replace").strip()
+        if "does not contain any stream" in error:
+            return []
+        raise RuntimeError(f"ffmpeg could not extract frames from {video_path}: {error}")
+    data = result.stdout
+    return [data[start:start + 72] for start in range(0, len(data) - 71, 72)]
+
+def audio_fingerprint(audio):
+    # Haitsma-Kalker style: 32 bits per hop, the sign of the energy difference between neighbouring
+    # bands, compared with the hop before. Survives re-encoding, volume changes and a little noise.
+    import numpy as np
+
+    audio = np.asarray(audio[:AUDIO_SECONDS * transcription.SAMPLE_RATE], dtype=np.float32)
+    if len(audio) < AUDIO_FRAME + AUDIO_HOP or np.abs(audio).max() < 1e-3:
+        return np.zeros(0, dtype=np.uint32)  # no (audible) audio track
+    count = 1 + (len(audio) - AUDIO_FRAME) // AUDIO_HOP
+    windows = np.lib.stride_tricks.sliding_window_view(audio, AUDIO_FRAME)[::AUDIO_HOP][:count]
+    power = np.abs(np.fft.rfft(windows * np.hanning(AUDIO_FRAME).astype(np.float32), axis=1)) ** 2
+    frequencies = np.fft.rfftfreq(AUDIO_FRAME, 1 / transcription.SAMPLE_RATE)
+    edges = np.geomspace(300, 2000, 34)
+    bands = np.stack([power[:, (frequencies >= low) & (frequencies < high)].sum(axis=1)
+                      for low, high in zip(edges[:-1], edges[1:])], axis=1)
+    slopes = bands[:, :-1] - bands[:, 1:]
+    bits = slopes[1:] - slopes[:-1] > 0
+    return np.packbits(bits, axis=1).view(">u4").ravel().astype(np.uint32)
+
+class Fingerprint:
+    def __init__(self, frames, audio):
+        import numpy as np
+
+        self.frames = np.asarray(frames, dtype=np.uint64)  # one dHash per sampled frame
+        self.audio = np.asarray(audio, dtype=np.uint32)  # one sub-fingerprint per audio hop
+
+    @classmethod
+    def of(cls, video_path, audio):
+        # `audio` is the 16 kHz PCM the pipeline already decoded for Whisper, or a function returning it.
+        # Frames first: a file ffmpeg cannot read fails before its audio is decoded.
+        frames = [dhash(frame) for frame in extract_frames(video_path)]
+        return cls(frames, audio_fingerprint(audio() if callable(audio) else audio))
+
+    def keys(self):
+        # (band, value) pairs for the near-neighbour index
+        return {(band, (int(frame) >> (16 * band)) & 0xFFFF)
+                for frame in self.frames if frame for band in range(KEY_BANDS)}
+
+def _differing_bits(a, b):
+    import numpy as np
+
+    return np.unpackbits(np.bitwise_xor(a, b).view(np.uint8)).reshape(len(a), -1).sum(axis=1)
+
+def video_distance(a, b):
+    # Mean differing bits over the frames both videos have content at; None when they cannot be compared
+    count = min(len(a.frames), len(b.frames))
+    usable = (a.frames[:count] != 0) & (b.frames[:count] != 0)
+    if usable.sum() < 2:
+        return None
+    return float(_differing_bits(a.frames[:count][usable], b.frames[:count][usable]).mean())
+
+def audio_distance(a, b):
+    # Bit error rate at the best alignment; None without enough audio on both sides
+    best = None
+    for shift in range(-AUDIO_MAX_SHIFT, AUDIO_MAX_SHIFT + 1):
+        x, y = (a.audio[shift:], b.audio) if shift >= 0 else (a.audio, b.audio[-shift:])
+        count = min(len(x), len(y))
+        if count < AUDIO_MIN_FRAMES:
+            continue
+        errors = float(_differing_bits(x[:count], y[:count]).sum()) / (32 * count)
+        best = errors if best is None else min(best, errors)
+    return best
+
+class Match:
+    # An earlier video that looks like this one. Same frames and same audio (or no audio to compare)
+    # is a duplicate; same frames with different audio is only similar (a new voice-over or song).
+    # Audio alone never matches: many reels share the same trending sound.
+    def __init__(self, content_hash, name, youtube_id, video=None, audio=None, exact=False):
+        self.content_hash = content_hash
+        self.name = name
+        self.youtube_id = youtube_id
+        self.video = video
+        self.audio = audio
+        self.exact = exact
+
+    @property
+    def duplicate(self):
+        return self.exact or self.audio is None or self.audio <= DEDUP_AUDIO_DISTANCE
+
+    def describe(self):
+        if self.exact:
+            return "identical file"
+        audio = "no audio to compare" if self.audio is None else f"audio {self.audio:.0%} different"
+        return f"frames {self.video:.1f}/64 bits apart, {audio}"
+
+class FingerprintIndex:
+    # Fingerprints of every video seen, keyed by content hash, with the frame hashes split into
+    # 16-bit keys so a lookup only compares against the few videos sharing a key.
+    # Matches count against uploaded videos and the ones claimed earlier in the same run.
+    # Lives next to the jobs in the ledger file.
+    def __init__(self, path=None):
+        self.path = path or job_ledger.LEDGER_FILE
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._claimed = set()  # content hashes of this run
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def get(self, content_hash):
+        import numpy as np
+
+        with self._lock:
+            row = self._db.execute("SELECT frames, audio FROM videos WHERE content_hash = ?", (content_hash,)).fetchone()
+        if row is None:
+            return None
+        return Fingerprint(np.frombuffer(row[0], dtype=np.uint64), np.frombuffer(row[1], dtype=np.uint32))
+
+    def fingerprint(self, content_hash, video_path, audio, store=True):
+        # Fingerprints are stored per content hash, so a video that comes back (failed upload, quota) is not decoded again.
+        # `audio` may be a function, only called when the fingerprint is not stored yet.
+        fingerprint = self.get(content_hash)
+        if fingerprint is None:
+            fingerprint = Fingerprint.of(video_path, audio)
+            if store:
+                self.add(content_hash, os.path.basename(video_path), fingerprint)
+        return fingerprint
+
+    def add(self, content_hash, name, fingerprint):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO videos (content_hash, name, frames, audio, added_at) VALUES (?, ?, ?, ?, ?)",
+                (content_hash, name, fingerprint.frames.tobytes(), fingerprint.audio.tobytes(), time.time()),
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO frame_keys VALUES (?, ?, ?)",
+                [(band, value, content_hash) for band, value in fingerprint.keys()],
+            )
+
+    def _counts(self, content_hash, uploaded):
+        return bool(uploaded) or content_hash in self._claimed
+
+    def match(self, content_hash, fingerprint=None):
+        # Closest uploaded (or claimed) video, or None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT name, youtube_id, uploaded FROM videos WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+            if row and self._counts(content_hash, row[2]):
+                return Match(content_hash, row[0], row[1], exact=True)
+            if fingerprint is None:
+                return None
+            candidates = set()
+            for band, value in fingerprint.keys():
+                candidates.update(other for (other,) in self._db.execute(
+                    "SELECT content_hash FROM frame_keys WHERE band = ? AND value = ? AND content_hash != ?",
+                    (band, value, content_hash),
+                ))
+            rows = [self._db.execute("SELECT content_hash, name, youtube_id, uploaded FROM videos WHERE content_hash = ?",
+                                     (candidate,)).fetchone() for candidate in candidates]
+        best = None
+        for other_hash, name, youtube_id, uploaded in rows:
+            if not self._counts(other_hash, uploaded):
+                continue
+            other = self.get(other_hash)
+            distance = video_distance(fingerprint, other)
+            if distance is None or distance > DEDUP_VIDEO_DISTANCE:
+                continue
+            match = Match(other_hash, name, youtube_id, video=distance, audio=audio_distance(fingerprint, other))
+            # Duplicates before merely similar videos, then the closest frames
+            if best is None or (match.duplicate, -match.video) > (best.duplicate, -best.video):
+                best = match
+        return best
+
+    def claim(self, content_hash):
+        # Later videos of the same run are checked against this one as well
+        with self._lock:
+            self._claimed.add(content_hash)
+
+    def mark_uploaded(self, content_hash, youtube_id):
+        with self._lock, self._db:
+            self._db.execute("UPDATE videos SET uploaded = 1, youtube_id = ? WHERE content_hash = ?",
+                             (youtube_id, content_hash))
+
+    def forget_upload(self, content_hash):
+        # YouTube rejected the upload, so the video is queued again instead of counting as its own duplicate
+        with self._lock, self._db:
+            self._db.execute("UPDATE videos SET uploaded = 0, youtube_id = NULL WHERE content_hash = ?", (content_hash,))
+
+    def stats(self):
+        with self._lock:
+            videos, uploaded = self._db.execute("SELECT COUNT(*), COALESCE(SUM(uploaded), 0) FROM videos").fetchone()
+            keys = self._db.execute("SELECT COUNT(*) FROM frame_keys").fetchone()[0]
+        return {"videos": videos, "uploaded": uploaded, "keys": keys}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the duplicate index or check videos against it.")
+    parser.add_argument("--file", default=None, help=f"ledger file holding the index (default: {job_ledger.LEDGER_FILE})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="show how many videos are indexed")
+    check_parser = commands.add_parser("check", help="look up videos without adding them to the index")
+    check_parser.add_argument("videos", nargs="+")
+    args = parser.parse_args(argv)
+
+    with FingerprintIndex(args.file) as index:
+        if args.command == "stats":
+            stats = index.stats()
+            print(f"Index file: {index.path}")
+            print(f"Videos: {stats['videos']} ({stats['uploaded']} uploaded)")
+            print(f"Frame keys: {stats['keys']}")
+        elif args.command == "check":
+            for video in args.videos:
+                digest = metadata_cache.content_hash(video)
+                match = index.match(digest, index.get(digest) or Fingerprint.of(video, transcription.extract_audio(video)))
+                if match is None:
+                    print(f"{video}: no match")
+                else:
+                    kind = "duplicate of" if match.duplicate else "similar to"
+                    print(f"{video}: {kind} {match.name} ({match.youtube_id}), {match.describe()}")
+
+if __name__ == "__main__":
+    main()
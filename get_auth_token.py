@@ -1,18 +1,10 @@
-from google_auth_oauthlib.flow import InstalledAppFlow
 
-# Scopes needed for upload
-SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
+import youtube_client
 
 def main():
-    flow = InstalledAppFlow.from_client_secrets_file(
-        "client_secrets.json", SCOPES
-    )
-    creds = flow.run_local_server(port=0)
-    
-    # Save the credentials for the next run
-    with open("token.json", "w") as token:
-        token.write(creds.to_json())
-    print("Success! token.json has been created.")
+    # Always a fresh login, e.g. after the refresh token was revoked or the scopes changed
+    youtube_client.login()
+    print(f"Success! {youtube_client.TOKEN_FILE} has been created.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,135 @@
+import datetime
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import instaloader
+
+import instagram_rate
+
+# Configuration
+# Logging in is optional; with INSTAGRAM_USER set, the session is saved once and reused by every later run
+INSTAGRAM_USER = os.environ.get("INSTAGRAM_USER", "")
+SESSION_FILE = os.environ.get("INSTAGRAM_SESSION_FILE", "instagram_session")
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", "4"))
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get("DOWNLOAD_CHUNK_SIZE_KB", "1024")) * 1024
+
+def create_loader(rate=None):
+    # Instaloader itself writes nothing but the video: no metadata JSON, pictures or thumbnails.
+    # download_post adds the caption as <name>.txt next to it.
+    loader = instaloader.Instaloader(
+        rate_controller=rate.attach if rate else None,
+        download_pictures=False,
+        download_video_thumbnails=False,
+        download_geotags=False,
+        download_comments=False,
+        save_metadata=False,
+        compress_json=False,
+        post_metadata_txt_pattern="",
+    )
+    if INSTAGRAM_USER:
+        try:
+            loader.load_session_from_file(INSTAGRAM_USER, SESSION_FILE)
+        except FileNotFoundError:
+            loader.interactive_login(INSTAGRAM_USER)
+            loader.save_session_to_file(SESSION_FILE)
+    return loader
+
+class DownloadResult:
+    # Outcome for one post: the file it was saved to, or why it failed
+    def __init__(self, shortcode, path=None, error=None, skipped=False):
+        self.shortcode = shortcode
+        self.path = path
+        self.error = error
+        self.skipped = skipped  # already downloaded earlier
+
+    @property
+    def ok(self):
+        return self.error is None
+
+class Downloader:
+    # Downloads posts with one shared Instaloader session. Instagram API queries go through the session one
+    # at a time (its rate limiter is not thread-safe), while the media files are streamed in parallel.
+    def __init__(self, folder, loader=None, workers=None, chunk_size=None, rate=None):
+        self.folder = folder
+        # Every API query goes through the adaptive rate controller, shared by all downloads of this process
+        self.rate = rate or (instagram_rate.AdaptiveRateController() if loader is None else None)
+        self.loader = loader or create_loader(self.rate)
+        self.workers = workers or DOWNLOAD_WORKERS
+        self.chunk_size = chunk_size or DOWNLOAD_CHUNK_SIZE
+        self._api_lock = threading.Lock()
+
+    def post(self, shortcode):
+        with self._api_lock:
+            return instaloader.Post.from_shortcode(self.loader.context, shortcode)
+
+    def download_post(self, post):
+        # Accepts a Post or a shortcode
+        if isinstance(post, str):
+            post = self.post(post)
+        if not post.is_video:
+            raise ValueError("not a video")
+
+        path = os.path.join(self.folder, self.loader.format_filename(post) + ".mp4")
+        if os.path.exists(path):
+            return DownloadResult(post.shortcode, path, skipped=True)
+        with self._api_lock:
+            url = post.video_url  # can need another query
+            caption = post.caption
+        self.stream_to_file(url, path)
+        if caption:
+            # Metadata context for reels without speech (see upload_vids.read_caption)
+            with open(os.path.splitext(path)[0] + ".txt", "w", encoding="utf-8") as f:
+                f.write(caption)
+        timestamp = post.date_utc.replace(tzinfo=datetime.timezone.utc).timestamp()  # date_utc is naive
+        os.utime(path, (timestamp, timestamp))  # like instaloader: file time is the post date
+        return DownloadResult(post.shortcode, path)
+
+    def stream_to_file(self, url, path):
+        # Written in chunks to a temporary name, so an interrupted download never looks finished
+        response = self.loader.context.get_raw(url)
+        partial = path + ".part"
+        try:
+            with open(partial, "wb") as f:
+                for chunk in response.iter_content(self.chunk_size):
+                    f.write(chunk)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        finally:
+            response.close()
+
+    def _download(self, post):
+        shortcode = post if isinstance(post, str) else post.shortcode
+        try:
+            result = self.download_post(post)
+        except Exception as e:
+            # One bad post (deleted, private, not a video, network error) does not stop the batch
+            print(f"Failed to download {shortcode}: {e}")
+            if self.rate and instagram_rate.is_unrecorded_throttle(e):
+                self.rate.throttled()  # the next queries wait out the cooldown
+            return DownloadResult(shortcode, error=e)
+        print(f"{'Already downloaded' if result.skipped else 'Downloaded'} {shortcode}: {result.path}")
+        return result
+
+    def download(self, posts):
+        # Results in the same order as `posts`
+        os.makedirs(self.folder, exist_ok=True)
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="download") as pool:
+            return list(pool.map(self._download, posts))
+
+    def finish(self):
+        # Keeps the learned rate for the next run and reports the request rate that was achieved
+        if self.rate:
+            self.rate.save()
+            metrics = self.rate.metrics()
+            print(f"Instagram requests: {metrics['requests']} ({metrics['requests_per_minute']}/minute, "
+                  f"limit {metrics['rate_limit_per_minute']}/minute, {metrics['throttles']} throttles).")
+
+def print_summary(results):
+    failed = [result for result in results if not result.ok]
+    print(f"Downloaded {len(results) - len(failed)} of {len(results)} posts.")
+    for result in failed:
+        print(f"  {result.shortcode}: {result.error}")
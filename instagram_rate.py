@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+import time
+
+import instaloader
+
+# Configuration
+RATE_STATE_FILE = os.environ.get("INSTAGRAM_RATE_STATE_FILE", "instagram_rate.json")
+# Requests per minute: where a fresh controller starts and the ceiling it ramps back up to
+MAX_RPM = float(os.environ.get("INSTAGRAM_MAX_RPM", "18"))
+MIN_RPM = float(os.environ.get("INSTAGRAM_MIN_RPM", "1"))
+BURST = int(os.environ.get("INSTAGRAM_BURST", "3"))
+# +1 request per minute for every RAMP_SECONDS without being throttled
+RAMP_SECONDS = float(os.environ.get("INSTAGRAM_RAMP_SECONDS", "120"))
+# Pause after a throttle, doubled for each throttle in a row (up to an hour)
+COOLDOWN_SECONDS = float(os.environ.get("INSTAGRAM_COOLDOWN_SECONDS", "300"))
+MAX_COOLDOWN_SECONDS = 3600
+
+THROTTLE_MESSAGES = ("429", "Too Many Requests", "Please wait a few minutes")
+
+def is_throttle_error(error):
+    # Instagram answers with a 429 or with a 'fail' status asking to wait a few minutes
+    return any(message in str(error) for message in THROTTLE_MESSAGES)
+
+def is_unrecorded_throttle(error):
+    # A throttle the controller has not seen: Instaloader hands 429s to handle_429 while it retries and, once it
+    # gives up, raises a ConnectionException caused by the TooManyRequestsException. 'Please wait a few minutes'
+    # failures and refused CDN downloads never reach the controller.
+    return is_throttle_error(error) and not isinstance(error.__cause__, instaloader.exceptions.TooManyRequestsException)
+
+class AdaptiveRateController(instaloader.RateController):
+    # Token bucket in front of every Instagram API query, on top of Instaloader's own sliding-window limits.
+    # A throttle halves the rate and pauses; every RAMP_SECONDS without one adds a request per minute back.
+    # The rate survives between runs, so a cron job right after a throttle does not start at full speed.
+    def __init__(self, path=None, clock=time.time, sleep=time.sleep):
+        self.path = path or RATE_STATE_FILE
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.requests = []  # timestamps of this run's queries, for the metrics
+        self.throttles = 0
+        state = self._load()
+        now = clock()
+        self.rate = min(MAX_RPM, max(MIN_RPM, state.get("rate", MAX_RPM)))
+        self.ramped_at = state.get("ramped_at", now)
+        self.cooldown_until = state.get("cooldown_until", 0)
+        self.throttles_in_a_row = state.get("throttles_in_a_row", 0)
+        self.tokens = 1.0  # no burst straight after a restart
+        self.refilled_at = now
+
+    def attach(self, context):
+        # Used as Instaloader(rate_controller=controller.attach)
+        instaloader.RateController.__init__(self, context)
+        return self
+
+    def sleep(self, secs):
+        self._sleep(secs)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save(self):
+        state = {
+            "rate": self.rate,
+            "ramped_at": self.ramped_at,
+            "cooldown_until": self.cooldown_until,
+            "throttles_in_a_row": self.throttles_in_a_row,
+            "last_run": self.metrics(),
+        }
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+
+    def _ramp(self, now):
+        steps = int((now - self.ramped_at) // RAMP_SECONDS)
+        if steps > 0:
+            self.rate = min(MAX_RPM, self.rate + steps)
+            self.ramped_at += steps * RAMP_SECONDS
+            self.throttles_in_a_row = 0
+
+    def acquire(self):
+        # Seconds to wait before the next query may go out; the token is taken right away
+        with self._lock:
+            now = self._clock()
+            self._ramp(now)
+            per_second = self.rate / 60
+            self.tokens = min(BURST, self.tokens + (now - self.refilled_at) * per_second)
+            self.refilled_at = now
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / per_second
+            return max(wait, self.cooldown_until - now)
+
+    def wait_before_query(self, query_type):
+        wait = self.acquire()
+        # Instaloader's own per-query-type limits still apply
+        wait = max(wait, self.query_waittime(query_type, time.monotonic(), False))
+        if wait > 15:
+            print(f"Instagram rate limit: waiting {round(wait)} seconds ({self.rate:.0f} requests/minute).")
+        if wait > 0:
+            self.sleep(wait)
+        self._query_timestamps.setdefault(query_type, []).append(time.monotonic())
+        self.requests.append(self._clock())
+
+    def throttled(self):
+        # Multiplicative decrease plus a pause that grows while Instagram keeps refusing
+        with self._lock:
+            now = self._clock()
+            self.throttles += 1
+            self.throttles_in_a_row += 1
+            self.rate = max(MIN_RPM, self.rate / 2)
+            self.ramped_at = now
+            self.tokens = min(self.tokens, 0.0)
+            cooldown = min(MAX_COOLDOWN_SECONDS, COOLDOWN_SECONDS * 2 ** (self.throttles_in_a_row - 1))
+            self.cooldown_until = now + cooldown
+            self.save()
+        print(f"Instagram is throttling: slowing down to {self.rate:.0f} requests/minute, pausing {round(cooldown)} seconds.")
+        return cooldown
+
+    def handle_429(self, query_type):
+        # Called by Instaloader before it retries the query
+        self.sleep(self.throttled())
+
+    def metrics(self):
+        now = self._clock()
+        elapsed = (now - self.requests[0]) if self.requests else 0
+        return {
+            "requests": len(self.requests),
+            "requests_per_minute": round(len(self.requests) / max(elapsed / 60, 1), 2),
+            "requests_last_minute": sum(1 for t in self.requests if t > now - 60),
+            "rate_limit_per_minute": round(self.rate, 2),
+            "throttles": self.throttles,
+        }
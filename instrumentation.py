@@ -0,0 +1,305 @@
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Configuration
+REPORT_FOLDER = os.environ.get("REPORT_FOLDER", "reports")
+RUN_REPORT_FILE = os.environ.get("RUN_REPORT_FILE", os.path.join(REPORT_FOLDER, "run_report.json"))
+RUN_HISTORY_FILE = os.environ.get("RUN_HISTORY_FILE", os.path.join(REPORT_FOLDER, "run_history.json"))
+# Point this into node_exporter's --collector.textfile.directory to scrape the last run
+METRICS_TEXTFILE = os.environ.get("METRICS_TEXTFILE", os.path.join(REPORT_FOLDER, "reels_uploader.prom"))
+HISTORY_RUNS = int(os.environ.get("RUN_HISTORY_RUNS", "20"))  # runs the rolling averages are taken over
+DEFAULT_SECONDS_PER_VIDEO = 60  # only used until a run has been measured
+
+METRIC_PREFIX = "reels_uploader"
+METRIC_LABELS = {}  # added to every series, e.g. {"channel": "science"} so channels' textfiles do not collide
+
+
+def rss_bytes():
+    # Current resident set size, where /proc is available; the peak so far otherwise
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+def peak_rss_bytes(children=False):
+    if resource is None:
+        return 0
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RunRecorder:
+    # Collects one sample per (stage, video) measurement. Thread-safe: pipeline stages record concurrently.
+    # cpu_seconds is the CPU time of the measuring thread; work done by native threads (CTranslate2),
+    # ffmpeg or the transcription worker processes only shows up in the run totals.
+    def __init__(self):
+        self.started_at = datetime.datetime.now()
+        self._start_wall = time.perf_counter()
+        self._start_times = os.times()
+        self.samples = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def measure(self, stage, video=None):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        if video is None and stack:
+            video = stack[-1]["video"]  # sub-steps belong to the video of the enclosing stage
+        sample = {"stage": stage, "video": video, "ok": True}
+        stack.append(sample)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield sample
+        except BaseException:
+            sample["ok"] = False
+            raise
+        finally:
+            sample["wall_seconds"] = time.perf_counter() - wall
+            sample["cpu_seconds"] = time.thread_time() - cpu
+            sample["rss_bytes"] = rss_bytes()
+            stack.pop()
+            with self._lock:
+                self.samples.append(sample)
+
+    def add(self, **values):
+        # Attach extra numbers (e.g. bytes sent) to the innermost open measurement of this thread
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            stack[-1].update(values)
+
+    def record(self, stage, video=None, ok=True, **values):
+        # A measurement taken elsewhere (e.g. in a transcription worker process), attributed to the
+        # video of this thread's open measurement
+        stack = getattr(self._local, "stack", None)
+        if video is None and stack:
+            video = stack[-1]["video"]
+        sample = dict({"wall_seconds": 0.0, "cpu_seconds": 0.0, "rss_bytes": 0}, **values)
+        sample.update(stage=stage, video=video, ok=ok)
+        with self._lock:
+            self.samples.append(sample)
+
+    def stage_summary(self):
+        stages = {}
+        with self._lock:
+            samples = list(self.samples)
+        for sample in samples:
+            stage = stages.setdefault(sample["stage"], {
+                "calls": 0, "failed": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "max_wall_seconds": 0.0,
+                "max_rss_bytes": 0, "bytes": 0,
+            })
+            stage["calls"] += 1
+            stage["failed"] += 0 if sample["ok"] else 1
+            stage["wall_seconds"] += sample["wall_seconds"]
+            stage["cpu_seconds"] += sample["cpu_seconds"]
+            stage["max_wall_seconds"] = max(stage["max_wall_seconds"], sample["wall_seconds"])
+            stage["max_rss_bytes"] = max(stage["max_rss_bytes"], sample["rss_bytes"])
+            stage["bytes"] += sample.get("bytes", 0)
+            if "escalated" in sample:
+                stage["escalated"] = stage.get("escalated", 0) + bool(sample["escalated"])
+            if "saved_bytes" in sample:
+                stage["saved_bytes"] = stage.get("saved_bytes", 0) + sample["saved_bytes"]
+        for stage in stages.values():
+            stage["avg_wall_seconds"] = stage["wall_seconds"] / stage["calls"]
+            if stage["bytes"]:
+                stage["bytes_per_second"] = stage["bytes"] / stage["wall_seconds"] if stage["wall_seconds"] else 0.0
+            else:
+                del stage["bytes"]
+            if "escalated" in stage:
+                # Share of the calls handed on to the next Whisper tier
+                stage["escalation_rate"] = stage["escalated"] / stage["calls"]
+        return stages
+
+    def video_summary(self):
+        videos = {}
+        with self._lock:
+            samples = [sample for sample in self.samples if sample["video"]]
+        for sample in samples:
+            stage = videos.setdefault(sample["video"], {}).setdefault(sample["stage"], {
+                "wall_seconds": 0.0, "cpu_seconds": 0.0, "rss_bytes_at_end": 0,
+            })
+            stage["wall_seconds"] += sample["wall_seconds"]
+            stage["cpu_seconds"] += sample["cpu_seconds"]
+            # Resident memory sampled as the stage finished (the largest sample), not a peak within it
+            stage["rss_bytes_at_end"] = max(stage["rss_bytes_at_end"], sample["rss_bytes"])
+            if "bytes" in sample:
+                stage["bytes"] = stage.get("bytes", 0) + sample["bytes"]
+                stage["bytes_per_second"] = stage["bytes"] / stage["wall_seconds"] if stage["wall_seconds"] else 0.0
+            if not sample["ok"]:
+                stage["failed"] = True
+        return videos
+
+    def report(self, found=0, processed=0):
+        wall = time.perf_counter() - self._start_wall
+        start, end = self._start_times, os.times()
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "wall_seconds": wall,
+            "cpus": os.cpu_count(),
+            "videos": {"found": found, "processed": processed},
+            "seconds_per_video": wall / processed if processed else None,
+            # Process totals, including native threads, ffmpeg and worker processes that have exited
+            "cpu_seconds": {
+                "self": end.user + end.system - start.user - start.system,
+                "children": end.children_user + end.children_system - start.children_user - start.children_system,
+            },
+            "peak_rss_bytes": {"self": peak_rss_bytes(), "children": peak_rss_bytes(children=True)},
+            "stages": self.stage_summary(),
+            "per_video": self.video_summary(),
+        }
+
+
+_recorder = None
+
+def start_run():
+    global _recorder
+    _recorder = RunRecorder()
+    return _recorder
+
+@contextmanager
+def measure(stage, video=None):
+    # No-op outside of a recorded run (tests, one-off helper calls)
+    recorder = _recorder
+    if recorder is None:
+        yield {}
+        return
+    with recorder.measure(stage, video) as sample:
+        yield sample
+
+def add(**values):
+    if _recorder is not None:
+        _recorder.add(**values)
+
+def record(stage, **values):
+    if _recorder is not None:
+        _recorder.record(stage, **values)
+
+def timed(stage, func):
+    # Wraps a pipeline stage function so every job it handles is measured under the job's name
+    def run(job):
+        with measure(stage, getattr(job, "name", None)):
+            return func(job)
+    return run
+
+def finish_run(found=0, processed=0):
+    # Writes the JSON report, the Prometheus textfile and the rolling history; returns the report
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is None:
+        return None
+    report = recorder.report(found, processed)
+    try:
+        _write_json(RUN_REPORT_FILE, report)
+        _write_textfile(METRICS_TEXTFILE, prometheus_metrics(report))
+        if processed:
+            history = load_history()
+            history.append({
+                "finished_at": report["finished_at"],
+                "videos": processed,
+                "wall_seconds": report["wall_seconds"],
+                "stages": {name: stage["wall_seconds"] / processed for name, stage in report["stages"].items()},
+            })
+            _write_json(RUN_HISTORY_FILE, history[-HISTORY_RUNS:])
+    except OSError as e:
+        print(f"Could not write the run report: {e}")
+    return report
+
+def load_history():
+    try:
+        with open(RUN_HISTORY_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+def estimate_seconds(videos, history=None):
+    # ETA from the measured seconds per video of the last runs (weighted by how many videos each had).
+    # Returns (seconds, runs the estimate is based on).
+    history = load_history() if history is None else history
+    runs = [run for run in history if run.get("videos")]
+    if not runs:
+        return videos * DEFAULT_SECONDS_PER_VIDEO, 0
+    per_video = sum(run["wall_seconds"] for run in runs) / sum(run["videos"] for run in runs)
+    return videos * per_video, len(runs)
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m {seconds:02d}s"
+
+def prometheus_metrics(report):
+    lines = []
+
+    def metric(name, help_text, values):
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+        for labels, value in values:
+            labels = dict(METRIC_LABELS, **labels)
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f"{METRIC_PREFIX}_{name}{{{label_text}}} {value}" if label_text
+                         else f"{METRIC_PREFIX}_{name} {value}")
+
+    stages = report["stages"]
+    metric("last_run_timestamp_seconds", "When the last run finished.",
+           [({}, datetime.datetime.fromisoformat(report["finished_at"]).timestamp())])
+    metric("run_seconds", "Wall time of the last run.", [({}, report["wall_seconds"])])
+    metric("videos", "Videos found and uploaded by the last run.",
+           [({"result": result}, count) for result, count in report["videos"].items()])
+    if report["seconds_per_video"] is not None:
+        metric("seconds_per_video", "Run wall time divided by uploaded videos.", [({}, report["seconds_per_video"])])
+    metric("cpu_seconds", "CPU time used by the last run.",
+           [({"process": who}, seconds) for who, seconds in report["cpu_seconds"].items()])
+    metric("peak_rss_bytes", "Peak resident memory.",
+           [({"process": who}, peak) for who, peak in report["peak_rss_bytes"].items()])
+    metric("stage_seconds", "Wall time spent in each stage (summed over videos).",
+           [({"stage": name}, stage["wall_seconds"]) for name, stage in stages.items()])
+    metric("stage_cpu_seconds", "CPU time of the threads running each stage.",
+           [({"stage": name}, stage["cpu_seconds"]) for name, stage in stages.items()])
+    metric("stage_calls", "Measurements taken per stage.",
+           [({"stage": name}, stage["calls"]) for name, stage in stages.items()])
+    metric("stage_failures", "Failed calls per stage.",
+           [({"stage": name}, stage["failed"]) for name, stage in stages.items()])
+    throughput = [({"stage": name}, stage["bytes_per_second"]) for name, stage in stages.items()
+                  if "bytes_per_second" in stage]
+    if throughput:
+        metric("bytes_per_second", "Average transfer rate.", throughput)
+    escalations = [({"stage": name}, stage["escalated"]) for name, stage in stages.items() if "escalated" in stage]
+    if escalations:
+        metric("stage_escalations", "Clips a Whisper tier handed on to the next one.", escalations)
+    savings = [({"stage": name}, stage["saved_bytes"]) for name, stage in stages.items() if "saved_bytes" in stage]
+    if savings:
+        metric("saved_bytes", "Upload bytes saved by remuxing or transcoding before the upload.", savings)
+    return "\n".join(lines) + "\n"
+
+def _write_json(path, data):
+    _ensure_folder(path)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+def _write_textfile(path, text):
+    # The textfile collector may read at any moment: write to a temp file and rename it into place
+    _ensure_folder(path)
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "w") as f:
+        f.write(text)
+    os.replace(temp, path)
+
+def _ensure_folder(path):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
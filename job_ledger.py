@@ -0,0 +1,361 @@
+import argparse
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Configuration
+LEDGER_FILE = os.environ.get("JOB_LEDGER_FILE", "jobs.sqlite3")
+
+# Job states, in the order a video normally goes through them
+DISCOVERED = "discovered"
+TRANSCRIBED = "transcribed"
+METADATA_READY = "metadata_ready"
+UPLOADING = "uploading"
+PROCESSING = "processing"  # sent; the file is kept until YouTube confirms it processed the video
+UPLOADED = "uploaded"
+FAILED = "failed"
+QUARANTINED = "quarantined"
+DUPLICATE = "duplicate"  # an earlier upload has the same video
+DONE_STATES = (UPLOADED, QUARANTINED, DUPLICATE, PROCESSING)  # no more work for the pipeline
+SCHEDULED_STATES = (UPLOADED, PROCESSING)  # the publish slot is taken
+
+DONE_PLACEHOLDERS = ", ".join("?" * len(DONE_STATES))
+
+# When each state was entered
+STATE_TIMESTAMPS = {
+    DISCOVERED: "discovered_at",
+    TRANSCRIBED: "transcribed_at",
+    METADATA_READY: "metadata_at",
+    UPLOADING: "upload_started_at",
+    PROCESSING: "uploaded_at",
+    UPLOADED: "uploaded_at",
+    FAILED: "failed_at",
+    QUARANTINED: "failed_at",
+    DUPLICATE: "failed_at",
+}
+FIELDS = ("name", "content_hash", "publish_at", "youtube_id", "title", "upload_uri", "upload_offset",
+          "failures", "failed_stage", "last_error", "duplicate_of")
+
+def format_slot(slot):
+    # Stored in UTC, so text order is time order
+    return slot.astimezone(datetime.timezone.utc).isoformat()
+
+def parse_slot(value):
+    # Naive values come from the old JSON state, whose publish times YouTube read as UTC
+    slot = datetime.datetime.fromisoformat(value)
+    return slot if slot.tzinfo else slot.replace(tzinfo=datetime.timezone.utc)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    content_hash TEXT,
+    state TEXT NOT NULL,
+    publish_at TEXT,
+    youtube_id TEXT,
+    title TEXT,
+    upload_uri TEXT,
+    upload_offset INTEGER,
+    failures INTEGER NOT NULL DEFAULT 0,
+    failed_stage TEXT,
+    last_error TEXT,
+    duplicate_of TEXT,
+    discovered_at REAL,
+    transcribed_at REAL,
+    metadata_at REAL,
+    upload_started_at REAL,
+    uploaded_at REAL,
+    failed_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_content_hash ON jobs (content_hash);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+CREATE INDEX IF NOT EXISTS jobs_publish_at ON jobs (publish_at);
+CREATE TABLE IF NOT EXISTS free_slots (publish_at TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS quota (day TEXT PRIMARY KEY, units INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class JobLedger:
+    # One row per video with its state, publish slot, YouTube ID and timings, plus the schedule's
+    # free slots and the local quota record. Every change is its own transaction, so a crash never
+    # leaves a half-written state behind. Safe to share between the pipeline threads.
+    def __init__(self, path=None):
+        self.path = path or LEDGER_FILE
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        # WAL: readers (e.g. `upload_vids.py status`) never block the running upload, and commits are cheap
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(SCHEMA)
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "duplicate_of" not in columns:  # ledger created before duplicate detection
+            self._db.execute("ALTER TABLE jobs ADD COLUMN duplicate_of TEXT")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # Jobs
+
+    def discover(self, name, content_hash=None, held=()):
+        # Returns the job for this video, creating it on first sight. Matched by contents when known,
+        # so a renamed file keeps its history (and an already uploaded one is recognised).
+        # held: names of the other files still present; their jobs are not taken over by an identical copy,
+        # which gets a row of its own instead.
+        now = time.time()
+        with self._lock, self._db:
+            if content_hash:
+                rows = self._db.execute(
+                    "SELECT * FROM jobs WHERE content_hash = ? ORDER BY id DESC", (content_hash,)
+                ).fetchall()
+                row = next((row for row in rows if row["name"] == name or row["name"] not in held), None)
+                if row is None and not rows:
+                    # Failed before it could be hashed in an earlier run
+                    row = self._db.execute(
+                        "SELECT * FROM jobs WHERE name = ? AND content_hash IS NULL ORDER BY id DESC LIMIT 1", (name,)
+                    ).fetchone()
+            else:
+                row = self._db.execute(
+                    f"SELECT * FROM jobs WHERE name = ? AND state NOT IN ({DONE_PLACEHOLDERS}) ORDER BY id DESC LIMIT 1",
+                    (name, *DONE_STATES),
+                ).fetchone()
+            if row:
+                self._db.execute(
+                    "UPDATE jobs SET name = ?, content_hash = COALESCE(?, content_hash), updated_at = ? WHERE id = ?",
+                    (name, content_hash, now, row["id"]),
+                )
+                return self._get(row["id"])
+            job_id = self._db.execute(
+                "INSERT INTO jobs (name, content_hash, state, discovered_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (name, content_hash, DISCOVERED, now, now),
+            ).lastrowid
+            return self._get(job_id)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._get(job_id)
+
+    def _get(self, job_id):
+        row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def find(self, content_hash):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE content_hash = ? ORDER BY id DESC LIMIT 1", (content_hash,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def update(self, job_id, state=None, **fields):
+        # Moves a job to `state` (recording when) and/or sets columns from FIELDS
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        now = time.time()
+        columns = dict(fields, updated_at=now)
+        if state:
+            columns["state"] = state
+            columns[STATE_TIMESTAMPS[state]] = now
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        with self._lock, self._db:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*columns.values(), job_id))
+
+    def session(self, job_id):
+        # The resumable upload an earlier attempt left unfinished, if any
+        job = self.get(job_id)
+        if not job or not job["upload_uri"] or job["state"] in DONE_STATES:
+            return None
+        return {"uri": job["upload_uri"], "offset": job["upload_offset"] or 0,
+                "publish_at": parse_slot(job["publish_at"]) if job["publish_at"] else None}
+
+    def save_session(self, job_id, uri, offset):
+        self.update(job_id, upload_uri=uri, upload_offset=offset)
+
+    def mark_uploaded(self, job_id, youtube_id, publish_at, state=UPLOADED):
+        # The slot is taken for good: it is not free anymore and the upload session is finished.
+        # state=PROCESSING when the upload is still to be verified.
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET state = ?, youtube_id = ?, publish_at = ?, upload_uri = NULL, upload_offset = NULL, "
+                "uploaded_at = ?, updated_at = ? WHERE id = ?",
+                (state, youtube_id, format_slot(publish_at), now, now, job_id),
+            )
+            self._db.execute("DELETE FROM free_slots WHERE publish_at = ?", (format_slot(publish_at),))
+
+    def processing(self):
+        # Uploads waiting for YouTube to finish processing them, oldest first
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM jobs WHERE state = ? ORDER BY id", (PROCESSING,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def mark_verified(self, job_id):
+        # uploaded_at stays the time the video was sent
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?", (UPLOADED, time.time(), job_id))
+
+    def reject(self, job_id, reason):
+        # YouTube did not accept the upload: the video goes back into the queue and its slot back into the plan.
+        # Returns how many runs in a row this video has failed.
+        job = self.get(job_id)
+        failures = self.record_failure(job_id, "verify", reason)
+        if job["publish_at"]:
+            self.add_free_slot(parse_slot(job["publish_at"]))
+        return failures
+
+    def record_failure(self, job_id, stage, error):
+        # Returns how many runs in a row this video has failed
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET state = ?, failures = failures + 1, failed_stage = ?, last_error = ?, "
+                "failed_at = ?, updated_at = ? WHERE id = ?",
+                (FAILED, stage, str(error)[:500], now, now, job_id),
+            )
+            return self._db.execute("SELECT failures FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+    def pending(self):
+        # Jobs that still have work left, oldest first
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM jobs WHERE state NOT IN ({DONE_PLACEHOLDERS}) ORDER BY id", DONE_STATES
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def jobs(self, state=None, limit=20):
+        query, args = "SELECT * FROM jobs", ()
+        if state:
+            query, args = query + " WHERE state = ?", (state,)
+        with self._lock:
+            rows = self._db.execute(f"{query} ORDER BY updated_at DESC LIMIT ?", (*args, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    # Schedule
+
+    def last_scheduled(self):
+        # Latest publish slot that is definitely taken (uploaded or processing, or carried over from the old JSON state)
+        with self._lock:
+            uploaded = self._db.execute(
+                f"SELECT MAX(publish_at) FROM jobs WHERE state IN ({', '.join('?' * len(SCHEDULED_STATES))})",
+                SCHEDULED_STATES,
+            ).fetchone()[0]
+            migrated = self._meta("last_scheduled_date")
+        latest = max(filter(None, (uploaded, migrated)), default=None)
+        return parse_slot(latest) if latest else None
+
+    def free_slots(self):
+        # Planned slots no upload has taken yet, including the ones failed uploads gave back
+        with self._lock:
+            rows = self._db.execute("SELECT publish_at FROM free_slots ORDER BY publish_at").fetchall()
+        return sorted(parse_slot(row[0]) for row in rows)
+
+    def add_free_slot(self, slot):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO free_slots VALUES (?)", (format_slot(slot),))
+
+    def replace_free_slots(self, slots):
+        # Stores a new plan in one transaction
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM free_slots")
+            self._db.executemany("INSERT OR IGNORE INTO free_slots VALUES (?)", [(format_slot(slot),) for slot in slots])
+
+    # Quota
+
+    def quota_spent(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT day, units FROM quota").fetchall())
+
+    def save_quota(self, spent):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM quota")
+            self._db.executemany("INSERT INTO quota VALUES (?, ?)", spent.items())
+
+    # Migration from schedule_state.json
+
+    def _meta(self, key):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def migrate_json(self, path):
+        # One-time import of the old state file. The file itself is left alone: on the VM it is a
+        # bind mount that cannot be renamed or deleted from inside the container.
+        with self._lock:
+            if self._meta("migrated_json") or not os.path.exists(path):
+                return False
+        with open(path) as f:
+            state = json.load(f)
+
+        now = time.time()
+        with self._lock, self._db:
+            if self._meta("migrated_json"):
+                return False  # another thread got here first
+            if state.get("last_scheduled_date"):
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('last_scheduled_date', ?)",
+                                 (state["last_scheduled_date"],))
+            for content_hash, session in state.get("upload_sessions", {}).items():
+                self._db.execute(
+                    "INSERT INTO jobs (content_hash, state, publish_at, upload_uri, upload_offset, discovered_at, "
+                    "upload_started_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (content_hash, UPLOADING, session.get("publish_at"), session["uri"], session.get("offset", 0),
+                     now, now, now),
+                )
+            for key, failure in state.get("failures", {}).items():
+                # Keyed by content hash, or by file name when the video could not be hashed
+                content_hash = key if re.fullmatch(r"[0-9a-f]{64}", key) else None
+                self._db.execute(
+                    "INSERT INTO jobs (name, content_hash, state, failures, failed_stage, last_error, discovered_at, "
+                    "failed_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (failure.get("name", key), content_hash, FAILED, failure.get("count", 1), failure.get("stage"),
+                     failure.get("error"), now, now, now),
+                )
+            self._db.executemany("INSERT OR IGNORE INTO free_slots VALUES (?)",
+                                 [(slot,) for slot in state.get("free_slots", [])])
+            self._db.executemany("INSERT OR REPLACE INTO quota VALUES (?, ?)", state.get("quota_spent", {}).items())
+            self._db.execute("INSERT INTO meta VALUES ('migrated_json', ?)", (datetime.datetime.now().isoformat(),))
+        print(f"Imported {path} into the job ledger.")
+        return True
+
+def _format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp)) if timestamp else "-"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the upload job ledger.")
+    parser.add_argument("--file", default=None, help=f"ledger file (default: {LEDGER_FILE})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("summary", help="jobs per state and the schedule")
+    list_parser = commands.add_parser("list", help="show the most recently updated jobs")
+    list_parser.add_argument("--state", default=None)
+    list_parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with JobLedger(args.file) as ledger:
+        if args.command == "summary":
+            for state, count in sorted(ledger.counts().items()):
+                print(f"{state:<16}{count}")
+            last = ledger.last_scheduled()
+            print(f"Last scheduled: {last or '-'}")
+            print(f"Planned slots: {len(ledger.free_slots())}")
+        elif args.command == "list":
+            for job in ledger.jobs(args.state, args.limit):
+                print(f"{job['id']:>5}  {job['state']:<15} {job['publish_at'] or '-':<20} {job['youtube_id'] or '-':<12} "
+                      f"{_format_time(job['updated_at'])}  {job['name'] or job['content_hash'][:12]}")
+
+if __name__ == "__main__":
+    main()
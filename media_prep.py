@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import struct
+import subprocess
+import time
+
+import transcription
+
+# Configuration
+# off: upload files as downloaded. remux: rewrite files whose index (moov atom) is at the end to faststart MP4,
+# by stream copy (no quality change). transcode: also re-encode files over the bitrate or resolution cap.
+MEDIA_PREP = os.environ.get("MEDIA_PREP", "remux")
+MEDIA_MAX_KBPS = int(os.environ.get("MEDIA_MAX_KBPS", "8000"))  # whole file; Shorts at 1080p look fine well below
+MEDIA_MAX_SIDE = int(os.environ.get("MEDIA_MAX_SIDE", "1920"))  # longest side in pixels (1080x1920 Shorts)
+MEDIA_AUDIO_KBPS = 128
+MEDIA_PREP_WORKERS = int(os.environ.get("MEDIA_PREP_WORKERS", "1"))  # ffmpeg encodes running at once
+MEDIA_CACHE_FOLDER = os.environ.get("MEDIA_CACHE_FOLDER", "prepared")
+MEDIA_CACHE_MAX_AGE_DAYS = int(os.environ.get("MEDIA_CACHE_MAX_AGE_DAYS", "7"))  # about as long as an upload session
+FFPROBE_BINARY = os.environ.get("FFPROBE_BINARY", "ffprobe")
+
+REMUX = "remux"
+TRANSCODE = "transcode"
+DONE = {REMUX: "remuxed", TRANSCODE: "transcoded", "cached": "reused the prepared copy"}  # for the log
+
+def top_level_boxes(path):
+    # Types of the top-level MP4 boxes in file order, read from the box headers only
+    boxes = []
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        offset = 0
+        while offset + 8 <= size:
+            f.seek(offset)
+            length, kind = struct.unpack(">I4s", f.read(8))
+            if length == 1:  # 64-bit size follows
+                length = struct.unpack(">Q", f.read(8))[0]
+            elif length == 0:  # runs to the end of the file
+                length = size - offset
+            if length < 8:
+                break  # not an MP4 (or a damaged one)
+            boxes.append(kind.decode("latin-1"))
+            offset += length
+    return boxes
+
+def needs_faststart(path):
+    # The index after the media data: players (and YouTube's ingest) have to read the whole file first
+    boxes = top_level_boxes(path)
+    return "moov" in boxes and "mdat" in boxes and boxes.index("moov") > boxes.index("mdat")
+
+def probe(path):
+    # (duration in seconds, width, height) of the first video stream
+    command = [
+        FFPROBE_BINARY, "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "format=duration:stream=width,height", "-of", "json", path,
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe could not read {path}: {result.stderr.decode(errors='replace').strip()}")
+    info = json.loads(result.stdout)
+    stream = (info.get("streams") or [{}])[0]
+    return float(info.get("format", {}).get("duration") or 0), stream.get("width") or 0, stream.get("height") or 0
+
+def over_budget(path):
+    duration, width, height = probe(path)
+    kbps = os.path.getsize(path) * 8 / duration / 1000 if duration else 0
+    return kbps > MEDIA_MAX_KBPS or max(width, height) > MEDIA_MAX_SIDE
+
+def plan(path, mode=None):
+    # What the file needs before it is uploaded: TRANSCODE, REMUX or None
+    mode = mode or MEDIA_PREP
+    if mode == "off":
+        return None
+    if mode == TRANSCODE and over_budget(path):
+        return TRANSCODE
+    return REMUX if needs_faststart(path) else None
+
+def ffmpeg_command(path, target, action):
+    command = [transcription.FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error", "-y", "-i", path]
+    if action == REMUX:
+        command += ["-map", "0", "-c", "copy"]
+    else:
+        video_kbps = MEDIA_MAX_KBPS - MEDIA_AUDIO_KBPS
+        command += [
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-vf", f"scale=w='min(iw,{MEDIA_MAX_SIDE})':h='min(ih,{MEDIA_MAX_SIDE})'"
+                   ":force_original_aspect_ratio=decrease:force_divisible_by=2",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "21", "-pix_fmt", "yuv420p",
+            "-maxrate", f"{video_kbps}k", "-bufsize", f"{2 * video_kbps}k",
+            "-c:a", "aac", "-b:a", f"{MEDIA_AUDIO_KBPS}k",
+        ]
+    return command + ["-movflags", "+faststart", "-f", "mp4", target]
+
+def cached_path(content_hash):
+    return os.path.join(MEDIA_CACHE_FOLDER, content_hash + ".mp4")
+
+class Prepared:
+    # The file to upload for one video and what it took to get there
+    def __init__(self, path, action=None, original_bytes=0, cached=False):
+        self.path = path
+        self.action = action
+        self.original_bytes = original_bytes
+        self.cached = cached
+
+    @property
+    def saved_bytes(self):
+        return self.original_bytes - os.path.getsize(self.path) if self.action else 0
+
+def prepare(path, content_hash, mode=None):
+    # Returns the Prepared file to upload: the original, or a remuxed/transcoded copy cached by content hash
+    target = cached_path(content_hash)
+    original_bytes = os.path.getsize(path)
+    if os.path.exists(target):
+        return Prepared(target, "cached", original_bytes, cached=True)
+    action = plan(path, mode)
+    if action is None:
+        return Prepared(path)
+
+    os.makedirs(MEDIA_CACHE_FOLDER, exist_ok=True)
+    partial = target + ".part"  # an interrupted encode never looks finished
+    result = subprocess.run(ffmpeg_command(path, partial, action), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise RuntimeError(f"ffmpeg could not {action} {path}: {result.stderr.decode(errors='replace').strip()}")
+    if action == TRANSCODE and os.path.getsize(partial) >= original_bytes:
+        os.remove(partial)  # already efficiently encoded: not worth the generation loss
+        return prepare(path, content_hash, REMUX)
+    os.replace(partial, target)
+    return Prepared(target, action, original_bytes)
+
+def discard(content_hash):
+    # The upload is done: the prepared copy is not needed anymore
+    target = cached_path(content_hash)
+    if os.path.exists(target):
+        os.remove(target)
+
+def prune(max_age_days=None):
+    # Copies left behind by failed or abandoned uploads
+    max_age_days = MEDIA_CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    if not os.path.isdir(MEDIA_CACHE_FOLDER):
+        return 0
+    cutoff, removed = time.time() - max_age_days * 86400, 0
+    for name in os.listdir(MEDIA_CACHE_FOLDER):
+        path = os.path.join(MEDIA_CACHE_FOLDER, name)
+        if os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            removed += 1
+    return removed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check what a video needs before it is uploaded.")
+    parser.add_argument("video", nargs="+")
+    parser.add_argument("--mode", choices=("remux", "transcode"), default=TRANSCODE)
+    args = parser.parse_args(argv)
+
+    for path in args.video:
+        duration, width, height = probe(path)
+        kbps = os.path.getsize(path) * 8 / duration / 1000 if duration else 0
+        print(f"{path}: {width}x{height}, {kbps:.0f} kbps, boxes {' '.join(top_level_boxes(path))} "
+              f"-> {plan(path, args.mode) or 'upload as is'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Configuration
+CACHE_FILE = os.environ.get("METADATA_CACHE_FILE", "metadata_cache.sqlite3")
+CACHE_MAX_AGE_DAYS = int(os.environ.get("METADATA_CACHE_MAX_AGE_DAYS", "30"))
+CACHE_MAX_ENTRIES = int(os.environ.get("METADATA_CACHE_MAX_ENTRIES", "1000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    content_hash TEXT NOT NULL,
+    whisper_model TEXT NOT NULL,
+    transcript TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (content_hash, whisper_model)
+);
+CREATE TABLE IF NOT EXISTS metadata (
+    content_hash TEXT NOT NULL,
+    whisper_model TEXT NOT NULL,
+    ollama_model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (content_hash, whisper_model, ollama_model, prompt_version)
+);
+CREATE INDEX IF NOT EXISTS transcripts_accessed ON transcripts (accessed_at);
+CREATE INDEX IF NOT EXISTS metadata_accessed ON metadata (accessed_at);
+"""
+
+def content_hash(path, chunk_size=1024 * 1024):
+    # Identifies a video by its bytes, so renamed or re-downloaded copies still hit the cache
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class MetadataCache:
+    # Persistent cache of transcripts and generated titles/descriptions, keyed by video contents.
+    # Safe to share between the pipeline threads.
+    def __init__(self, path=None):
+        self.path = path or CACHE_FILE
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def get_transcript(self, content_hash, whisper_model):
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT transcript FROM transcripts WHERE content_hash = ? AND whisper_model = ?",
+                (content_hash, whisper_model),
+            ).fetchone()
+            if row:
+                self._db.execute(
+                    "UPDATE transcripts SET accessed_at = ? WHERE content_hash = ? AND whisper_model = ?",
+                    (time.time(), content_hash, whisper_model),
+                )
+        return row[0] if row else None
+
+    def put_transcript(self, content_hash, whisper_model, transcript):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?)",
+                (content_hash, whisper_model, transcript, now, now),
+            )
+
+    def get_metadata(self, content_hash, whisper_model, ollama_model, prompt_version):
+        key = (content_hash, whisper_model, ollama_model, prompt_version)
+        where = "content_hash = ? AND whisper_model = ? AND ollama_model = ? AND prompt_version = ?"
+        with self._lock, self._db:
+            row = self._db.execute(f"SELECT title, description FROM metadata WHERE {where}", key).fetchone()
+            if row:
+                self._db.execute(f"UPDATE metadata SET accessed_at = ? WHERE {where}", (time.time(), *key))
+        return tuple(row) if row else None
+
+    def put_metadata(self, content_hash, whisper_model, ollama_model, prompt_version, title, description):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, whisper_model, ollama_model, prompt_version, title, description, now, now),
+            )
+
+    def prune(self, max_age_days=None, max_entries=None):
+        # Age-based eviction first, then keep only the most recently used entries per table
+        max_age_days = CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        max_entries = CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        cutoff = time.time() - max_age_days * 86400
+        removed = 0
+        with self._lock, self._db:
+            for table in ("transcripts", "metadata"):
+                removed += self._db.execute(f"DELETE FROM {table} WHERE accessed_at < ?", (cutoff,)).rowcount
+                removed += self._db.execute(
+                    f"DELETE FROM {table} WHERE rowid NOT IN "
+                    f"(SELECT rowid FROM {table} ORDER BY accessed_at DESC LIMIT ?)",
+                    (max_entries,),
+                ).rowcount
+        return removed
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM transcripts")
+            self._db.execute("DELETE FROM metadata")
+
+    def stats(self):
+        with self._lock:
+            transcripts = self._db.execute("SELECT COUNT(*), MIN(created_at) FROM transcripts").fetchone()
+            metadata = self._db.execute("SELECT COUNT(*), MIN(created_at) FROM metadata").fetchone()
+        return {
+            "transcripts": transcripts[0],
+            "metadata": metadata[0],
+            "oldest": min([t for t in (transcripts[1], metadata[1]) if t is not None], default=None),
+            "size_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+    def entries(self, limit=20):
+        with self._lock:
+            return self._db.execute(
+                "SELECT content_hash, whisper_model, ollama_model, prompt_version, title, accessed_at "
+                "FROM metadata ORDER BY accessed_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+def _format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp)) if timestamp else "-"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and prune the transcript/metadata cache.")
+    parser.add_argument("--file", default=None, help=f"cache file (default: {CACHE_FILE})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="show entry counts and cache size")
+    list_parser = commands.add_parser("list", help="show the most recently used metadata entries")
+    list_parser.add_argument("--limit", type=int, default=20)
+    prune_parser = commands.add_parser("prune", help="evict old / least recently used entries")
+    prune_parser.add_argument("--max-age-days", type=int, default=None)
+    prune_parser.add_argument("--max-entries", type=int, default=None)
+    commands.add_parser("clear", help="remove every entry")
+    args = parser.parse_args(argv)
+
+    with MetadataCache(args.file) as cache:
+        if args.command == "stats":
+            stats = cache.stats()
+            print(f"Cache file: {cache.path} ({stats['size_bytes'] / 1024:.1f} KiB)")
+            print(f"Transcripts: {stats['transcripts']}")
+            print(f"Metadata: {stats['metadata']}")
+            print(f"Oldest entry: {_format_time(stats['oldest'])}")
+        elif args.command == "list":
+            for digest, whisper_model, ollama_model, prompt_version, title, accessed_at in cache.entries(args.limit):
+                print(f"{digest[:12]}  {whisper_model:<12} {ollama_model:<12} {prompt_version}  {_format_time(accessed_at)}  {title}")
+        elif args.command == "prune":
+            removed = cache.prune(args.max_age_days, args.max_entries)
+            print(f"Removed {removed} cache entries.")
+        elif args.command == "clear":
+            cache.clear()
+            print("Cache cleared.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import threading
+
+# Configuration
+OLLAMA_HOST = os.environ.get('OLLAMA_HOST', 'http://host.docker.internal:11434')
+OLLAMA_MODEL = "gemma3:1b"  # Text-only model
+# How long Ollama keeps the model loaded after a request; long enough to outlast a Whisper pass
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+# Prompts in flight at once. Ollama only runs them in parallel if the server allows it (OLLAMA_NUM_PARALLEL).
+OLLAMA_CONCURRENCY = int(os.environ.get("OLLAMA_CONCURRENCY", "2"))
+
+PROMPT_TEMPLATE = """
+    You are a YouTube Shorts creator. The text below is the spoken content of your video.
+    CONTENT: "{transcript}"
+
+    TASK:
+    Write a viral Title and Description to post on YouTube.
+
+    CRITICAL RULES:
+    1. Speak directly to the audience (use "You", "Your").
+    2. STRICTLY FORBIDDEN: Do not use words like "transcript", "video", "audio", "summary", or "text".
+    3. Make it sound immediate and urgent.
+
+    EXAMPLE OUTPUT (Follow this style):
+    {{"title": "Your Phone is DIRTY 🦠", "description": "You won't believe how much bacteria is crawling on your screen right now."}}
+
+    OUTPUT FORMAT:
+    Return ONLY valid JSON.
+    """
+# Changing the prompt changes its version, so cached metadata from an older prompt is not reused
+PROMPT_VERSION = hashlib.sha256(PROMPT_TEMPLATE.encode()).hexdigest()[:12]
+
+
+class IncompleteAnswer(KeyError):
+    # Ollama answered with JSON, but not with the title and description asked for
+    pass
+
+class MetadataEngine:
+    # One Ollama client (and HTTP connection pool) shared by every video of the batch.
+    # Thread-safe: the pipeline's metadata workers call generate() concurrently.
+    def __init__(self, host=None, model=None, concurrency=None, keep_alive=None):
+        self.host = host or OLLAMA_HOST
+        self.model = model or OLLAMA_MODEL
+        self.concurrency = max(1, concurrency or OLLAMA_CONCURRENCY)
+        self.keep_alive = keep_alive or OLLAMA_KEEP_ALIVE
+        self._client = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                # Imported on first use: ollama pulls in httpx and pydantic, which are slow to import
+                import ollama
+
+                self._client = ollama.Client(host=self.host)
+            return self._client
+
+    def generate(self, transcript):
+        # Raises if Ollama fails or the answer is not the JSON we asked for
+        prompt = PROMPT_TEMPLATE.format(transcript=transcript)
+        with self._slots:
+            response = self.client.chat(model=self.model, messages=[
+                {'role': 'user', 'content': prompt}
+            ], format='json', options={'num_gpu': 0}, keep_alive=self.keep_alive) # Force CPU to save memory
+        content = response['message']['content']
+        print(f"Ollama response: {content}")
+
+        data = json.loads(content)
+        if not isinstance(data, dict) or not all(isinstance(data.get(key), str) for key in ('title', 'description')):
+            raise IncompleteAnswer(f"no title and description in {content}")
+        return data['title'].strip(), data['description'].strip() + " #shorts"
+
+    def release(self):
+        # Ask Ollama to unload the model now instead of keeping it around for keep_alive
+        if self._client is None:
+            return  # never talked to Ollama
+        try:
+            self.client.generate(model=self.model, prompt="", keep_alive=0)
+        except Exception as e:
+            print(f"Could not unload {self.model}: {e}")
+
+    def close(self):
+        # Closes the HTTP connection pool; the next generate() opens a new client
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    # Process-wide engine, so one-off generate_metadata() calls reuse the same client too
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = MetadataEngine()
+        return _engine
@@ -0,0 +1,169 @@
+import os
+import queue
+import threading
+
+# Items buffered between two stages. Small on purpose: it only has to keep the next stage busy.
+QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", "2"))
+
+_DONE = object()  # end-of-stream marker passed from stage to stage
+
+
+class Stage:
+    def __init__(self, name, func, workers=1, on_finish=None, ordered=False):
+        self.name = name
+        self.func = func  # func(item) -> item for the next stage, or None to drop it
+        self.workers = workers  # more than one worker gives up ordering within the stage...
+        self.ordered = ordered  # ...unless results are re-sequenced before being passed on
+        self.on_finish = on_finish  # called once the stage has processed its last item
+
+
+# Runs items through a chain of stages, each in its own thread(s), connected by bounded queues.
+# With one worker per stage, items leave every stage in the order they were fed in.
+#
+# If a stage raises, error_handler(item, stage_name, exc) decides what happens next.
+# Returning True (the default) stops the run the same way the old serial loop did:
+# items already ahead of the failed one finish, items behind it are discarded.
+# Items that are already past the failing stage (e.g. a parallel upload that was in flight)
+# are never discarded, so their work is not lost.
+# A handler or on_finish that raises is logged and never takes a worker down (the run would wait
+# forever for its end-of-stream marker); an error_handler that raises counts as returning True.
+class Pipeline:
+    def __init__(self, stages, queue_size=QUEUE_SIZE, error_handler=None, discard_handler=None):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.error_handler = error_handler or (lambda item, stage, exc: True)
+        self.discard_handler = discard_handler  # discard_handler(item, stage_name) for items dropped by a stop
+        self.completed = []
+        self.errors = []
+        self._stops = []  # (last sequence number to keep, last stage that discards)
+        self._lock = threading.Lock()
+
+    def stop(self, after=-1, stage=None):
+        # Discard items fed in after sequence number `after` (-1 = everything) when they reach
+        # `stage` or any stage before it (default: every stage)
+        position = len(self.stages) if stage is None else self._position(stage)
+        with self._lock:
+            self._stops.append((after, position))
+
+    def _position(self, name):
+        return [stage.name for stage in self.stages].index(name)
+
+    def _stopped(self, seq, position=0):
+        with self._lock:
+            return any(seq > after and position <= last for after, last in self._stops)
+
+    def run(self, items):
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = []
+
+        for position, stage in enumerate(self.stages):
+            inbox = queues[position]
+            outbox = queues[position + 1] if position + 1 < len(queues) else None
+            state = _StageState(position, stage.workers)
+            for worker in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work, args=(stage, inbox, outbox, state),
+                    name=f"{stage.name}-{worker}", daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        # Feed items in order; put() blocks while the first stage is busy, keeping memory bounded
+        for seq, item in enumerate(items):
+            if self._stopped(seq):
+                break
+            queues[0].put((seq, item))
+        queues[0].put(_DONE)
+
+        for thread in threads:
+            thread.join()
+        return self.completed
+
+    def _work(self, stage, inbox, outbox, state):
+        while True:
+            # Tickets record the order in which items entered the stage
+            with state.get_lock:
+                entry = inbox.get()
+                ticket = state.next_ticket
+                if entry is not _DONE:
+                    state.next_ticket += 1
+
+            if entry is _DONE:
+                # Let sibling workers see the marker too; the last one out closes the stage
+                with self._lock:
+                    state.remaining -= 1
+                    last = state.remaining == 0
+                if not last:
+                    inbox.put(_DONE)
+                    return
+                try:
+                    if stage.on_finish:
+                        stage.on_finish()
+                except Exception as e:
+                    print(f"Pipeline: on_finish of {stage.name} failed: {e}")
+                finally:
+                    if outbox is not None:
+                        outbox.put(_DONE)
+                return
+
+            seq, item = entry
+            result = None
+            if self._stopped(seq, state.position):
+                if self.discard_handler:
+                    try:
+                        self.discard_handler(item, stage.name)
+                    except Exception as e:
+                        self._handler_failed(item, stage.name, "discard_handler", e)
+            else:
+                try:
+                    result = stage.func(item)
+                except Exception as e:
+                    with self._lock:
+                        self.errors.append((item, stage.name, e))
+                    try:
+                        stop = self.error_handler(item, stage.name, e)
+                    except Exception as handler_error:
+                        self._handler_failed(item, stage.name, "error_handler", handler_error)
+                        stop = True
+                    if stop:
+                        self.stop(after=seq - 1, stage=stage.name)
+
+            if stage.ordered and stage.workers > 1:
+                self._emit_in_order(state, outbox, ticket, seq, result)
+            elif result is not None:
+                self._emit(outbox, seq, result)
+
+    def _handler_failed(self, item, stage, handler, e):
+        # The item counts as failed; the workers keep going
+        print(f"Pipeline: {handler} failed for an item in {stage}: {e}")
+        with self._lock:
+            self.errors.append((item, stage, e))
+
+    def _emit_in_order(self, state, outbox, ticket, seq, result):
+        # Hold results back until every item that entered the stage earlier has been emitted
+        with state.emit_lock:
+            state.finished[ticket] = (seq, result)
+            while state.next_emit in state.finished:
+                seq, result = state.finished.pop(state.next_emit)
+                state.next_emit += 1
+                if result is not None:
+                    self._emit(outbox, seq, result)
+
+    def _emit(self, outbox, seq, result):
+        if outbox is not None:
+            outbox.put((seq, result))
+        else:
+            with self._lock:
+                self.completed.append(result)
+
+
+class _StageState:
+    # Book-keeping shared by the workers of one stage
+    def __init__(self, position, workers):
+        self.position = position
+        self.remaining = workers
+        self.get_lock = threading.Lock()
+        self.emit_lock = threading.Lock()
+        self.next_ticket = 0
+        self.next_emit = 0
+        self.finished = {}
@@ -1,25 +1,135 @@
-# note: you may face rate limit issues with this
+# note: the first sync of a profile crawls all its reels and may face rate limit issues;
+# later syncs stop at the first reels they already know and only fetch the new ones
 
+import argparse
+import datetime
 import os
-import subprocess
+import sqlite3
+import time
+
+import instaloader
+
+import instagram_downloader
 
 VIDEO_FOLDER = "new_videos"
+SYNC_INDEX_FILE = os.environ.get("SYNC_INDEX_FILE", "profile_index.sqlite3")
+# Pinned reels sit on top regardless of their date, so a few known reels in a row are needed to be sure
+SYNC_STOP_AFTER_KNOWN = int(os.environ.get("SYNC_STOP_AFTER_KNOWN", "3"))
+# Syncs that retry a reel whose download failed before it is given up (deleted, made private, ...)
+SYNC_RETRY_ATTEMPTS = int(os.environ.get("SYNC_RETRY_ATTEMPTS", "5"))
+
+class ProfileIndex:
+    # Shortcodes already downloaded (or deliberately skipped), per profile, and the ones whose download failed.
+    # Failed reels are retried by shortcode: the pagination stops at known reels and may never reach them again.
+    def __init__(self, path=None):
+        self._db = sqlite3.connect(path or SYNC_INDEX_FILE)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            "profile TEXT NOT NULL, shortcode TEXT NOT NULL, taken_at REAL, seen_at REAL NOT NULL, "
+            "PRIMARY KEY (profile, shortcode))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS failed ("
+            "profile TEXT NOT NULL, shortcode TEXT NOT NULL, attempts INTEGER NOT NULL, last_error TEXT, "
+            "failed_at REAL NOT NULL, PRIMARY KEY (profile, shortcode))"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    def known(self, profile):
+        rows = self._db.execute("SELECT shortcode FROM seen WHERE profile = ?", (profile,)).fetchall()
+        return {row[0] for row in rows}
+
+    def add(self, profile, posts):
+        # Posts, or shortcodes of retried reels (their date is not known without another query)
+        rows = [(profile, post, None, time.time()) if isinstance(post, str) else
+                (profile, post.shortcode, post.date_utc.replace(tzinfo=datetime.timezone.utc).timestamp(), time.time())
+                for post in posts]
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO seen VALUES (?, ?, ?, ?)", rows)
+            self._db.executemany("DELETE FROM failed WHERE profile = ? AND shortcode = ?",
+                                 [row[:2] for row in rows])
+
+    def add_failures(self, profile, results):
+        with self._db:
+            for result in results:
+                self._db.execute(
+                    "INSERT INTO failed VALUES (?, ?, 1, ?, ?) ON CONFLICT (profile, shortcode) DO UPDATE SET "
+                    "attempts = attempts + 1, last_error = excluded.last_error, failed_at = excluded.failed_at",
+                    (profile, result.shortcode, str(result.error), time.time()),
+                )
+
+    def failed(self, profile, max_attempts=None):
+        # Shortcodes still worth retrying, oldest failure first
+        max_attempts = SYNC_RETRY_ATTEMPTS if max_attempts is None else max_attempts
+        rows = self._db.execute(
+            "SELECT shortcode FROM failed WHERE profile = ? AND attempts < ? ORDER BY failed_at",
+            (profile, max_attempts),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+def new_reels(context, profile_name, known, full=False):
+    # Newest first. Pages are fetched lazily, so stopping early saves the requests for the rest of the profile.
+    profile = instaloader.Profile.from_username(context, profile_name)
+    reels, known_in_a_row = [], 0
+    for post in profile.get_reels():
+        if post.shortcode not in known:
+            reels.append(post)
+            known_in_a_row = 0
+            continue
+        known_in_a_row += 1
+        if not full and known_in_a_row >= SYNC_STOP_AFTER_KNOWN:
+            break
+    return reels
+
+def sync_profile(profile_name, full=False, list_only=False, mark_seen=False):
+    downloader = instagram_downloader.Downloader(VIDEO_FOLDER)
+    with ProfileIndex() as index:
+        try:
+            # Listing the profile goes through the same rate controller as the downloads
+            reels = new_reels(downloader.loader.context, profile_name, index.known(profile_name), full)
+            listed = {post.shortcode for post in reels}
+            retries = [shortcode for shortcode in index.failed(profile_name) if shortcode not in listed]
+            print(f"Found {len(reels)} new reels on {profile_name}"
+                  + (f", retrying {len(retries)} that failed before." if retries else "."))
+            if list_only:
+                # Same format batch_download_posts.py asks for
+                print(",".join([post.shortcode for post in reels] + retries))
+                return []
+            if mark_seen:
+                index.add(profile_name, reels)
+                print("Marked them as seen without downloading.")
+                return []
 
-def download_profile_reels(profile_name):
-    print("Downloading reels...")
-    subprocess.run(["instaloader", profile_name, "--reels", "+args.txt", "--dirname-pattern=" + VIDEO_FOLDER], check=True)
+            print("Downloading reels...")
+            posts = reels + retries  # retried by shortcode, wherever the pagination stopped
+            results = downloader.download(posts)
+            # Failed downloads are recorded, so the next syncs try them again
+            index.add(profile_name, [post for post, result in zip(posts, results) if result.ok])
+            index.add_failures(profile_name, [result for result in results if not result.ok])
+        finally:
+            downloader.finish()
+    instagram_downloader.print_summary(results)
+    return results
 
-def delete_profile_id(profile_name):
-    print("Deleting profile id...")
-    try:
-        os.remove(f"./{VIDEO_FOLDER}/{profile_name}_id")
-    except FileNotFoundError:
-        pass
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download the reels of an Instagram profile that were not downloaded before.")
+    parser.add_argument("profile", nargs="?", help="profile name (asked for when left out)")
+    parser.add_argument("--full", action="store_true", help="check every reel on the profile instead of stopping at known ones")
+    parser.add_argument("--list", action="store_true", help="only print the shortcodes of new reels")
+    parser.add_argument("--mark-seen", action="store_true",
+                        help="record the current reels as seen without downloading them (e.g. already uploaded)")
+    args = parser.parse_args(argv)
 
-def main():
-    profile_name = input("Enter profile to download reels: ").strip()
-    download_profile_reels(profile_name)
-    delete_profile_id(profile_name)
+    profile_name = args.profile or input("Enter profile to download reels: ").strip()
+    sync_profile(profile_name, full=args.full, list_only=args.list, mark_seen=args.mark_seen)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,91 @@
+import errno
+import json
+import os
+import random
+import shutil
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from google.auth.exceptions import RefreshError, TransportError
+from googleapiclient.errors import HttpError, ResumableUploadError
+
+from metadata_engine import IncompleteAnswer
+from youtube_upload import QuotaExhausted, is_quota_error
+
+# Configuration
+RETRY_ATTEMPTS = int(os.environ.get("RETRY_ATTEMPTS", "4"))  # tries per stage, including the first one
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", "2"))  # seconds
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", "60"))  # seconds
+QUARANTINE_FOLDER = os.environ.get("QUARANTINE_FOLDER", "quarantine")
+QUARANTINE_AFTER = int(os.environ.get("QUARANTINE_AFTER", "3"))  # failed runs before a file is moved aside
+
+# Error classes
+RETRYABLE = "retryable"  # transient: try the same step again after a pause
+FATAL_FILE = "fatal_file"  # this video cannot go through right now, carry on with the others
+FATAL_RUN = "fatal_run"  # nothing else will work either (auth, quota, ...), stop the run
+
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+RETRYABLE_ERRNOS = (errno.ECONNRESET, errno.ECONNREFUSED, errno.ECONNABORTED, errno.ETIMEDOUT,
+                    errno.EPIPE, errno.EHOSTUNREACH, errno.ENETUNREACH, errno.ENETDOWN)
+
+
+def classify(error):
+    if isinstance(error, (QuotaExhausted, RefreshError, MemoryError, BrokenProcessPool)):
+        return FATAL_RUN
+    if isinstance(error, (HttpError, ResumableUploadError)):
+        status = error.resp.status
+        if status == 401 or is_quota_error(error):
+            return FATAL_RUN
+        if status == 403:
+            # Missing scope, suspended channel, ... every other upload would fail the same way
+            return FATAL_RUN
+        return RETRYABLE if status in RETRYABLE_STATUS else FATAL_FILE
+    # Ollama answers with a status code of its own
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int) and status > 0:
+        return RETRYABLE if status in RETRYABLE_STATUS else FATAL_FILE
+    if isinstance(error, (FileNotFoundError, IsADirectoryError, PermissionError)):
+        return FATAL_FILE
+    if isinstance(error, (ConnectionError, TimeoutError, TransportError)):
+        return RETRYABLE
+    if isinstance(error, OSError) and error.errno in RETRYABLE_ERRNOS:
+        return RETRYABLE
+    # httplib2 / httpx transport failures, without importing either just to check
+    module = type(error).__module__.split(".")[0]
+    if module in ("httplib2", "httpx", "httpcore", "ssl"):
+        return RETRYABLE
+    # Small models sometimes answer with broken or incomplete JSON; asking again usually fixes it.
+    # Any other ValueError or KeyError is a bug and fails straight away.
+    if isinstance(error, (json.JSONDecodeError, IncompleteAnswer)):
+        return RETRYABLE
+    return FATAL_FILE
+
+def backoff_delay(attempt, base=None, cap=None):
+    # Exponential backoff with "full jitter": a random pause up to base * 2^attempt, capped
+    base = RETRY_BASE_DELAY if base is None else base
+    cap = RETRY_MAX_DELAY if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def call_with_retry(func, *args, stage="", attempts=None, sleep=time.sleep, **kwargs):
+    # Runs func until it succeeds, fails with a non-retryable error or runs out of attempts
+    attempts = attempts or RETRY_ATTEMPTS
+    for attempt in range(attempts):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if classify(e) != RETRYABLE or attempt + 1 >= attempts:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"{stage or getattr(func, '__name__', 'call')} failed ({e}), retrying in {delay:.1f}s (attempt {attempt + 2}/{attempts})...")
+            sleep(delay)
+
+def quarantine(path, folder=None):
+    # Move a file that keeps failing out of the queue so it stops costing time on every run
+    folder = folder or QUARANTINE_FOLDER
+    os.makedirs(folder, exist_ok=True)
+    target = os.path.join(folder, os.path.basename(path))
+    if os.path.exists(target):
+        stem, ext = os.path.splitext(target)
+        target = f"{stem}_{int(time.time())}{ext}"
+    shutil.move(path, target)
+    return target
@@ -0,0 +1,96 @@
+import datetime
+import itertools
+import os
+from zoneinfo import ZoneInfo
+
+# Configuration
+# Publish times, in SCHEDULE_TIMEZONE. Either one list for every day ("12:00" or "09:00,18:00")
+# or lists per weekday separated by ";", e.g. "mon-fri=09:00,18:00;sat,sun=12:00"
+PUBLISH_SLOTS = os.environ.get("PUBLISH_SLOTS", "12:00")
+# Days without uploads, e.g. "2026-12-24,2026-12-31..2027-01-01"
+BLACKOUT_DATES = os.environ.get("BLACKOUT_DATES", "")
+# UTC keeps the publish times of older versions, which sent the local time with a "Z" suffix
+SCHEDULE_TIMEZONE = os.environ.get("SCHEDULE_TIMEZONE", "UTC")
+
+UTC = datetime.timezone.utc
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+def parse_times(spec):
+    times = set()
+    for value in spec.split(","):
+        try:
+            times.add(datetime.time.fromisoformat(value.strip()))
+        except ValueError:
+            raise ValueError(f"Invalid publish time {value.strip()!r}, expected HH:MM") from None
+    return sorted(times)
+
+def parse_weekdays(spec):
+    days = set()
+    for part in spec.lower().split(","):
+        first, _, last = part.strip().partition("-")
+        if first not in WEEKDAYS or (last and last not in WEEKDAYS):
+            raise ValueError(f"Invalid weekday {part.strip()!r}, expected e.g. mon or mon-fri")
+        start, end = WEEKDAYS.index(first), WEEKDAYS.index(last or first)
+        days.update(range(start, end + 1) if start <= end else [*range(start, 7), *range(end + 1)])
+    return days
+
+def parse_slots(spec):
+    # Publish times per weekday (0 = Monday)
+    slots = {}
+    for group in filter(None, (group.strip() for group in spec.split(";"))):
+        days, _, times = group.rpartition("=")
+        for day in parse_weekdays(days) if days else range(7):
+            slots[day] = sorted(set(slots.get(day, [])) | set(parse_times(times)))
+    if not any(slots.values()):
+        raise ValueError("PUBLISH_SLOTS has no publish times")
+    return slots
+
+def parse_blackouts(spec):
+    dates = set()
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        first, _, last = part.partition("..")
+        start = datetime.date.fromisoformat(first)
+        end = datetime.date.fromisoformat(last) if last else start
+        dates.update(start + datetime.timedelta(days=offset) for offset in range((end - start).days + 1))
+    return dates
+
+class SchedulePlanner:
+    # Turns the publish times per weekday into a stream of UTC slots, skipping blackout dates.
+    # Wall-clock times are kept across DST changes (12:00 stays 12:00 local time).
+    def __init__(self, slots=None, blackouts=None, timezone=None):
+        self.slots = parse_slots(PUBLISH_SLOTS) if slots is None else slots
+        self.blackouts = parse_blackouts(BLACKOUT_DATES) if blackouts is None else set(blackouts)
+        self.timezone = ZoneInfo(timezone or SCHEDULE_TIMEZONE)
+
+    def upcoming(self, after):
+        # Every slot strictly after `after`, in order
+        day = after.astimezone(self.timezone).date()
+        while True:
+            if day not in self.blackouts:
+                for time in self.slots.get(day.weekday(), ()):
+                    slot = datetime.datetime.combine(day, time, tzinfo=self.timezone).astimezone(UTC)
+                    if slot > after:
+                        yield slot
+            day += datetime.timedelta(days=1)
+
+    def plan(self, count, after):
+        return list(itertools.islice(self.upcoming(after), count))
+
+    def is_slot(self, slot):
+        # False for slots planned under a different configuration
+        local = slot.astimezone(self.timezone)
+        return (local.date() not in self.blackouts
+                and local.time().replace(tzinfo=None) in self.slots.get(local.weekday(), ()))
+
+def to_utc(moment):
+    # Naive datetimes are read as wall-clock time in SCHEDULE_TIMEZONE
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=ZoneInfo(SCHEDULE_TIMEZONE))
+    return moment.astimezone(UTC)
+
+def local_time(moment):
+    return to_utc(moment).astimezone(ZoneInfo(SCHEDULE_TIMEZONE))
+
+def publish_at(moment):
+    # RFC 3339 in UTC, as YouTube expects for status.publishAt
+    return to_utc(moment).strftime("%Y-%m-%dT%H:%M:%SZ")
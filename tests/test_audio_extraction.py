@@ -0,0 +1,56 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+# Add parent directory to path to import transcription
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transcription
+
+pytestmark = pytest.mark.skipif(
+    shutil.which(transcription.FFMPEG_BINARY) is None,
+    reason="ffmpeg is not installed",
+)
+
+
+def make_video(path, seconds, with_audio=True):
+    command = [transcription.FFMPEG_BINARY, "-y", "-loglevel", "error",
+               "-f", "lavfi", "-i", f"color=c=black:s=64x64:d={seconds}"]
+    if with_audio:
+        command += ["-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}:sample_rate=44100", "-shortest"]
+    command += ["-pix_fmt", "yuv420p", path]
+    subprocess.run(command, check=True)
+
+def test_extract_audio_to_pcm(tmp_path):
+    """Test that audio is decoded to 16 kHz mono float PCM in memory."""
+    video_path = str(tmp_path / "clip.mp4")
+    make_video(video_path, 2)
+
+    audio = transcription.extract_audio(video_path)
+
+    assert audio.dtype.name == "float32"
+    assert audio.ndim == 1
+    # 2 seconds at 16 kHz, give or take encoder padding
+    assert abs(audio.size - 2 * transcription.SAMPLE_RATE) < transcription.SAMPLE_RATE // 10
+    assert 0 < abs(audio).max() <= 1.0
+    # Nothing is written next to the video or in the working directory
+    assert os.listdir(tmp_path) == ["clip.mp4"]
+    assert not os.path.exists("temp_audio.mp3")
+
+def test_extract_audio_without_audio_track(tmp_path):
+    """Test that a silent video yields an empty buffer."""
+    video_path = str(tmp_path / "silent.mp4")
+    make_video(video_path, 1, with_audio=False)
+
+    assert transcription.extract_audio(video_path).size == 0
+
+def test_extract_audio_invalid_file(tmp_path):
+    """Test that ffmpeg failures are reported."""
+    video_path = tmp_path / "broken.mp4"
+    video_path.write_bytes(b"not a video")
+
+    with pytest.raises(RuntimeError):
+        transcription.extract_audio(str(video_path))
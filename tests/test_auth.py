@@ -1,5 +1,7 @@
+import datetime
 import os
 import sys
+import threading
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -8,13 +10,13 @@ import pytest
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import upload_vids
+import youtube_client
 
 
-@patch('upload_vids.build')
-@patch('upload_vids.InstalledAppFlow')
-@patch('upload_vids.Credentials')
-@patch('upload_vids.os.path.exists')
-def test_auth_via_token_json_success(mock_exists, mock_creds_cls, mock_flow, mock_build):
+@patch('google_auth_oauthlib.flow.InstalledAppFlow')
+@patch('google.oauth2.credentials.Credentials')
+@patch('youtube_client.os.path.exists')
+def test_auth_via_token_json_success(mock_exists, mock_creds_cls, mock_flow):
     """Test that authentication uses token.json when available."""
     print("\nTesting auth via token.json...")
     
@@ -27,21 +29,20 @@ def test_auth_via_token_json_success(mock_exists, mock_creds_cls, mock_flow, moc
     mock_creds_cls.from_authorized_user_file.return_value = mock_creds_instance
     
     # Call method
-    service = upload_vids.get_authenticated_service()
+    creds = youtube_client.load_credentials()
     
     # Assertions
-    mock_exists.assert_called_with('token.json')
-    mock_creds_cls.from_authorized_user_file.assert_called_with('token.json', upload_vids.SCOPES)
+    mock_exists.assert_called_with(youtube_client.TOKEN_FILE)
+    mock_creds_cls.from_authorized_user_file.assert_called_with(youtube_client.TOKEN_FILE)
     mock_flow.from_client_secrets_file.assert_not_called()
-    mock_build.assert_called_once_with("youtube", "v3", credentials=mock_creds_instance)
+    assert creds is mock_creds_instance
     print("Auth via token.json passed.")
 
-@patch('upload_vids.build')
-@patch('upload_vids.InstalledAppFlow')
-@patch('upload_vids.Credentials')
-@patch('upload_vids.os.path.exists')
+@patch('google_auth_oauthlib.flow.InstalledAppFlow')
+@patch('google.oauth2.credentials.Credentials')
+@patch('youtube_client.os.path.exists')
 @patch('builtins.open', new_callable=MagicMock)
-def test_auth_fallback_manual(mock_open, mock_exists, mock_creds_cls, mock_flow, mock_build):
+def test_auth_fallback_manual(mock_open, mock_exists, mock_creds_cls, mock_flow):
     """Test fallback to manual auth when token.json is missing."""
     print("\nTesting auth fallback...")
     
@@ -55,26 +56,25 @@ def test_auth_fallback_manual(mock_open, mock_exists, mock_creds_cls, mock_flow,
     mock_flow_instance.run_local_server.return_value = mock_creds_instance
     
     # Call method
-    service = upload_vids.get_authenticated_service()
+    creds = youtube_client.load_credentials()
     
     # Assertions
-    mock_exists.assert_called_with('token.json')
+    mock_exists.assert_called_with(youtube_client.TOKEN_FILE)
     mock_flow.from_client_secrets_file.assert_called_once()
     mock_flow_instance.run_local_server.assert_called_once()
     
     # Verify file write (saving token)
-    mock_open.assert_called_with('token.json', 'w')
+    mock_open.assert_called_with(youtube_client.TOKEN_FILE, 'w')
     
-    mock_build.assert_called_once_with("youtube", "v3", credentials=mock_creds_instance)
+    assert creds is mock_creds_instance
     print("Auth fallback passed.")
 
-@patch('upload_vids.build')
-@patch('upload_vids.InstalledAppFlow')
-@patch('upload_vids.Credentials')
-@patch('upload_vids.os.path.exists')
-@patch('upload_vids.Request')
+@patch('google_auth_oauthlib.flow.InstalledAppFlow')
+@patch('google.oauth2.credentials.Credentials')
+@patch('youtube_client.os.path.exists')
+@patch('google.auth.transport.requests.Request')
 @patch('builtins.open', new_callable=MagicMock)
-def test_auth_refresh_token(mock_open, mock_request, mock_exists, mock_creds_cls, mock_flow, mock_build):
+def test_auth_refresh_token(mock_open, mock_request, mock_exists, mock_creds_cls, mock_flow):
     """Test that token is refreshed if expired."""
     print("\nTesting token refresh...")
     
@@ -90,11 +90,55 @@ def test_auth_refresh_token(mock_open, mock_request, mock_exists, mock_creds_cls
     mock_creds_cls.from_authorized_user_file.return_value = mock_creds_instance
     
     # Call method
-    service = upload_vids.get_authenticated_service()
+    creds = youtube_client.load_credentials()
     
     # Assertions
     mock_creds_instance.refresh.assert_called_once()
     mock_flow.from_client_secrets_file.assert_not_called()
-    mock_open.assert_called_with('token.json', 'w')
-    mock_build.assert_called_once_with("youtube", "v3", credentials=mock_creds_instance)
+    mock_open.assert_called_with(youtube_client.TOKEN_FILE, 'w')
+    assert creds is mock_creds_instance
     print("Token refresh passed.")
+
+def test_service_is_built_once_and_shared():
+    """Test that the process reuses one client and service instead of authenticating per run or batch."""
+    creds = MagicMock(refresh_token=None)
+    with patch.dict('youtube_client._clients', clear=True), \
+            patch('youtube_client.load_credentials', return_value=creds) as load:
+        first = upload_vids.get_authenticated_service()
+        second = upload_vids.get_authenticated_service()
+
+    load.assert_called_once()
+    assert first is second
+    assert first.videos  # built from the bundled discovery document, without a network request
+    with upload_vids.upload_connection(first) as http:
+        assert http.credentials is creds  # borrowed from the client's pool
+
+def test_connections_are_pooled_across_threads():
+    """Test that upload workers borrow keep-alive connections instead of opening one per thread."""
+    pool = youtube_client.ConnectionPool(MagicMock())
+
+    def upload():
+        with pool.connection() as http:
+            assert http.credentials is pool.credentials
+
+    for _ in range(3):
+        thread = threading.Thread(target=upload)
+        thread.start()
+        thread.join()
+    with pool.connection() as a, pool.connection() as b:
+        assert a is not b  # two at once need two connections
+    assert pool.created == 2
+
+def test_token_is_refreshed_ahead_of_expiry():
+    """Test that the refresh is due a margin before the access token expires."""
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    creds = MagicMock(expiry=now + datetime.timedelta(minutes=30))
+    client = youtube_client.YouTubeClient(creds, refresh_margin=300)
+    assert 1490 < client.seconds_until_refresh() <= 1500
+
+    creds.expiry = now + datetime.timedelta(minutes=2)
+    assert client.seconds_until_refresh() == 0
+    with patch('youtube_client.save_credentials') as save, patch('google.auth.transport.requests.Request'):
+        client.refresh()
+    creds.refresh.assert_called_once()
+    save.assert_called_once_with(creds, youtube_client.TOKEN_FILE)
@@ -3,7 +3,6 @@ import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import subprocess
 import unittest
 from unittest.mock import patch
 
@@ -11,26 +10,20 @@ import batch_download_posts
 
 
 class TestBatchDownload(unittest.TestCase):
-    @patch('batch_download_posts.subprocess.run')
+    @patch('batch_download_posts.instagram_downloader.Downloader')
     @patch('builtins.input')
-    def test_batch_install(self, mock_input, mock_subprocess):
+    def test_batch_install(self, mock_input, mock_downloader):
         # Setup
         # Patch the VIDEO_FOLDER to "test_download"
         test_dir = "tests/test_download"
+        mock_downloader.return_value.download.return_value = []
         with patch('batch_download_posts.VIDEO_FOLDER', test_dir):
             test_posts = ["DT1-joNjV63", "DT203fgjbDL", "DT28fs-jcY1"]
             batch_download_posts.batch_install(test_posts)
 
-            # Verification
-            self.assertEqual(mock_subprocess.call_count, 3)
-            
-            expected_calls = [
-                unittest.mock.call(["instaloader", "--dirname-pattern=" + test_dir, "+args.txt", "--", "-DT1-joNjV63"], check=True),
-                unittest.mock.call(["instaloader", "--dirname-pattern=" + test_dir, "+args.txt", "--", "-DT203fgjbDL"], check=True),
-                unittest.mock.call(["instaloader", "--dirname-pattern=" + test_dir, "+args.txt", "--", "-DT28fs-jcY1"], check=True)
-            ]
-            
-            mock_subprocess.assert_has_calls(expected_calls)
+            # Verification: one downloader (one session) for the whole batch
+            mock_downloader.assert_called_once_with(test_dir)
+            mock_downloader.return_value.download.assert_called_once_with(test_posts)
 
 class TestBatchDownloadIntegration(unittest.TestCase):
     def setUp(self):
@@ -45,10 +38,9 @@ class TestBatchDownloadIntegration(unittest.TestCase):
         with patch('batch_download_posts.VIDEO_FOLDER', self.test_dir):
             test_posts = ["DT1-joNjV63", "DT203fgjbDL", "DT28fs-jcY1"] 
             
-            try:
-                batch_download_posts.batch_install(test_posts)
-            except subprocess.CalledProcessError as e:
-                self.fail(f"Download failed: {e}")
+            results = batch_download_posts.batch_install(test_posts)
+            failed = [f"{result.shortcode}: {result.error}" for result in results if not result.ok]
+            self.assertFalse(failed, f"Download failed: {failed}")
 
             # Verify file exists
             # Check if mp4 is there
@@ -0,0 +1,54 @@
+import datetime
+import os
+import sys
+from unittest.mock import patch
+
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build_from_document
+
+# Add parent directory and the benchmarks folder to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "benchmarks"))
+
+import upload_vids
+from fake_services import FakeOllama, FakeYouTube
+from metadata_engine import MetadataEngine
+from run_benchmark import percentile
+
+
+def test_resumable_upload_against_stand_in(tmp_path):
+    """Test that the real chunked upload path completes against the local YouTube stand-in."""
+    video = tmp_path / "a.mp4"
+    video.write_bytes(os.urandom(600 * 1024))
+
+    with FakeYouTube(bandwidth=50 * 1024 * 1024) as youtube, \
+            patch('youtube_upload.UPLOAD_CHUNK_SIZE', 256 * 1024):
+        service = build_from_document(youtube.discovery_document(), credentials=AnonymousCredentials())
+        progress = []
+        response = upload_vids.upload_video(service, str(video), datetime.datetime(2026, 1, 24, 12),
+                                            metadata=("Title", "Description"), on_progress=progress.append)
+
+    assert response["id"] == "video1"
+    assert response["snippet"]["title"] == "Title"
+    assert [p["offset"] for p in progress] == [256 * 1024, 512 * 1024]
+    assert youtube.requests == 4  # session start + three chunks
+
+def test_metadata_engine_against_stand_in():
+    """Test that the shared Ollama client gets valid metadata from the local stand-in."""
+    with FakeOllama() as ollama:
+        engine = MetadataEngine(host=ollama.url.rstrip("/"))
+        title, description = engine.generate("hello world")
+        engine.release()
+        engine.close()
+
+    assert title.startswith("You NEED")
+    assert description.endswith("#shorts")
+
+def test_percentile():
+    """Test the interpolated percentiles used in benchmark reports."""
+    values = [4, 1, 3, 2]
+    assert percentile(values, 50) == 2.5
+    assert percentile(values, 100) == 4
+    assert percentile([7], 90) == 7
+    assert percentile([], 50) is None
@@ -0,0 +1,133 @@
+import json
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import channels
+import schedule_planner
+import upload_vids
+import youtube_upload
+
+
+def make_channel(tmp_path, name, videos=(), **settings):
+    folder = tmp_path / "videos" / name
+    folder.mkdir(parents=True)
+    for video in videos:
+        (folder / video).write_bytes(b"video")
+    return channels.Channel(name, videos=str(folder), token_file=str(tmp_path / f"token_{name}.json"),
+                            ledger_file=str(tmp_path / f"jobs_{name}.sqlite3"), **settings)
+
+def test_large_backlog_takes_turns_with_the_other_channels(tmp_path):
+    """Test that channels take turns of at most the batch size while others wait, and a lone channel takes all."""
+    big, small, medium = (make_channel(tmp_path, name) for name in ("big", "small", "medium"))
+    schedule = channels.RoundRobin([big, small, medium], batch_size=2)
+    schedule.add(big, [f"b{i}.mp4" for i in range(10)])
+    schedule.add(small, ["s0.mp4"])
+    schedule.add(medium, ["m0.mp4", "m1.mp4", "m2.mp4"])
+
+    turns = []
+    while True:
+        turn = schedule.next_turn()
+        if turn is None:
+            break
+        turns.append((turn[0].name, len(turn[1])))
+
+    assert turns == [("big", 2), ("small", 1), ("medium", 2), ("big", 2), ("medium", 1), ("big", 6)]
+
+def test_channel_settings_apply_only_while_active(tmp_path):
+    """Test that a channel points the uploader at its own folder, ledger, quota and slots, and restores them."""
+    channel = make_channel(tmp_path, "science", quota_budget=3200, publish_slots="09:00,18:00",
+                           timezone="Europe/Brussels")
+    before = (upload_vids.VIDEO_FOLDER, upload_vids.LEDGER_FILE, youtube_upload.QUOTA_DAILY_BUDGET,
+              schedule_planner.PUBLISH_SLOTS, schedule_planner.SCHEDULE_TIMEZONE)
+
+    with channel.activate():
+        assert upload_vids.VIDEO_FOLDER == channel.videos
+        assert upload_vids.get_ledger().path == channel.ledger_file
+        assert upload_vids.get_quota_ledger().remaining() == 3200
+        assert schedule_planner.SchedulePlanner().timezone.key == "Europe/Brussels"
+
+    assert (upload_vids.VIDEO_FOLDER, upload_vids.LEDGER_FILE, youtube_upload.QUOTA_DAILY_BUDGET,
+            schedule_planner.PUBLISH_SLOTS, schedule_planner.SCHEDULE_TIMEZONE) == before
+
+    # The single-channel setup only switches the folder, and only when it was given one
+    with channels.Channel(videos=str(tmp_path / "inbox")).activate():
+        assert upload_vids.VIDEO_FOLDER == str(tmp_path / "inbox")
+        assert upload_vids.LEDGER_FILE == before[1]
+    with channels.Channel().activate():
+        assert upload_vids.VIDEO_FOLDER == before[0]
+
+def test_channels_file_splits_the_project_quota(tmp_path):
+    """Test that channels without their own budget share the project quota, and bad entries are rejected."""
+    path = tmp_path / "channels.json"
+    path.write_text(json.dumps([{"name": "a", "videos": str(tmp_path / "a")},
+                                {"name": "b", "videos": str(tmp_path / "b"), "quota_budget": 1600}]))
+    a, b = channels.load_channels(str(path))
+    assert a.quota_budget == youtube_upload.QUOTA_DAILY_BUDGET // 2
+    assert b.quota_budget == 1600
+    assert os.path.isdir(tmp_path / "a")
+    assert a.token_file.endswith("token_a.json")
+
+    assert [channel.name for channel in channels.load_channels(str(tmp_path / "missing.json"))] == [None]
+    path.write_text(json.dumps([{"name": "../a"}]))
+    with pytest.raises(ValueError):
+        channels.load_channels(str(path))
+
+def test_run_uploads_each_channel_with_its_own_credentials(tmp_path):
+    """Test that every turn uploads with the channel's client and settings, and a channel out of quota is skipped."""
+    science = make_channel(tmp_path, "science", ["a.mp4", "b.mp4", "c.mp4"])
+    cooking = make_channel(tmp_path, "cooking", ["d.mp4"])
+    empty = make_channel(tmp_path, "empty", ["e.mp4"], quota_budget=0)
+    turns = []
+
+    def upload_batch(youtube, videos, keep_warm, stop_event, verify_timeout):
+        assert keep_warm and verify_timeout == 0
+        turns.append((youtube, upload_vids.VIDEO_FOLDER, videos))
+        return videos
+
+    with patch('upload_vids.get_authenticated_service', side_effect=lambda token_file: token_file), \
+            patch('upload_vids.upload_batch', side_effect=upload_batch), \
+            patch('upload_vids.release_warm_models') as release:
+        processed = channels.run([science, cooking, empty], batch_size=2)
+
+    assert turns == [
+        (science.token_file, science.videos, ["a.mp4", "b.mp4"]),
+        (cooking.token_file, cooking.videos, ["d.mp4"]),
+        (science.token_file, science.videos, ["c.mp4"]),
+    ]
+    assert processed == {"science": 3, "cooking": 1, "empty": 0}
+    release.assert_called_once()
+
+def test_second_channel_does_not_see_the_first_channels_ledger_quota_or_reports(tmp_path):
+    """Test that each turn's batch works on its own channel's ledger, quota and run report."""
+    seen = []
+
+    def process_videos(youtube, videos, current_schedule, quota, **kwargs):
+        ledger = upload_vids.get_ledger()
+        seen.append((ledger.path, [job["name"] for job in ledger.jobs()], quota.remaining()))
+        for video in videos:
+            ledger.discover(video)
+            assert quota.reserve()
+        return videos
+
+    with patch('instrumentation.RUN_REPORT_FILE', str(tmp_path / "reports" / "run_report.json")), \
+            patch('instrumentation.RUN_HISTORY_FILE', str(tmp_path / "reports" / "run_history.json")), \
+            patch('instrumentation.METRICS_TEXTFILE', str(tmp_path / "reports" / "uploader.prom")):
+        science = make_channel(tmp_path, "science", ["a.mp4", "b.mp4"], quota_budget=3200)
+        cooking = make_channel(tmp_path, "cooking", ["c.mp4"], quota_budget=3200)
+        with patch('upload_vids.get_authenticated_service', side_effect=lambda token_file: token_file), \
+                patch('upload_vids.process_videos', side_effect=process_videos), \
+                patch('upload_vids.release_warm_models'):
+            channels.run([science, cooking], batch_size=2)
+
+    assert seen == [(science.ledger_file, [], 3200), (cooking.ledger_file, [], 3200)]
+    with channels.Channel("science", ledger_file=science.ledger_file, quota_budget=3200).activate():
+        assert upload_vids.get_quota_ledger().remaining() == 3200 - 2 * youtube_upload.QUOTA_INSERT_COST
+    assert json.loads((tmp_path / "reports" / "run_history_science.json").read_text())[0]["videos"] == 2
+    assert json.loads((tmp_path / "reports" / "run_history_cooking.json").read_text())[0]["videos"] == 1
+    assert 'reels_uploader_run_seconds{channel="cooking"}' in (tmp_path / "reports" / "uploader_cooking.prom").read_text()
@@ -0,0 +1,106 @@
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+
+import numpy as np
+
+# Add parent directory to path to import the scripts
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import upload_vids
+from job_ledger import JobLedger
+from metadata_cache import MetadataCache
+
+HEAVY_MODULES = ["faster_whisper", "ollama", "numpy", "googleapiclient.discovery", "google_auth_oauthlib", "httplib2"]
+
+
+def test_import_time():
+    """Test that importing the scheduler does not pull in the heavy libraries."""
+    code = f"import sys, upload_vids; print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    cumulative = {line.split("|")[2].strip(): int(line.split("|")[1]) for line in result.stderr.splitlines()
+                  if line.startswith("import time:") and line.split("|")[1].strip().isdigit()}
+    print(f"\nupload_vids imports in {cumulative['upload_vids'] / 1000:.1f} ms")
+    assert cumulative["upload_vids"] < 300_000
+
+def test_empty_queue_exits_fast(tmp_path):
+    """Test that a run with nothing queued exits right away, without authenticating."""
+    (tmp_path / "videos").mkdir()
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, os.path.join(ROOT, "upload_vids.py")],
+                            cwd=tmp_path, capture_output=True, text=True, timeout=30)
+    elapsed = time.perf_counter() - started
+
+    assert result.returncode == 0, result.stderr
+    assert "Found 0 videos" in result.stdout
+    assert elapsed < 1.0
+    assert sorted(os.listdir(tmp_path)) == ["videos"]
+
+def test_status_and_plan(tmp_path, capsys):
+    """Test that status and plan report the queue, slots and quota, imported from the old state file."""
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    for name in ["b.mp4", "a.mp4", "c.mov", "notes.txt"]:
+        (videos_dir / name).write_bytes(b"x" * 1024)
+    future = datetime.datetime.now().replace(hour=12, minute=0, second=0, microsecond=0) + datetime.timedelta(days=30)
+    state = {
+        "last_scheduled_date": (future + datetime.timedelta(days=5)).isoformat(),
+        "free_slots": [future.isoformat()],
+        "quota_spent": {upload_vids.youtube_upload.quota_day(): 10000 - 2 * 1600},
+    }
+    (tmp_path / "state.json").write_text(json.dumps(state))
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), patch('upload_vids.STATE_FILE', str(tmp_path / "state.json")), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")):
+        upload_vids.main(["status"])
+        status = capsys.readouterr().out
+        upload_vids.main(["plan"])
+        plan = capsys.readouterr().out
+
+    assert "Queued videos: 3" in status
+    assert f"Planned slots: 1 (up to {future:%Y-%m-%d %H:%M} UTC)" in status
+    assert f"Next publish slot: {future:%Y-%m-%d %H:%M} UTC" in status
+    assert "~2 uploads" in status
+
+    lines = plan.splitlines()
+    # The free slot first, then the days after the last scheduled one; the plan is stored for the run
+    assert lines[0] == f"{future:%Y-%m-%d %H:%M} UTC  a.mp4"
+    assert lines[1] == f"{future + datetime.timedelta(days=6):%Y-%m-%d %H:%M} UTC  b.mp4"
+    assert lines[2] == f"{future + datetime.timedelta(days=7):%Y-%m-%d %H:%M} UTC  c.mov (next run, quota)"
+    with JobLedger(str(tmp_path / "jobs.sqlite3")) as ledger:
+        assert len(ledger.free_slots()) == 3
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_dry_run_does_not_upload(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that a dry run prepares metadata but leaves the files and the schedule alone."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = np.ones(16000, dtype=np.float32)
+    mock_transcription.transcribe.return_value = "hello"
+    mock_metadata.return_value = ("Title", "Description #shorts")
+
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    (videos_dir / "a.mp4").write_bytes(b"video")
+    start = datetime.datetime(2026, 1, 24, 12, tzinfo=datetime.timezone.utc)
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")):
+        processed = upload_vids.process_videos(None, ["a.mp4"], start, MetadataCache(str(tmp_path / "c.sqlite3")),
+                                               dry_run=True)
+        assert upload_vids.get_ledger().counts() == {}
+
+    assert [(job.name, job.title, job.publish_at) for job in processed] == [("a.mp4", "Title", start)]
+    mock_upload.assert_not_called()
+    assert os.listdir(videos_dir) == ["a.mp4"]
@@ -0,0 +1,147 @@
+import datetime
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dedup
+import upload_vids
+from job_ledger import JobLedger
+from metadata_cache import MetadataCache
+
+SAMPLE_RATE = 16000
+
+
+def song(seed, seconds=20):
+    # Overlapping tones at random pitches, loud enough to fingerprint
+    rng = np.random.default_rng(seed)
+    t = np.arange(SAMPLE_RATE * seconds) / SAMPLE_RATE
+    audio = np.zeros_like(t)
+    for _ in range(200):
+        length = int(rng.integers(2000, 8000))
+        start = int(rng.integers(0, len(t) - length))
+        audio[start:start + length] += np.sin(2 * np.pi * rng.uniform(200, 1800) * t[:length]) * rng.uniform(0.1, 0.5)
+    return audio.astype(np.float32)
+
+def frames(seed, count=dedup.FRAME_COUNT):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, 72, dtype=np.uint8).tobytes() for _ in range(count)]
+
+def reencoded(raw_frames):
+    # Slightly brighter, a little noise: a few dHash bits flip at most
+    rng = np.random.default_rng(99)
+    return [np.clip(np.frombuffer(frame, np.uint8) * 1.05 + rng.normal(0, 2, 72), 0, 255).astype(np.uint8).tobytes()
+            for frame in raw_frames]
+
+def fingerprint(raw_frames, audio):
+    with patch('dedup.extract_frames', return_value=raw_frames):
+        return dedup.Fingerprint.of("video.mp4", audio)
+
+def test_audio_fingerprint_survives_reencoding():
+    """Test that a quieter, delayed, noisy copy of a sound stays close and a different sound does not."""
+    original = song(1)
+    copy = 0.7 * np.concatenate([np.zeros(700, np.float32), original])[:len(original)]
+    copy = (copy + np.random.default_rng(0).normal(0, 0.003, len(copy))).astype(np.float32)
+    a, b, c = (dedup.Fingerprint([], dedup.audio_fingerprint(audio)) for audio in (original, copy, song(2)))
+
+    assert dedup.audio_distance(a, b) < 0.25
+    assert dedup.audio_distance(a, c) > 0.45
+    assert len(dedup.audio_fingerprint(np.zeros(SAMPLE_RATE * 5, np.float32))) == 0  # silent
+
+def test_index_finds_copies_of_uploaded_videos(tmp_path):
+    """Test that re-encoded copies match uploaded videos, and new audio over the same frames is only similar."""
+    path = str(tmp_path / "jobs.sqlite3")
+    raw, audio = frames(1), song(1)
+    with dedup.FingerprintIndex(path) as index:
+        index.add("a" * 64, "first.mp4", fingerprint(raw, audio))
+        assert index.match("b" * 64, fingerprint(reencoded(raw), audio)) is None  # not uploaded yet
+        index.mark_uploaded("a" * 64, "yt1")
+
+    with dedup.FingerprintIndex(path) as index:
+        match = index.match("b" * 64, fingerprint(reencoded(raw), audio))
+        assert match.duplicate and match.youtube_id == "yt1" and match.video <= 3
+
+        voice_over = index.match("c" * 64, fingerprint(reencoded(raw), song(2)))
+        assert voice_over and not voice_over.duplicate
+
+        assert index.match("d" * 64, fingerprint(frames(2), audio)) is None  # same sound, other video
+        assert index.match("a" * 64).exact
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_duplicate_in_the_same_run_is_set_aside(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that the second copy of a video is moved aside before it is transcribed or uploaded."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = song(1)
+    mock_transcription.transcribe.return_value = "hello"
+    mock_metadata.return_value = ("Title", "Description #shorts")
+    mock_upload.return_value = {"id": "yt1"}
+
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    (videos_dir / "a.mp4").write_bytes(b"original")
+    (videos_dir / "b.mp4").write_bytes(b"re-encoded copy")
+    raw = frames(1)
+    start = datetime.datetime(2026, 1, 24, 12, tzinfo=datetime.timezone.utc)
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")), \
+            patch('dedup.DUPLICATE_FOLDER', str(tmp_path / "duplicates")), \
+            patch('dedup.extract_frames', side_effect=lambda path: raw if path.endswith("a.mp4") else reencoded(raw)):
+        processed = upload_vids.process_videos(MagicMock(), ["a.mp4", "b.mp4"], start,
+                                               MetadataCache(str(tmp_path / "c.sqlite3")), upload_workers=1)
+
+    assert [job.name for job in processed] == ["a.mp4"]
+    mock_transcription.transcribe.assert_called_once()
+    mock_upload.assert_called_once()
+    assert os.listdir(tmp_path / "duplicates") == ["b.mp4"]
+    with JobLedger(str(tmp_path / "jobs.sqlite3")) as ledger:
+        [duplicate] = ledger.jobs("duplicate")
+        # Points at the YouTube video when a.mp4 was already uploaded by the time b.mp4 was checked
+        assert duplicate["name"] == "b.mp4" and duplicate["duplicate_of"] in ("a.mp4", "yt1")
+    with dedup.FingerprintIndex(str(tmp_path / "jobs.sqlite3")) as index:
+        assert index.match(upload_vids.metadata_cache.content_hash(str(tmp_path / "duplicates" / "b.mp4"))) is None
+        assert index.stats()["uploaded"] == 1
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_identical_copy_gets_its_own_job(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that a byte-identical copy in the same batch does not take over the original's job."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = song(1)
+    mock_transcription.transcribe.return_value = "hello"
+    mock_metadata.return_value = ("Title", "Description #shorts")
+    mock_upload.return_value = {"id": "yt1"}
+
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    for name in ("a.mp4", "b.mp4"):
+        (videos_dir / name).write_bytes(b"same bytes")
+    raw = frames(1)
+    start = datetime.datetime(2026, 1, 24, 12, tzinfo=datetime.timezone.utc)
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")), \
+            patch('dedup.DUPLICATE_FOLDER', str(tmp_path / "duplicates")), \
+            patch('dedup.extract_frames', return_value=raw), \
+            patch('youtube_upload.wait_for_processing', return_value={"yt1": (upload_vids.youtube_upload.PROCESSED, None)}):
+        processed = upload_vids.process_videos(MagicMock(), ["a.mp4", "b.mp4"], start,
+                                               MetadataCache(str(tmp_path / "c.sqlite3")), upload_workers=1,
+                                               verify=True)
+
+    assert [job.name for job in processed] == ["a.mp4"]
+    assert os.listdir(videos_dir) == []  # the verified original is deleted, not left behind
+    assert os.listdir(tmp_path / "duplicates") == ["b.mp4"]
+    with JobLedger(str(tmp_path / "jobs.sqlite3")) as ledger:
+        [original] = ledger.jobs("uploaded")
+        [duplicate] = ledger.jobs("duplicate")
+        assert original["name"] == "a.mp4" and original["youtube_id"] == "yt1"
+        assert duplicate["name"] == "b.mp4" and duplicate["id"] != original["id"]
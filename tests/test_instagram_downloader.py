@@ -0,0 +1,61 @@
+import datetime
+import os
+import sys
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import instagram_downloader
+
+
+class FakePost:
+    def __init__(self, shortcode, is_video=True):
+        self.shortcode = shortcode
+        self.is_video = is_video
+        self.video_url = f"https://cdn.example/{shortcode}.mp4"
+        self.date_utc = datetime.datetime(2026, 1, 24, 12)
+        self.caption = f"Caption of {shortcode} #fyp"
+
+def fake_loader(in_flight, peak, lock):
+    loader = MagicMock()
+    loader.format_filename.side_effect = lambda post: post.shortcode
+
+    def get_raw(url):
+        if "broken" in url:
+            raise ConnectionError("connection reset")
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        response = MagicMock()
+        response.iter_content.return_value = [b"a" * 4, b"b" * 4, b"c" * 2]
+        return response
+
+    loader.context.get_raw.side_effect = get_raw
+    return loader
+
+def test_downloads_in_parallel_and_keeps_going(tmp_path):
+    """Test that posts stream in parallel over one session and a failed post does not stop the batch."""
+    in_flight, peak, lock = [0], [0], threading.Lock()
+    loader = fake_loader(in_flight, peak, lock)
+    posts = {code: FakePost(code) for code in ["one", "two", "broken", "three"]}
+    posts["photo"] = FakePost("photo", is_video=False)
+    (tmp_path / "three.mp4").write_bytes(b"old")
+
+    with patch('instagram_downloader.instaloader.Post.from_shortcode', side_effect=lambda context, code: posts[code]):
+        downloader = instagram_downloader.Downloader(str(tmp_path), loader=loader, workers=3, chunk_size=4)
+        results = downloader.download(["one", "two", "broken", "three", "photo"])
+
+    assert [result.shortcode for result in results] == ["one", "two", "broken", "three", "photo"]
+    assert [result.ok for result in results] == [True, True, False, True, False]
+    assert results[3].skipped
+    assert peak[0] > 1
+    assert sorted(os.listdir(tmp_path)) == ["one.mp4", "one.txt", "three.mp4", "two.mp4", "two.txt"]  # no .part leftovers
+    assert (tmp_path / "one.txt").read_text(encoding="utf-8") == "Caption of one #fyp"
+    assert (tmp_path / "one.mp4").read_bytes() == b"aaaabbbbcc"
+    assert os.path.getmtime(tmp_path / "one.mp4") == datetime.datetime(2026, 1, 24, 12, tzinfo=datetime.timezone.utc).timestamp()
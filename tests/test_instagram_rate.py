@@ -0,0 +1,90 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import instagram_rate
+import instagram_downloader
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.slept.append(secs)
+        self.now += secs
+
+def controller(path, clock):
+    rate = instagram_rate.AdaptiveRateController(str(path), clock=clock, sleep=clock.sleep)
+    return rate.attach(MagicMock())
+
+def test_token_bucket_spaces_queries(tmp_path):
+    """Test that queries beyond the first token wait for the configured rate."""
+    clock = FakeClock()
+    with patch.object(instagram_rate, "MAX_RPM", 12):
+        rate = controller(tmp_path / "rate.json", clock)
+        assert rate.acquire() == 0
+        assert rate.acquire() == 5  # 12 per minute
+        clock.now += 5
+        assert rate.acquire() == 5
+
+def test_throttle_slows_down_and_persists(tmp_path):
+    """Test that a throttle halves the rate, pauses, and that the next run starts slow and ramps back up."""
+    path, clock = tmp_path / "rate.json", FakeClock()
+    with patch.object(instagram_rate, "MAX_RPM", 16), patch.object(instagram_rate, "COOLDOWN_SECONDS", 300):
+        rate = controller(path, clock)
+        rate.wait_before_query("other")
+        rate.handle_429("other")
+        assert rate.rate == 8
+        assert clock.slept == [300]
+        assert rate.throttled() == 600  # doubles while Instagram keeps refusing
+        assert rate.rate == 4
+        assert rate.metrics()["throttles"] == 2
+
+        # The next run remembers the lower rate and waits out the cooldown
+        rerun = controller(path, clock)
+        assert rerun.rate == 4
+        assert rerun.acquire() == 600
+
+        clock.now += 3 * instagram_rate.RAMP_SECONDS
+        rerun.acquire()
+        assert rerun.rate == 7
+        assert rerun.throttles_in_a_row == 0
+
+def test_throttle_errors_feed_the_controller(tmp_path):
+    """Test that a 'Please wait a few minutes' failure slows the downloader down and the state is saved at the end."""
+    rate = MagicMock()
+    rate.metrics.return_value = {"requests": 2, "requests_per_minute": 2, "rate_limit_per_minute": 9, "throttles": 1}
+    loader = MagicMock()
+    error = instagram_downloader.instaloader.exceptions.ConnectionException("Please wait a few minutes before you try again.")
+    with patch('instagram_downloader.instaloader.Post.from_shortcode', side_effect=error):
+        downloader = instagram_downloader.Downloader(str(tmp_path), loader=loader, rate=rate)
+        results = downloader.download(["abc", "def"])
+        downloader.finish()
+
+    assert not any(result.ok for result in results)
+    assert rate.throttled.call_count == 2
+    rate.save.assert_called_once()
+    assert instagram_rate.is_throttle_error(error)
+    assert not instagram_rate.is_throttle_error(ValueError("not a video"))
+
+def test_retried_429_is_recorded_once(tmp_path):
+    """Test that a 429 Instaloader already passed to handle_429 is not recorded again by the downloader."""
+    exceptions = instagram_downloader.instaloader.exceptions
+    # What Instaloader raises once its retries (each reported through handle_429) are used up
+    error = exceptions.ConnectionException("JSON Query to graphql/query: 429 Too Many Requests")
+    error.__cause__ = exceptions.TooManyRequestsException("429 Too Many Requests")
+    rate = MagicMock()
+    with patch('instagram_downloader.instaloader.Post.from_shortcode', side_effect=error):
+        results = instagram_downloader.Downloader(str(tmp_path), loader=MagicMock(), rate=rate).download(["abc"])
+
+    assert not results[0].ok
+    rate.throttled.assert_not_called()
+    assert instagram_rate.is_throttle_error(error) and not instagram_rate.is_unrecorded_throttle(error)
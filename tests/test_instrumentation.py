@@ -0,0 +1,103 @@
+import datetime
+import json
+import os
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import instrumentation
+import upload_vids
+from metadata_cache import MetadataCache
+
+
+def test_recorder_attributes_substeps_to_video():
+    """Test that nested measurements belong to the video of the enclosing stage."""
+    recorder = instrumentation.RunRecorder()
+    with recorder.measure("upload", "a.mp4"):
+        with recorder.measure("state_write"):
+            pass
+        time.sleep(0.01)
+        recorder.add(bytes=1000)
+
+    try:
+        with recorder.measure("transcribe", "b.mp4"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    stages = recorder.stage_summary()
+    assert stages["upload"]["calls"] == 1
+    assert stages["upload"]["wall_seconds"] >= 0.01
+    assert 0 < stages["upload"]["bytes_per_second"] <= 100000
+    assert stages["transcribe"]["failed"] == 1
+
+    videos = recorder.video_summary()
+    assert set(videos["a.mp4"]) == {"upload", "state_write"}
+    assert videos["a.mp4"]["upload"]["rss_bytes_at_end"] > 0
+    assert videos["b.mp4"]["transcribe"]["failed"]
+
+def test_measure_without_run_is_noop():
+    """Test that helpers can be called outside of a recorded run."""
+    assert instrumentation._recorder is None
+    with instrumentation.measure("ollama") as sample:
+        instrumentation.add(bytes=5)
+    assert sample == {}
+    assert instrumentation.finish_run() is None
+
+def test_estimate_from_history():
+    """Test that the ETA uses measured seconds per video, falling back to a minute per video."""
+    assert instrumentation.estimate_seconds(3, history=[]) == (180, 0)
+    history = [{"videos": 2, "wall_seconds": 50}, {"videos": 0, "wall_seconds": 5}, {"videos": 3, "wall_seconds": 100}]
+    assert instrumentation.estimate_seconds(4, history=history) == (120, 2)
+    assert instrumentation.format_duration(3725) == "1h 02m"
+    assert instrumentation.format_duration(75) == "1m 15s"
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_run_report_and_metrics(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that a recorded run writes the JSON report, the Prometheus textfile and the history."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = np.ones(16000, dtype=np.float32)
+    mock_transcription.transcribe.return_value = "hello"
+    mock_metadata.return_value = ("Title", "Description #shorts")
+    mock_upload.return_value = {"id": "1"}
+
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    for name in ["a.mp4", "b.mp4"]:
+        (videos_dir / name).write_bytes(b"x" * 2048)
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")), \
+            patch('instrumentation.RUN_REPORT_FILE', str(tmp_path / "reports" / "run_report.json")), \
+            patch('instrumentation.RUN_HISTORY_FILE', str(tmp_path / "reports" / "run_history.json")), \
+            patch('instrumentation.METRICS_TEXTFILE', str(tmp_path / "reports" / "uploader.prom")):
+        instrumentation.start_run()
+        processed = upload_vids.process_videos(MagicMock(), ["a.mp4", "b.mp4"], datetime.datetime(2026, 1, 24, 12),
+                                               MetadataCache(str(tmp_path / "c.sqlite3")), upload_workers=1)
+        instrumentation.finish_run(found=2, processed=len(processed))
+        eta, runs = instrumentation.estimate_seconds(10)
+
+    report = json.loads((tmp_path / "reports" / "run_report.json").read_text())
+    assert report["videos"] == {"found": 2, "processed": 2}
+    assert {"cache_lookup", "extract_audio", "transcribe", "metadata", "schedule", "upload", "commit",
+            "state_write"} <= set(report["stages"])
+    assert report["stages"]["upload"]["calls"] == 2
+    assert report["per_video"]["a.mp4"]["upload"]["bytes"] == 2048
+    assert "transcribe" in report["per_video"]["b.mp4"]
+
+    metrics = (tmp_path / "reports" / "uploader.prom").read_text()
+    assert 'reels_uploader_stage_seconds{stage="transcribe"}' in metrics
+    assert 'reels_uploader_videos{result="processed"} 2' in metrics
+    assert "# TYPE reels_uploader_bytes_per_second gauge" in metrics
+
+    assert runs == 1
+    assert eta == pytest.approx(5 * report["wall_seconds"])
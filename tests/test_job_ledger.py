@@ -0,0 +1,92 @@
+import datetime
+import json
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import job_ledger
+import upload_vids
+from job_ledger import JobLedger
+from metadata_cache import MetadataCache, content_hash
+
+HASH = "ab" * 32
+
+
+def test_job_lifecycle(tmp_path):
+    """Test that a job moves through its states and the schedule lookups follow it."""
+    with JobLedger(str(tmp_path / "jobs.sqlite3")) as ledger:
+        assert ledger._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        job = ledger.discover("a.mp4", HASH)
+        assert job["state"] == job_ledger.DISCOVERED
+        # Renamed file, same contents: same job
+        assert ledger.discover("renamed.mp4", HASH)["id"] == job["id"]
+
+        slot = datetime.datetime(2026, 1, 24, 12, tzinfo=datetime.timezone.utc)
+        ledger.update(job["id"], job_ledger.UPLOADING, publish_at=job_ledger.format_slot(slot))
+        ledger.save_session(job["id"], "https://upload/session", 1024)
+        assert ledger.session(job["id"]) == {"uri": "https://upload/session", "offset": 1024, "publish_at": slot}
+        assert [pending["name"] for pending in ledger.pending()] == ["renamed.mp4"]
+
+        ledger.add_free_slot(slot)
+        ledger.mark_uploaded(job["id"], "yt1", slot)
+        job = ledger.get(job["id"])
+        assert (job["state"], job["youtube_id"], job["upload_uri"]) == (job_ledger.UPLOADED, "yt1", None)
+        assert job["uploaded_at"] >= job["upload_started_at"] >= job["discovered_at"]
+        assert ledger.session(job["id"]) is None
+        assert ledger.pending() == []
+        assert ledger.free_slots() == []
+        assert ledger.last_scheduled() == slot
+
+def test_migrates_json_state_once(tmp_path):
+    """Test that the old state file is imported once and left in place."""
+    state_file = tmp_path / "schedule_state.json"
+    state = {
+        "last_scheduled_date": "2026-01-30T12:00:00",
+        "free_slots": ["2026-01-28T12:00:00"],
+        "upload_sessions": {HASH: {"uri": "https://upload/session", "offset": 200, "publish_at": "2026-01-29T12:00:00"}},
+        "quota_spent": {"2026-01-24": 3200},
+        "failures": {"broken.mp4": {"name": "broken.mp4", "count": 2, "stage": "extract_audio", "error": "bad"}},
+    }
+    state_file.write_text(json.dumps(state))
+
+    with JobLedger(str(tmp_path / "jobs.sqlite3")) as ledger:
+        assert ledger.migrate_json(str(state_file))
+        assert not ledger.migrate_json(str(state_file))
+        # The old file's times were sent to YouTube as UTC
+        assert ledger.last_scheduled() == datetime.datetime(2026, 1, 30, 12, tzinfo=datetime.timezone.utc)
+        assert ledger.free_slots() == [datetime.datetime(2026, 1, 28, 12, tzinfo=datetime.timezone.utc)]
+        assert ledger.quota_spent() == {"2026-01-24": 3200}
+        assert ledger.counts() == {job_ledger.UPLOADING: 1, job_ledger.FAILED: 1}
+        assert ledger.session(ledger.find(HASH)["id"])["offset"] == 200
+        # Failures are matched by name when the video could not be hashed
+        broken = ledger.discover("broken.mp4")
+        assert (broken["failures"], broken["failed_stage"]) == (2, "extract_audio")
+
+    assert json.loads(state_file.read_text()) == state
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_uploaded_video_left_behind_is_not_uploaded_again(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that a file whose upload was recorded but not deleted (crash) is removed instead of re-uploaded."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    (videos_dir / "a.mp4").write_bytes(b"video")
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")):
+        ledger = upload_vids.get_ledger()
+        job = ledger.discover("a.mp4", content_hash(str(videos_dir / "a.mp4")))
+        ledger.mark_uploaded(job["id"], "yt1", datetime.datetime(2026, 1, 24, 12, tzinfo=datetime.timezone.utc))
+
+        processed = upload_vids.process_videos(MagicMock(), ["a.mp4"], datetime.datetime(2026, 1, 25, 12),
+                                               MetadataCache(str(tmp_path / "c.sqlite3")), upload_workers=1)
+
+    assert processed == []
+    mock_upload.assert_not_called()
+    assert os.listdir(videos_dir) == []
@@ -0,0 +1,158 @@
+import datetime
+import os
+import struct
+import sys
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import media_prep
+import upload_vids
+from metadata_cache import MetadataCache
+
+
+def box(kind, payload=b""):
+    return struct.pack(">I4s", 8 + len(payload), kind.encode()) + payload
+
+def write_mp4(path, *boxes):
+    path.write_bytes(b"".join(boxes))
+    return str(path)
+
+def fake_ffmpeg(output=b"remuxed"):
+    # Writes `output` to the target file like ffmpeg would
+    def run(command, **kwargs):
+        with open(command[-1], "wb") as f:
+            f.write(output)
+        return MagicMock(returncode=0)
+    return run
+
+def test_moov_after_mdat_needs_faststart(tmp_path):
+    """Test that the box order is read from the headers, including 64-bit sizes."""
+    large_mdat = struct.pack(">I4sQ", 1, b"mdat", 16 + 4) + b"data"
+    streamed = write_mp4(tmp_path / "a.mp4", box("ftyp", b"isom"), large_mdat, box("moov", b"index"))
+    faststart = write_mp4(tmp_path / "b.mp4", box("ftyp", b"isom"), box("moov", b"index"), box("mdat", b"data"))
+
+    assert media_prep.top_level_boxes(streamed) == ["ftyp", "mdat", "moov"]
+    assert media_prep.needs_faststart(streamed)
+    assert not media_prep.needs_faststart(faststart)
+    assert media_prep.plan(faststart, "remux") is None
+    assert media_prep.plan(streamed, "off") is None
+
+def test_prepared_copies_are_cached_by_content_hash(tmp_path):
+    """Test that a remuxed copy is made once per content hash and discarded after the upload."""
+    video = write_mp4(tmp_path / "a.mp4", box("ftyp"), box("mdat", b"x" * 100), box("moov"))
+
+    with patch.object(media_prep, "MEDIA_CACHE_FOLDER", str(tmp_path / "prepared")), \
+            patch("media_prep.subprocess.run", side_effect=fake_ffmpeg()) as ffmpeg:
+        first = media_prep.prepare(video, "abc", "remux")
+        second = media_prep.prepare(video, "abc", "remux")
+        assert ffmpeg.call_count == 1
+        assert "-c" in ffmpeg.call_args[0][0] and "+faststart" in ffmpeg.call_args[0][0]
+        assert first.path == second.path == str(tmp_path / "prepared" / "abc.mp4")
+        assert first.action == "remux" and second.cached
+        assert first.saved_bytes == os.path.getsize(video) - len(b"remuxed")
+        assert os.listdir(tmp_path / "prepared") == ["abc.mp4"]  # no .part left behind
+
+        media_prep.discard("abc")
+        assert os.listdir(tmp_path / "prepared") == []
+
+def test_transcode_only_when_over_budget_and_smaller(tmp_path):
+    """Test that an oversized file is transcoded, and a transcode that does not shrink it falls back to a remux."""
+    video = write_mp4(tmp_path / "a.mp4", box("ftyp"), box("mdat", b"x" * 1000), box("moov"))
+
+    with patch.object(media_prep, "MEDIA_CACHE_FOLDER", str(tmp_path / "prepared")), \
+            patch("media_prep.probe", return_value=(10.0, 2160, 3840)):
+        assert media_prep.plan(video, "transcode") == "transcode"
+        with patch("media_prep.subprocess.run", side_effect=fake_ffmpeg(b"small")) as ffmpeg:
+            prepared = media_prep.prepare(video, "big", "transcode")
+        assert prepared.action == "transcode"
+        assert "libx264" in ffmpeg.call_args[0][0]
+
+        with patch("media_prep.subprocess.run", side_effect=fake_ffmpeg(b"y" * 5000)) as ffmpeg:
+            prepared = media_prep.prepare(video, "efficient", "transcode")
+        assert prepared.action == "remux"
+        assert ffmpeg.call_count == 2
+
+    with patch("media_prep.probe", return_value=(10.0, 1080, 1920)):
+        assert not media_prep.over_budget(video)  # 1 KB over 10 s
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_pipeline_uploads_the_prepared_copy(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that the upload sends the remuxed copy and that the copy is gone once the upload is recorded."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = np.ones(16000, dtype=np.float32)
+    mock_transcription.transcribe.return_value = "hello"
+    mock_metadata.return_value = ("Title", "Description #shorts")
+    sent = []
+
+    def upload(youtube, path, date_time, **kwargs):
+        with open(path, "rb") as f:
+            sent.append(f.read())
+        return {"id": "yt"}
+
+    mock_upload.side_effect = upload
+
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    write_mp4(videos_dir / "a.mp4", box("ftyp"), box("mdat", b"x" * 100), box("moov"))
+    start = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")), \
+            patch('dedup.DEDUP_MODE', "off"), \
+            patch.object(media_prep, "MEDIA_CACHE_FOLDER", str(tmp_path / "prepared")), \
+            patch("media_prep.subprocess.run", side_effect=fake_ffmpeg()):
+        processed = upload_vids.process_videos(MagicMock(), ["a.mp4"], start,
+                                               MetadataCache(str(tmp_path / "c.sqlite3")), upload_workers=1,
+                                               verify=False)
+
+    assert [job.name for job in processed] == ["a.mp4"]
+    assert sent == [b"remuxed"]
+    assert os.listdir(videos_dir) == [] and os.listdir(tmp_path / "prepared") == []
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_reused_copies_do_not_count_as_savings(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that only a copy made by this run adds saved bytes, and the log names the action."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = np.ones(16000, dtype=np.float32)
+    mock_transcription.transcribe.return_value = "hello"
+    mock_metadata.return_value = ("Title", "Description #shorts")
+    mock_upload.side_effect = lambda youtube, path, date_time, **kwargs: {"id": os.path.basename(path)}
+
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    copies = {}
+    for name in ("a.mp4", "b.mp4"):
+        (videos_dir / name).write_bytes(b"x" * 100 + name.encode())
+        copies[name] = tmp_path / ("copy_" + name)
+        copies[name].write_bytes(b"small")
+
+    def prepare(path, content_hash):
+        name = os.path.basename(path)
+        action, cached = ("cached", True) if name == "a.mp4" else (media_prep.TRANSCODE, False)
+        return media_prep.Prepared(str(copies[name]), action, os.path.getsize(path), cached=cached)
+
+    start = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")), \
+            patch('dedup.DEDUP_MODE', "off"), \
+            patch('media_prep.prepare', side_effect=prepare), \
+            patch('media_prep.discard'), patch('media_prep.prune'), \
+            patch('upload_vids.instrumentation.add') as add, \
+            patch('builtins.print') as mock_print:
+        upload_vids.process_videos(MagicMock(), ["a.mp4", "b.mp4"], start, MetadataCache(str(tmp_path / "c.sqlite3")),
+                                   upload_workers=1, verify=False)
+
+    saved = [call.kwargs["saved_bytes"] for call in add.call_args_list if "saved_bytes" in call.kwargs]
+    assert saved == [105 - 5]  # b.mp4 only
+    mock_print.assert_any_call("a.mp4: reused the prepared copy, 0.0 MiB smaller.")
+    mock_print.assert_any_call("b.mp4: transcoded, 0.0 MiB smaller.")
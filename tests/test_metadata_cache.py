@@ -0,0 +1,128 @@
+import datetime
+import os
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metadata_cache
+import upload_vids
+from metadata_cache import MetadataCache
+
+
+def test_content_hash_depends_on_bytes_only(tmp_path):
+    """Test that renamed copies share a hash and different contents do not."""
+    (tmp_path / "a.mp4").write_bytes(b"same bytes")
+    (tmp_path / "b.mp4").write_bytes(b"same bytes")
+    (tmp_path / "c.mp4").write_bytes(b"other bytes")
+
+    digest = metadata_cache.content_hash(str(tmp_path / "a.mp4"))
+    assert digest == metadata_cache.content_hash(str(tmp_path / "b.mp4"), chunk_size=3)
+    assert digest != metadata_cache.content_hash(str(tmp_path / "c.mp4"))
+
+def test_cache_roundtrip_and_keys(tmp_path):
+    """Test that entries are keyed by content hash, model and prompt version."""
+    with MetadataCache(str(tmp_path / "cache.sqlite3")) as cache:
+        cache.put_transcript("abc", "base/int8", "hello there")
+        cache.put_metadata("abc", "base/int8", "gemma3:1b", "v1", "Title", "Desc #shorts")
+
+        assert cache.get_transcript("abc", "base/int8") == "hello there"
+        assert cache.get_transcript("abc", "small/int8") is None
+        assert cache.get_metadata("abc", "base/int8", "gemma3:1b", "v1") == ("Title", "Desc #shorts")
+        assert cache.get_metadata("abc", "base/int8", "gemma3:1b", "v2") is None
+
+    # Persistent across instances
+    with MetadataCache(str(tmp_path / "cache.sqlite3")) as cache:
+        assert cache.stats()["metadata"] == 1
+
+def test_cache_prune(tmp_path):
+    """Test age- and size-based eviction."""
+    with MetadataCache(str(tmp_path / "cache.sqlite3")) as cache:
+        for i in range(5):
+            cache.put_transcript(f"hash{i}", "base/int8", "text")
+        # Pretend the first entry has not been used for 40 days
+        with patch('metadata_cache.time.time', return_value=time.time() - 40 * 86400):
+            cache.put_transcript("old", "base/int8", "text")
+
+        assert cache.prune(max_age_days=30, max_entries=100) == 1
+        assert cache.get_transcript("old", "base/int8") is None
+
+        # Touching an entry keeps it when trimming to the most recently used ones
+        time.sleep(0.01)
+        cache.get_transcript("hash0", "base/int8")
+        assert cache.prune(max_age_days=30, max_entries=2) == 3
+        assert cache.get_transcript("hash0", "base/int8") == "text"
+
+def test_cache_cli(tmp_path, capsys):
+    """Test the inspect/prune command line."""
+    path = str(tmp_path / "cache.sqlite3")
+    with MetadataCache(path) as cache:
+        cache.put_metadata("abcdef1234567890", "base/int8", "gemma3:1b", "v1", "Cached Title", "Desc")
+
+    metadata_cache.main(["--file", path, "stats"])
+    metadata_cache.main(["--file", path, "list"])
+    metadata_cache.main(["--file", path, "prune", "--max-entries", "0"])
+    output = capsys.readouterr().out
+
+    assert "Metadata: 1" in output
+    assert "Cached Title" in output
+    assert "Removed 1 cache entries." in output
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_retry_only_pays_for_upload(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that a video left behind by a failed upload is not transcribed or sent to Ollama again."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = np.ones(16000, dtype=np.float32)
+    mock_transcription.transcribe.return_value = "hello"
+    mock_metadata.return_value = ("Title", "Description #shorts")
+
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    (videos_dir / "a.mp4").write_bytes(b"video")
+    start = datetime.datetime(2026, 1, 24, 12, 0, 0)
+
+    mock_upload.side_effect = [Exception("upload failed"), {"id": "1"}]
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")):
+        for _ in range(2):
+            cache = MetadataCache(str(tmp_path / "cache.sqlite3"))
+            upload_vids.process_videos(MagicMock(), ["a.mp4"], start, cache)
+
+    assert mock_upload.call_count == 2
+    assert mock_upload.call_args.kwargs["metadata"] == ("Title", "Description #shorts")
+    mock_transcription.extract_audio.assert_called_once()
+    mock_transcription.transcribe.assert_called_once()
+    mock_metadata.assert_called_once()
+    assert os.listdir(videos_dir) == []
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_reel_without_speech_uses_its_caption(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that a music-only reel is described from its Instagram caption, which is deleted with the video."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = np.ones(16000, dtype=np.float32)
+    mock_transcription.transcribe.return_value = ""  # no speech found
+    mock_metadata.return_value = ("Title", "Description #shorts")
+    mock_upload.return_value = {"id": "1"}
+
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    (videos_dir / "a.mp4").write_bytes(b"video")
+    (videos_dir / "a.txt").write_text("Sunset over the harbour #travel", encoding="utf-8")
+    start = datetime.datetime(2026, 1, 24, 12, 0, 0)
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")):
+        upload_vids.process_videos(MagicMock(), ["a.mp4"], start, MetadataCache(str(tmp_path / "cache.sqlite3")))
+
+    assert mock_metadata.call_args.args[0] == "Sunset over the harbour #travel"
+    assert os.listdir(videos_dir) == []
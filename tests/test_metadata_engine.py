@@ -0,0 +1,95 @@
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+# Add parent directory to path to import metadata_engine
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metadata_engine
+
+
+def chat_reply(title):
+    return {'message': {'content': json.dumps({"title": f" {title} ", "description": "Desc"})}}
+
+@patch('ollama.Client')
+def test_engine_reuses_client_and_keeps_model_alive(mock_client_cls):
+    """Test that one client serves every video and asks Ollama to keep the model loaded."""
+    mock_client = mock_client_cls.return_value
+    mock_client.chat.return_value = chat_reply("Title")
+
+    engine = metadata_engine.MetadataEngine(host="http://ollama:11434", keep_alive="15m")
+    assert engine.generate("first") == ("Title", "Desc #shorts")
+    assert engine.generate("second") == ("Title", "Desc #shorts")
+
+    mock_client_cls.assert_called_once_with(host="http://ollama:11434")
+    assert mock_client.chat.call_count == 2
+    _, kwargs = mock_client.chat.call_args
+    assert kwargs['keep_alive'] == "15m"
+    assert kwargs['format'] == 'json'
+    assert "second" in kwargs['messages'][0]['content']
+
+    engine.release()
+    mock_client.generate.assert_called_once_with(model=engine.model, prompt="", keep_alive=0)
+
+@patch('ollama.Client')
+def test_engine_rejects_incomplete_answers(mock_client_cls):
+    """Test that a reply without title/description raises so the caller can fall back."""
+    mock_client_cls.return_value.chat.return_value = {'message': {'content': '{"title": "only"}'}}
+
+    with pytest.raises(KeyError):
+        metadata_engine.MetadataEngine().generate("text")
+
+@patch('ollama.Client')
+def test_concurrent_prompts_are_bounded(mock_client_cls):
+    """Test that metadata workers share one client and never have more than `concurrency` prompts in flight."""
+    in_flight = [0]
+    peak = [0]
+    lock = threading.Lock()
+
+    def chat(model, messages, **kwargs):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.02)
+        with lock:
+            in_flight[0] -= 1
+        content = messages[0]['content']
+        if "broken" in content:
+            raise ConnectionError("ollama hiccup")
+        return chat_reply(content.split('CONTENT: "')[1].split('"')[0])
+
+    mock_client_cls.return_value.chat.side_effect = chat
+
+    engine = metadata_engine.MetadataEngine(concurrency=3)
+    with ThreadPoolExecutor(max_workers=6) as executor:  # more workers than the engine allows
+        futures = [executor.submit(engine.generate, transcript) for transcript in ["a", "b", "broken", "d", "e", "f"]]
+
+    assert [future.result()[0] for index, future in enumerate(futures) if index != 2] == ["a", "b", "d", "e", "f"]
+    assert isinstance(futures[2].exception(), ConnectionError)
+    assert 1 < peak[0] <= 3
+    mock_client_cls.assert_called_once()
+
+@patch('ollama.Client')
+def test_release_without_use_skips_ollama(mock_client_cls):
+    """Test that releasing an unused engine does not connect to Ollama."""
+    metadata_engine.MetadataEngine().release()
+    mock_client_cls.assert_not_called()
+
+@patch('ollama.Client')
+def test_release_warm_models_closes_the_client(mock_client_cls):
+    """Test that shutting down unloads the model and closes the shared client's connections."""
+    import upload_vids
+
+    engine = metadata_engine.MetadataEngine()
+    engine.client  # connected, as after a batch
+    with patch('metadata_engine.get_engine', return_value=engine), patch('upload_vids.transcription'):
+        upload_vids.release_warm_models()
+
+    mock_client_cls.return_value.generate.assert_called_once_with(model=engine.model, prompt="", keep_alive=0)
+    mock_client_cls.return_value.close.assert_called_once()
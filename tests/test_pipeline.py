@@ -0,0 +1,160 @@
+import datetime
+import os
+import random
+import sys
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import upload_vids
+from job_ledger import JobLedger
+from metadata_cache import MetadataCache, content_hash
+from pipeline import Pipeline, Stage
+
+
+def test_pipeline_keeps_order():
+    """Test that items come out of the pipeline in the order they went in."""
+    pipeline = Pipeline([
+        Stage("double", lambda x: x * 2),
+        Stage("increment", lambda x: x + 1),
+    ])
+
+    assert pipeline.run(range(20)) == [x * 2 + 1 for x in range(20)]
+
+def test_pipeline_stages_overlap():
+    """Test that a slow later stage does not stop earlier stages from working ahead."""
+    second_item_prepared = threading.Event()
+
+    def prepare(x):
+        if x == 1:
+            second_item_prepared.set()
+        return x
+
+    def upload(x):
+        # The first "upload" only finishes once the next item has been prepared in parallel
+        if x == 0:
+            assert second_item_prepared.wait(timeout=5)
+        return x
+
+    pipeline = Pipeline([Stage("prepare", prepare), Stage("upload", upload)])
+    assert pipeline.run([0, 1, 2]) == [0, 1, 2]
+
+def test_pipeline_stops_after_failure():
+    """Test that items ahead of a failure finish and items behind it are discarded."""
+    seen_by_last_stage = []
+
+    def fail_on_three(x):
+        if x == 3:
+            raise ValueError("boom")
+        return x
+
+    def record(x):
+        seen_by_last_stage.append(x)
+        return x
+
+    finished = MagicMock()
+    pipeline = Pipeline([
+        Stage("check", fail_on_three, on_finish=finished),
+        Stage("record", record),
+    ])
+    completed = pipeline.run(range(10))
+
+    assert completed == [0, 1, 2]
+    assert seen_by_last_stage == [0, 1, 2]
+    assert len(pipeline.errors) == 1
+    assert pipeline.errors[0][0] == 3 and pipeline.errors[0][1] == "check"
+    finished.assert_called_once()
+
+def test_pipeline_error_handler_can_continue():
+    """Test that the error handler can drop a failing item and keep going."""
+    def fail_on_odd(x):
+        if x % 2:
+            raise ValueError("odd")
+        return x
+
+    pipeline = Pipeline([Stage("even", fail_on_odd, workers=3)], error_handler=lambda item, stage, e: False)
+    assert sorted(pipeline.run(range(10))) == [0, 2, 4, 6, 8]
+    assert len(pipeline.errors) == 5
+
+def test_pipeline_survives_failing_handlers():
+    """Test that a raising error handler or on_finish stops the run cleanly instead of hanging it."""
+    def fail_on_three(x):
+        if x == 3:
+            raise ValueError("boom")
+        return x
+
+    def broken_handler(item, stage, e):
+        raise OSError("disk full")
+
+    def broken_finish():
+        raise RuntimeError("cannot release")
+
+    pipeline = Pipeline([Stage("check", fail_on_three, on_finish=broken_finish), Stage("record", lambda x: x)],
+                        error_handler=broken_handler)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(pipeline.run(range(10))), daemon=True)
+    thread.start()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert result == [[0, 1, 2]]
+    assert [type(e) for _, _, e in pipeline.errors] == [ValueError, OSError]
+
+def test_pipeline_ordered_parallel_stage():
+    """Test that a multi-worker ordered stage still emits items in submission order."""
+    def slow(x):
+        time.sleep(random.random() / 100)
+        return x
+
+    def drop_sevens(x):
+        return None if x % 7 == 0 else x
+
+    pipeline = Pipeline([
+        Stage("drop", drop_sevens),
+        Stage("slow", slow, workers=4, ordered=True),
+        Stage("identity", lambda x: x),
+    ], queue_size=8)
+    assert pipeline.run(range(50)) == [x for x in range(50) if x % 7]
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_process_videos_schedule_and_delete(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that slots are assigned in order and only uploaded videos are deleted."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = np.zeros(16000, dtype=np.float32)
+    mock_transcription.transcribe.return_value = "hello"
+    mock_metadata.return_value = ("Title", "Description #shorts")
+
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    for name in ["a.mp4", "b.mp4", "c.mp4"]:
+        (videos_dir / name).write_bytes(name.encode())
+
+    # Second upload fails: the batch carries on, only the failed video stays for the next run
+    mock_upload.side_effect = [{"id": "1"}, Exception("upload failed"), {"id": "3"}]
+    ledger_file = tmp_path / "jobs.sqlite3"
+    start = datetime.datetime(2026, 1, 24, 12, 0, 0, tzinfo=datetime.timezone.utc)
+    cache = MetadataCache(str(tmp_path / "cache.sqlite3"))
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), patch('upload_vids.LEDGER_FILE', str(ledger_file)):
+        processed = upload_vids.process_videos(MagicMock(), ["a.mp4", "b.mp4", "c.mp4"], start, cache, upload_workers=1)
+
+    assert [job.name for job in processed] == ["a.mp4", "c.mp4"]
+    assert sorted(os.listdir(videos_dir)) == ["b.mp4"]
+
+    publish_times = [c.args[2] for c in mock_upload.call_args_list]
+    assert publish_times[:2] == [start, start + datetime.timedelta(days=1)]
+    # c.mp4 goes out in the next free slot, b.mp4's slot is not lost
+    with JobLedger(str(ledger_file)) as ledger:
+        assert len(ledger.free_slots()) == (1 if publish_times[2] == start + datetime.timedelta(days=2) else 0)
+        failed = ledger.find(content_hash(str(videos_dir / "b.mp4")))
+        assert (failed['state'], failed['failures'], failed['failed_stage']) == ("failed", 1, "upload")
+        assert [job['youtube_id'] for job in ledger.jobs("uploaded")] == ["3", "1"]
+    mock_transcription.unload_models.assert_called_once()
@@ -1,3 +1,4 @@
+import datetime
 import os
 import sys
 import unittest
@@ -6,31 +7,90 @@ from unittest.mock import patch
 # Ensure we can import the module from the parent directory
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import instagram_downloader
 import profile_reels_download
 
 
+class FakePost:
+    def __init__(self, shortcode):
+        self.shortcode = shortcode
+        self.date_utc = datetime.datetime(2026, 1, 24, 12)
+
+class FakeProfile:
+    # Newest first, like Instagram; counts how far the sync paginated
+    def __init__(self, shortcodes):
+        self.shortcodes = shortcodes
+        self.fetched = 0
+
+    def get_reels(self):
+        for shortcode in self.shortcodes:
+            self.fetched += 1
+            yield FakePost(shortcode)
+
+
 class TestProfileReelsDownload(unittest.TestCase):
-    @patch('profile_reels_download.subprocess.run')
-    @patch('builtins.input')
-    def test_download_profile_reels(self, mock_input, mock_subprocess):
-        # Setup
-        test_dir = "tests/test_download"
-        profile_name = "explainingeverythingsimply"
-        
-        # Patch the VIDEO_FOLDER to use the test directory
-        with patch('profile_reels_download.VIDEO_FOLDER', test_dir):
-            profile_reels_download.download_profile_reels(profile_name)
-
-            # Verification: Verify the command matches exactly what the script uses
-            expected_call = [
-                "instaloader", 
-                profile_name, 
-                "--reels", 
-                "+args.txt", 
-                "--dirname-pattern=" + test_dir
+    def setUp(self):
+        self.test_dir = "tests/test_download"
+        self.index_file = os.path.join(self.test_dir, "profile_index.sqlite3")
+        os.makedirs(self.test_dir, exist_ok=True)
+
+    def tearDown(self):
+        if os.path.exists(self.index_file):
+            os.remove(self.index_file)
+
+    def sync(self, profile, download_results=None, **options):
+        with patch('profile_reels_download.VIDEO_FOLDER', self.test_dir), \
+                patch('profile_reels_download.SYNC_INDEX_FILE', self.index_file), \
+                patch('profile_reels_download.instaloader.Profile.from_username', return_value=profile), \
+                patch('profile_reels_download.instagram_downloader.Downloader') as mock_downloader:
+            mock_downloader.return_value.download.side_effect = lambda posts: download_results or [
+                instagram_downloader.DownloadResult(shortcode, path=shortcode + ".mp4")
+                for shortcode in (getattr(post, "shortcode", post) for post in posts)  # retries are shortcodes
             ]
-            
-            mock_subprocess.assert_called_with(expected_call, check=True)
+            profile_reels_download.sync_profile("explainingeverythingsimply", **options)
+        return mock_downloader.return_value.download
+
+    def test_sync_downloads_only_new_reels(self):
+        """Test that a second sync stops at known reels and only downloads the new ones."""
+        first = FakeProfile(["p3", "p2", "p1"])
+        download = self.sync(first)
+        self.assertEqual([post.shortcode for post in download.call_args.args[0]], ["p3", "p2", "p1"])
+
+        # Two new reels and a pinned old one on top; the long tail of old reels is never paginated
+        second = FakeProfile(["p1", "n2", "n1", "p3", "p2", "p1"] + [f"old{i}" for i in range(100)])
+        download = self.sync(second, download_results=[
+            instagram_downloader.DownloadResult("n2", path="n2.mp4"),
+            instagram_downloader.DownloadResult("n1", error=ConnectionError("reset")),
+        ])
+        self.assertEqual([post.shortcode for post in download.call_args.args[0]], ["n2", "n1"])
+        self.assertEqual(second.fetched, 6)
+
+        # The failed one is tried again next time
+        with profile_reels_download.ProfileIndex(self.index_file) as index:
+            self.assertEqual(index.known("explainingeverythingsimply"), {"p1", "p2", "p3", "n2"})
+
+    def test_failed_reel_behind_known_ones_is_retried(self):
+        """Test that a failed reel is retried by shortcode even when the sync stops before reaching it."""
+        self.sync(FakeProfile(["r5", "r4", "r3", "r2", "r1", "o1", "o2"]), download_results=[
+            instagram_downloader.DownloadResult(shortcode, path=shortcode + ".mp4") for shortcode in ("r5", "r4", "r3", "r2")
+        ] + [instagram_downloader.DownloadResult("r1", error=ConnectionError("reset"))] + [
+            instagram_downloader.DownloadResult(shortcode, path=shortcode + ".mp4") for shortcode in ("o1", "o2")
+        ])
+
+        profile = FakeProfile(["r5", "r4", "r3", "r2", "r1", "o1", "o2"])
+        download = self.sync(profile)
+        self.assertEqual(download.call_args.args[0], ["r1"])  # the pagination stops at r3
+        self.assertEqual(profile.fetched, 3)
+        with profile_reels_download.ProfileIndex(self.index_file) as index:
+            self.assertIn("r1", index.known("explainingeverythingsimply"))
+            self.assertEqual(index.failed("explainingeverythingsimply"), [])
+
+    def test_list_prints_new_shortcodes(self):
+        """Test that --list prints the new shortcodes instead of downloading them."""
+        with patch('builtins.print') as mock_print:
+            download = self.sync(FakeProfile(["b", "a"]), list_only=True)
+        download.assert_not_called()
+        mock_print.assert_any_call("b,a")
 
 # disabled due to rate limit issues
 # class TestProfileReelsDownloadIntegration(unittest.TestCase):
@@ -48,14 +108,12 @@ class TestProfileReelsDownload(unittest.TestCase):
 #     def test_download_profile_reels_real(self):
 #         # Patch the VIDEO_FOLDER to "tests/test_download"
 #         # We verify real download functionality
-#         with patch('profile_reels_download.VIDEO_FOLDER', self.test_dir):
+#         with patch('profile_reels_download.VIDEO_FOLDER', self.test_dir), \
+#                 patch('profile_reels_download.SYNC_INDEX_FILE', os.path.join(self.test_dir, "index.sqlite3")):
 #             # Using the known profile that works: explainingeverythingsimply
 #             profile_name = "explainingeverythingsimply"
-            
-#             try:
-#                 profile_reels_download.download_profile_reels(profile_name)
-#             except subprocess.CalledProcessError as e:
-#                 self.fail(f"Download failed: {e}")
+#             results = profile_reels_download.sync_profile(profile_name)
+#             self.assertTrue(all(result.ok for result in results))
 
 #             # Verify file exists
 #             files = os.listdir(self.test_dir)
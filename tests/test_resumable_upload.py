@@ -0,0 +1,144 @@
+import datetime
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import httplib2
+import numpy as np
+import pytest
+from googleapiclient.errors import HttpError
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import upload_vids
+import youtube_upload
+from job_ledger import JobLedger
+from metadata_cache import MetadataCache
+
+
+def fake_request(chunks, uri="https://upload.example/session-1", received=None):
+    # Simulates a resumable HttpRequest: every next_chunk() call acknowledges one more chunk.
+    # `received` is the server's answer to the status query of a resumed session: (status, last byte).
+    request = MagicMock()
+    request.resumable_uri = None
+    request.resumable_progress = 0
+    request.resumable.size.return_value = 1000
+    if received:
+        status, last_byte = received
+        headers = {"status": status, "range": f"bytes=0-{last_byte}"} if last_byte is not None else {"status": status}
+        request.http.request.return_value = (httplib2.Response(headers), b'{"id": "abc"}')
+        request.postproc.side_effect = lambda resp, content: {"id": "abc"}
+
+    def next_chunk(http=None):
+        outcome = chunks.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        request.resumable_uri = request.resumable_uri or uri
+        if outcome is None:
+            request.resumable_progress += 100
+            status = MagicMock()
+            status.progress.return_value = 0.5
+            return status, None
+        return None, outcome
+
+    request.next_chunk.side_effect = next_chunk
+    return request
+
+def http_error(status):
+    return HttpError(httplib2.Response({"status": status}), b"{}")
+
+def test_chunked_upload_reports_progress():
+    """Test that every acknowledged chunk is reported so it can be persisted."""
+    request = fake_request([None, None, {"id": "abc"}])
+    progress = []
+
+    response = youtube_upload.resumable_upload(lambda: request, on_progress=progress.append)
+
+    assert response == {"id": "abc"}
+    assert progress == [
+        {"uri": "https://upload.example/session-1", "offset": 100},
+        {"uri": "https://upload.example/session-1", "offset": 200},
+    ]
+
+def test_resume_from_saved_session():
+    """Test that a resumed upload continues from the offset the server reports, not the one saved."""
+    request = fake_request([{"id": "abc"}], received=(308, 399))
+    session = {"uri": "https://upload.example/old-session", "offset": 500}
+
+    youtube_upload.resumable_upload(lambda: request, session=session)
+
+    request.http.request.assert_called_once_with(
+        "https://upload.example/old-session", method="PUT", body=b"",
+        headers={"Content-Length": "0", "Content-Range": "bytes */1000"})
+    assert request.resumable_uri == "https://upload.example/old-session"
+    assert request.resumable_progress == 400
+    request.next_chunk.assert_called_once()
+
+def test_resumed_session_that_already_finished():
+    """Test that a session the server reports as complete returns the video without sending anything."""
+    request = fake_request([], received=(200, None))
+
+    response = youtube_upload.resumable_upload(lambda: request, session={"uri": "done", "offset": 1000})
+
+    assert response == {"id": "abc"}
+    request.next_chunk.assert_not_called()
+
+def test_expired_session_starts_over():
+    """Test that a session the server no longer knows restarts the upload from byte 0."""
+    stale = fake_request([], received=(404, None))
+    fresh = fake_request([None, {"id": "abc"}], uri="https://upload.example/new-session")
+    requests = [stale, fresh]
+
+    response = youtube_upload.resumable_upload(lambda: requests.pop(0), session={"uri": "gone", "offset": 10})
+
+    assert response == {"id": "abc"}
+    assert fresh.resumable_uri == "https://upload.example/new-session"
+
+def test_other_errors_are_raised():
+    """Test that failures mid-upload are not swallowed."""
+    request = fake_request([None, http_error(500)])
+    with pytest.raises(HttpError):
+        youtube_upload.resumable_upload(lambda: request)
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('googleapiclient.http.MediaFileUpload')
+def test_interrupted_upload_resumes_next_run(mock_media, mock_metadata, mock_transcription, tmp_path):
+    """Test that the session survives a failed run and the next run continues from the saved offset."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = np.ones(16000, dtype=np.float32)
+    mock_transcription.transcribe.return_value = "hello"
+    mock_metadata.return_value = ("Title", "Description #shorts")
+
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    (videos_dir / "a.mp4").write_bytes(b"video")
+    ledger_file = tmp_path / "jobs.sqlite3"
+    start = datetime.datetime(2026, 1, 24, 12, 0, 0, tzinfo=datetime.timezone.utc)
+
+    first_run = fake_request([None, None, ConnectionError("uplink dropped")])
+    second_run = fake_request([{"id": "abc"}], received=(308, 199))
+    youtube = MagicMock()
+    youtube.videos().insert.side_effect = [first_run, second_run]
+
+    # No retries within the run, so the first run ends with the upload unfinished
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), patch('upload_vids.LEDGER_FILE', str(ledger_file)), \
+            patch('retry.RETRY_ATTEMPTS', 1):
+        upload_vids.process_videos(youtube, ["a.mp4"], start, MetadataCache(str(tmp_path / "c.sqlite3")), upload_workers=1)
+        job = upload_vids.get_ledger().pending()[0]
+        assert upload_vids.get_ledger().session(job['id']) == {
+            "uri": "https://upload.example/session-1", "offset": 200, "publish_at": start,
+        }
+        assert os.listdir(videos_dir) == ["a.mp4"]
+
+        upload_vids.process_videos(youtube, ["a.mp4"], start, MetadataCache(str(tmp_path / "c.sqlite3")), upload_workers=1)
+
+    assert second_run.resumable_uri == "https://upload.example/session-1"
+    assert second_run.resumable_progress == 200
+    with JobLedger(str(ledger_file)) as ledger:
+        assert ledger.pending() == []
+        assert ledger.last_scheduled() == start
+        assert ledger.jobs()[0]['youtube_id'] == "abc"
+    assert os.listdir(videos_dir) == []
@@ -0,0 +1,143 @@
+import datetime
+import json
+import os
+import socket
+import sys
+from unittest.mock import MagicMock, patch
+
+import httplib2
+import numpy as np
+import pytest
+from google.auth.exceptions import RefreshError
+from googleapiclient.errors import HttpError
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metadata_engine
+import retry
+import upload_vids
+import youtube_upload
+from metadata_cache import MetadataCache
+
+
+def http_error(status, reason=None):
+    content = json.dumps({"error": {"errors": [{"reason": reason}] if reason else []}}).encode()
+    return HttpError(httplib2.Response({"status": status}), content)
+
+def test_classify_errors():
+    """Test that transient, per-file and run-ending errors are told apart."""
+    assert retry.classify(http_error(503)) == retry.RETRYABLE
+    assert retry.classify(http_error(429)) == retry.RETRYABLE
+    assert retry.classify(socket.timeout("timed out")) == retry.RETRYABLE
+    assert retry.classify(ConnectionResetError()) == retry.RETRYABLE
+    assert retry.classify(json.JSONDecodeError("bad", "{", 0)) == retry.RETRYABLE
+
+    assert retry.classify(http_error(400, "invalidVideoMetadata")) == retry.FATAL_FILE
+    assert retry.classify(RuntimeError("ffmpeg could not decode")) == retry.FATAL_FILE
+    assert retry.classify(metadata_engine.IncompleteAnswer("no title")) == retry.RETRYABLE
+    assert retry.classify(KeyError("job_id")) == retry.FATAL_FILE  # a bug, not worth a retry
+    assert retry.classify(ValueError("bad argument")) == retry.FATAL_FILE
+    assert retry.classify(FileNotFoundError()) == retry.FATAL_FILE
+
+    assert retry.classify(http_error(403, "quotaExceeded")) == retry.FATAL_RUN
+    assert retry.classify(http_error(401)) == retry.FATAL_RUN
+    assert retry.classify(RefreshError("invalid_grant")) == retry.FATAL_RUN
+    assert retry.classify(youtube_upload.QuotaExhausted()) == retry.FATAL_RUN
+
+def test_backoff_delay_is_capped_and_jittered():
+    """Test that delays grow exponentially but never exceed the cap."""
+    delays = [retry.backoff_delay(attempt, base=1, cap=10) for attempt in range(8) for _ in range(20)]
+    assert all(0 <= delay <= 10 for delay in delays)
+    assert len(set(delays)) > 1
+    assert max(retry.backoff_delay(0, base=1, cap=10) for _ in range(50)) <= 1
+
+def test_call_with_retry():
+    """Test that transient errors are retried and other errors are raised right away."""
+    sleeps = []
+    func = MagicMock(side_effect=[http_error(500), socket.timeout(), "done"])
+    assert retry.call_with_retry(func, "arg", attempts=4, sleep=sleeps.append) == "done"
+    assert func.call_count == 3
+    assert len(sleeps) == 2
+
+    func = MagicMock(side_effect=http_error(400))
+    with pytest.raises(HttpError):
+        retry.call_with_retry(func, attempts=4, sleep=sleeps.append)
+    func.assert_called_once()
+
+    func = MagicMock(side_effect=ConnectionError("down"))
+    with pytest.raises(ConnectionError):
+        retry.call_with_retry(func, attempts=3, sleep=lambda delay: None)
+    assert func.call_count == 3
+
+@patch('retry.RETRY_BASE_DELAY', 0)
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_failing_video_is_quarantined(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that a video failing run after run is moved aside while the others keep uploading."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = np.ones(16000, dtype=np.float32)
+    mock_transcription.transcribe.return_value = "hello"
+    mock_metadata.return_value = ("Title", "Description #shorts")
+
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+
+    def upload(youtube, path, date_time, **kwargs):
+        if path.endswith("bad.mp4"):
+            raise http_error(400, "invalidVideo")
+        return {"id": os.path.basename(path)}
+
+    mock_upload.side_effect = upload
+    start = datetime.datetime(2026, 1, 24, 12)
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")), \
+            patch('retry.QUARANTINE_FOLDER', str(tmp_path / "quarantine")), \
+            patch('retry.QUARANTINE_AFTER', 2):
+        for run in range(2):
+            good = f"good{run}.mp4"
+            (videos_dir / "bad.mp4").exists() or (videos_dir / "bad.mp4").write_bytes(b"bad")
+            (videos_dir / good).write_bytes(good.encode())
+            processed = upload_vids.process_videos(MagicMock(), ["bad.mp4", good], start,
+                                                   MetadataCache(str(tmp_path / "c.sqlite3")), upload_workers=1)
+            assert [job.name for job in processed] == [good]
+        assert upload_vids.get_ledger().counts() == {"uploaded": 2, "quarantined": 1}
+
+    assert os.listdir(videos_dir) == []
+    assert os.listdir(tmp_path / "quarantine") == ["bad.mp4"]
+
+@patch('retry.RETRY_BASE_DELAY', 0)
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_transient_upload_error_resumes_session(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that a retried upload continues from the session saved before the error."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = np.ones(16000, dtype=np.float32)
+    mock_transcription.transcribe.return_value = "hello"
+    mock_metadata.return_value = ("Title", "Description #shorts")
+
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    (videos_dir / "a.mp4").write_bytes(b"video")
+
+    def upload(youtube, path, date_time, **kwargs):
+        if mock_upload.call_count == 1:
+            kwargs['on_progress']({"uri": "https://upload/session", "offset": 1024})
+            raise http_error(503)
+        return {"id": "1"}
+
+    mock_upload.side_effect = upload
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")):
+        processed = upload_vids.process_videos(MagicMock(), ["a.mp4"], datetime.datetime(2026, 1, 24, 12),
+                                               MetadataCache(str(tmp_path / "c.sqlite3")), upload_workers=1)
+
+    assert [job.name for job in processed] == ["a.mp4"]
+    assert mock_upload.call_count == 2
+    assert mock_upload.call_args_list[0].kwargs['session'] is None
+    assert mock_upload.call_args_list[1].kwargs['session']['offset'] == 1024
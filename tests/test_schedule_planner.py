@@ -0,0 +1,49 @@
+import datetime
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import schedule_planner
+from schedule_planner import SchedulePlanner, parse_blackouts, parse_slots
+
+UTC = datetime.timezone.utc
+
+
+def test_parse_slots_per_weekday():
+    """Test that publish times can be given for every day or per group of weekdays."""
+    assert parse_slots("12:00") == {day: [datetime.time(12)] for day in range(7)}
+    slots = parse_slots("mon-fri=18:00,09:00; sat,sun=12:00")
+    assert slots[0] == slots[4] == [datetime.time(9), datetime.time(18)]
+    assert slots[5] == slots[6] == [datetime.time(12)]
+    assert parse_slots("fri-mon=08:00").keys() == {4, 5, 6, 0}
+
+    with pytest.raises(ValueError):
+        parse_slots("funday=12:00")
+    with pytest.raises(ValueError):
+        parse_slots("noon")
+
+def test_plan_skips_blackouts_and_keeps_wall_clock_across_dst():
+    """Test that slots follow the local publish times through DST and skip blackout dates."""
+    planner = SchedulePlanner(parse_slots("mon-fri=09:00,18:00;sat,sun=12:00"),
+                              parse_blackouts("2026-03-30,2026-04-01..2026-04-02"), "Europe/Brussels")
+    # Saturday 28 March 2026, 13:00 in Brussels (CET, UTC+1); DST starts the next night
+    plan = planner.plan(6, datetime.datetime(2026, 3, 28, 12, tzinfo=UTC))
+
+    assert [f"{slot.astimezone(planner.timezone):%a %d %H:%M}" for slot in plan] == [
+        "Sun 29 12:00", "Tue 31 09:00", "Tue 31 18:00", "Fri 03 09:00", "Fri 03 18:00", "Sat 04 12:00",
+    ]
+    assert plan[0] == datetime.datetime(2026, 3, 29, 10, tzinfo=UTC)  # CEST, UTC+2
+    assert all(planner.is_slot(slot) for slot in plan)
+    assert not planner.is_slot(datetime.datetime(2026, 3, 30, 7, tzinfo=UTC))  # blackout
+    assert not planner.is_slot(datetime.datetime(2026, 3, 31, 8, tzinfo=UTC))  # 10:00 local
+
+def test_publish_at_is_utc(monkeypatch):
+    """Test that publishAt is real UTC, with naive times read in the schedule time zone."""
+    monkeypatch.setattr(schedule_planner, "SCHEDULE_TIMEZONE", "Europe/Brussels")
+    assert schedule_planner.publish_at(datetime.datetime(2026, 1, 24, 12)) == "2026-01-24T11:00:00Z"
+    assert schedule_planner.publish_at(datetime.datetime(2026, 7, 1, 12)) == "2026-07-01T10:00:00Z"
+    assert schedule_planner.publish_at(datetime.datetime(2026, 1, 24, 12, tzinfo=UTC)) == "2026-01-24T12:00:00Z"
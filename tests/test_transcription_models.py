@@ -0,0 +1,162 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+# Add parent directory to path to import transcription
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transcription
+
+
+@patch('transcription.WhisperModel')
+def test_model_loaded_once(mock_model_cls):
+    """Test that repeated lookups reuse the same warm model."""
+    transcription.unload_models()
+
+    first = transcription.get_model()
+    second = transcription.get_model()
+
+    assert first is second
+    mock_model_cls.assert_called_once_with(
+        transcription.WHISPER_MODEL_SIZE,
+        device="cpu",
+        compute_type=transcription.WHISPER_COMPUTE_TYPE,
+        cpu_threads=transcription.WHISPER_CPU_THREADS,
+    )
+    transcription.unload_models()
+
+@patch('transcription.WhisperModel')
+def test_model_config_and_unload(mock_model_cls):
+    """Test that different configurations get their own model and unload frees them all."""
+    transcription.unload_models()
+
+    transcription.get_model("tiny", "int8", 2)
+    transcription.get_model("base", "int8", 2)
+    assert mock_model_cls.call_count == 2
+
+    transcription.unload_models()
+    transcription.get_model("tiny", "int8", 2)
+    assert mock_model_cls.call_count == 3
+    transcription.unload_models()
+
+def test_default_pool_size_matches_cores():
+    """Test that workers x threads covers the machine."""
+    with patch('transcription.TRANSCRIBE_WORKERS', 0):
+        assert transcription.default_pool_size(8) == (4, 2)
+        assert transcription.default_pool_size(2) == (1, 2)
+        assert transcription.default_pool_size(1) == (1, 1)
+
+    # Explicit worker count wins
+    with patch('transcription.TRANSCRIBE_WORKERS', 3):
+        assert transcription.default_pool_size(12) == (3, 4)
+
+class Segment:
+    def __init__(self, text, avg_logprob=-0.3):
+        self.text = text
+        self.avg_logprob = avg_logprob
+
+class Info:
+    def __init__(self, language="en", language_probability=0.99):
+        self.language = language
+        self.language_probability = language_probability
+
+def test_metadata_mode_stops_at_the_budget():
+    """Test that segments stop being decoded once the character budget is reached."""
+    decoded = []
+
+    def segments():
+        for index in range(100):
+            decoded.append(index)
+            yield Segment(f" sentence number {index}.")
+
+    kept = transcription.bounded(segments(), max_chars=50)
+    assert [segment.text for segment in kept][:2] == [" sentence number 0.", " sentence number 1."]
+    assert len(decoded) == 3
+
+@patch('transcription.get_model')
+def test_metadata_mode_skips_whisper_without_speech(mock_get_model):
+    """Test that music-only audio never loads Whisper and speech is decoded greedily."""
+    audio = np.ones(16000 * 90, dtype=np.float32)
+    with patch('transcription.TRANSCRIPT_MODE', "metadata"), \
+            patch('transcription.speech_audio', return_value=np.zeros(0, dtype=np.float32)):
+        assert transcription.transcribe(audio) == ""
+    mock_get_model.assert_not_called()
+
+    model = MagicMock()
+    model.transcribe.return_value = (iter([Segment(" Hello"), Segment(" you.")]), Info())
+    speech = audio[:16000 * 5]
+    with patch('transcription.TRANSCRIPT_MODE', "metadata"), patch('transcription.speech_audio', return_value=speech):
+        assert transcription.transcribe(audio, model) == "Hello you."
+    assert model.transcribe.call_args.args[0] is speech
+    assert model.transcribe.call_args.kwargs["beam_size"] == 1
+
+def tier_models(results):
+    # One fake model per size, answering with the given (logprob, language)
+    models = {}
+    for size, (logprob, language) in results.items():
+        models[size] = MagicMock()
+        models[size].transcribe.side_effect = lambda audio, size=size, logprob=logprob, language=language, **kwargs: (
+            iter([Segment(f" said by {size}", logprob)]), Info(language))
+    return models
+
+def test_tiers_escalate_on_low_confidence_or_other_language():
+    """Test that clips only reach a bigger model when the smaller one is unsure or hears another language."""
+    speech = np.ones(16000 * 5, dtype=np.float32)
+    cases = [
+        ({"tiny": (-0.3, "en")}, "said by tiny", ["whisper_tiny"]),
+        ({"tiny": (-1.5, "en"), "base": (-0.4, "en")}, "said by base", ["whisper_tiny", "whisper_base"]),
+        ({"tiny": (-0.3, "nl"), "base": (-0.3, "nl"), "small": (-0.3, "nl")}, "said by small",
+         ["whisper_tiny", "whisper_base", "whisper_small"]),
+    ]
+    for results, text, stages in cases:
+        models = tier_models(results)
+        with patch('transcription.WHISPER_TIERS', "tiny,base,small"), \
+                patch('transcription.TRANSCRIPT_MODE', "metadata"), \
+                patch('transcription.speech_audio', return_value=speech), \
+                patch('transcription.get_model', side_effect=lambda size: models[size]):
+            result, passes = transcription.transcribe_passes(speech)
+        assert result == text
+        assert [sample["stage"] for sample in passes] == ["vad"] + stages
+        assert [sample["escalated"] for sample in passes[1:]] == [True] * (len(stages) - 1) + [False]
+
+def test_longer_clips_skip_the_first_tier():
+    """Test that only short clips are tried on tiny; longer speech starts on base."""
+    speech = np.ones(16000 * 40, dtype=np.float32)
+    models = tier_models({"base": (-0.3, "en")})
+    with patch('transcription.WHISPER_TIERS', "tiny,base,small"), \
+            patch('transcription.WHISPER_SHORT_CLIP_SECONDS', 15), \
+            patch('transcription.TRANSCRIPT_MODE', "metadata"), \
+            patch('transcription.speech_audio', return_value=speech), \
+            patch('transcription.get_model', side_effect=lambda size: models[size]):
+        result, passes = transcription.transcribe_passes(speech)
+    assert result == "said by base"
+    assert [sample["stage"] for sample in passes] == ["vad", "whisper_base"]
+
+def test_tier_passes_end_up_in_the_run_report():
+    """Test that per-tier timings and escalation rates are summarised in the run report."""
+    recorder = transcription.instrumentation.RunRecorder()
+    with recorder.measure("transcribe", "a.mp4"):
+        recorder.record("whisper_tiny", wall_seconds=0.2, cpu_seconds=0.4, escalated=True)
+        recorder.record("whisper_base", wall_seconds=0.5, cpu_seconds=1.0, escalated=False)
+    with recorder.measure("transcribe", "b.mp4"):
+        recorder.record("whisper_tiny", wall_seconds=0.2, cpu_seconds=0.4, escalated=False)
+
+    stages = recorder.stage_summary()
+    assert stages["whisper_tiny"]["calls"] == 2 and stages["whisper_tiny"]["escalation_rate"] == 0.5
+    assert stages["whisper_base"]["escalation_rate"] == 0
+    assert recorder.video_summary()["a.mp4"]["whisper_base"]["wall_seconds"] == 0.5
+    assert "stage_escalations" in transcription.instrumentation.prometheus_metrics(recorder.report(2, 2))
+
+def test_speech_audio_keeps_only_speech_within_the_budget():
+    """Test that only the speech chunks are kept, cut at the time budget."""
+    audio = np.arange(16000 * 10, dtype=np.float32)
+    chunks = [{"start": 16000, "end": 16000 * 3}, {"start": 16000 * 5, "end": 16000 * 9}]
+    with patch('faster_whisper.vad.get_speech_timestamps', return_value=chunks):
+        speech = transcription.speech_audio(audio, max_seconds=4)
+    assert len(speech) == 16000 * 4
+    assert speech[0] == 16000 and speech[16000 * 2] == 16000 * 5
+
+    # Silence has no speech at all
+    assert transcription.speech_audio(np.zeros(16000 * 3, dtype=np.float32)).size == 0
@@ -0,0 +1,194 @@
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import httplib2
+import numpy as np
+from googleapiclient.errors import HttpError
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import upload_vids
+import youtube_upload
+from job_ledger import JobLedger
+from metadata_cache import MetadataCache
+from schedule_planner import SchedulePlanner, parse_slots
+
+UTC = datetime.timezone.utc
+
+
+def test_quota_ledger_budget_and_pacific_day():
+    """Test that reservations stop at the budget and reset at midnight Pacific time."""
+    # 07:59 UTC is still the previous day in Los Angeles
+    now = [datetime.datetime(2026, 1, 24, 7, 59, tzinfo=UTC)]
+    saved = []
+    ledger = youtube_upload.QuotaLedger({"2026-01-20": 9600}, saved.append, budget=5000, now=lambda: now[0])
+
+    assert ledger.spent == {}  # old days are dropped
+    assert ledger.reserve() and ledger.reserve() and ledger.reserve()
+    assert not ledger.reserve()
+    assert ledger.remaining() == 200
+    assert saved[-1] == {"2026-01-23": 4800}
+
+    ledger.refund()
+    assert ledger.remaining() == 1800
+
+    now[0] = datetime.datetime(2026, 1, 24, 8, 1, tzinfo=UTC)
+    assert ledger.remaining() == 5000
+
+    ledger.exhaust()
+    assert ledger.remaining() == 0
+    assert not ledger.reserve()
+    ledger.refund()
+    assert ledger.remaining() == 0
+
+def test_quota_error_detection():
+    """Test that quota errors are told apart from other 403s."""
+    quota = HttpError(httplib2.Response({"status": 403}), json.dumps(
+        {"error": {"errors": [{"reason": "quotaExceeded"}]}}).encode())
+    forbidden = HttpError(httplib2.Response({"status": 403}), json.dumps(
+        {"error": {"errors": [{"reason": "forbidden"}]}}).encode())
+
+    assert youtube_upload.is_quota_error(quota)
+    assert not youtube_upload.is_quota_error(forbidden)
+    assert not youtube_upload.is_quota_error(ValueError())
+
+def test_slot_allocator_reuses_released_slots():
+    """Test that slots are handed out in order and failed slots are reused first."""
+    start = datetime.datetime(2026, 1, 24, 12, tzinfo=UTC)
+    day = datetime.timedelta(days=1)
+    planner = SchedulePlanner(parse_slots("12:00"), timezone="UTC")
+
+    with patch('upload_vids.get_ledger'):
+        # Two planned slots, the rest comes from the planner
+        slots = upload_vids.SlotAllocator([start + day, start], planner.upcoming(start + day), start + day)
+        first, second, third = slots.take(), slots.take(), slots.take()
+        assert [first, second, third] == [start, start + day, start + 2 * day]
+
+        slots.release(second)
+        assert slots.take() == second
+        assert slots.take() == start + 3 * day
+
+        # Claiming a slot further ahead keeps the skipped ones available
+        assert slots.claim(start + 6 * day)
+        assert not slots.claim(start + day)
+        assert slots.take() == start + 4 * day
+
+def make_videos(tmp_path, names):
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    for name in names:
+        (videos_dir / name).write_bytes(name.encode())
+    return videos_dir
+
+def mock_stages(mock_transcription, mock_metadata):
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = np.ones(16000, dtype=np.float32)
+    mock_transcription.transcribe.return_value = "hello"
+    mock_metadata.return_value = ("Title", "Description #shorts")
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_parallel_uploads_respect_quota(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that uploads overlap and inserts stop once the daily budget is used."""
+    mock_stages(mock_transcription, mock_metadata)
+    names = ["a.mp4", "b.mp4", "c.mp4", "d.mp4", "e.mp4"]
+    videos_dir = make_videos(tmp_path, names)
+    in_flight, peak, lock = [0], [0], threading.Lock()
+
+    def upload(youtube, path, date_time, **kwargs):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        return {"id": os.path.basename(path)}
+
+    mock_upload.side_effect = upload
+    start = datetime.datetime(2026, 1, 24, 12, tzinfo=UTC)
+    quota = youtube_upload.QuotaLedger(budget=3 * youtube_upload.QUOTA_INSERT_COST)
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")), \
+            patch('upload_vids.upload_connection'):
+        processed = upload_vids.process_videos(MagicMock(), names, start, MetadataCache(str(tmp_path / "c.sqlite3")),
+                                               quota=quota, upload_workers=3)
+
+    # First three fit in the budget, in order; the rest are carried over untouched
+    assert sorted(job.name for job in processed) == ["a.mp4", "b.mp4", "c.mp4"]
+    assert sorted(os.listdir(videos_dir)) == ["d.mp4", "e.mp4"]
+    assert sorted(job.publish_at for job in processed) == [start + datetime.timedelta(days=i) for i in range(3)]
+    assert {job.name: job.publish_at for job in processed}["a.mp4"] == start
+    assert peak[0] > 1
+    assert quota.remaining() == 0
+
+    with JobLedger(str(tmp_path / "jobs.sqlite3")) as ledger:
+        assert ledger.last_scheduled() == start + datetime.timedelta(days=2)
+        assert sorted(job['youtube_id'] for job in ledger.jobs("uploaded")) == ["a.mp4", "b.mp4", "c.mp4"]
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_quota_exceeded_from_api_stops_cleanly(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that a quotaExceeded answer stops new inserts and frees the slot for the next run."""
+    mock_stages(mock_transcription, mock_metadata)
+    videos_dir = make_videos(tmp_path, ["a.mp4", "b.mp4"])
+    quota = youtube_upload.QuotaLedger()
+
+    def upload(youtube, path, date_time, **kwargs):
+        kwargs['quota'].exhaust()
+        raise youtube_upload.QuotaExhausted("YouTube rejected the upload")
+
+    mock_upload.side_effect = upload
+    start = datetime.datetime.now(UTC).replace(hour=12, minute=0, second=0, microsecond=0) + datetime.timedelta(days=1)
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")):
+        processed = upload_vids.process_videos(MagicMock(), ["a.mp4", "b.mp4"], start,
+                                               MetadataCache(str(tmp_path / "c.sqlite3")), quota=quota, upload_workers=1)
+
+    assert processed == []
+    assert mock_upload.call_count == 1
+    assert sorted(os.listdir(videos_dir)) == ["a.mp4", "b.mp4"]
+    assert quota.remaining() == 0
+    # The failed video's slot is the first one handed out next time
+    with JobLedger(str(tmp_path / "jobs.sqlite3")) as ledger:
+        assert ledger.free_slots()[0] == start
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_stop_event_lets_the_upload_in_flight_finish(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that a stop request (watch daemon shutdown) finishes the current upload and leaves the rest queued."""
+    mock_stages(mock_transcription, mock_metadata)
+    names = ["a.mp4", "b.mp4", "c.mp4"]
+    videos_dir = make_videos(tmp_path, names)
+    stop = threading.Event()
+
+    def upload(youtube, path, date_time, **kwargs):
+        stop.set()  # e.g. docker stop while the first video is being sent
+        return {"id": os.path.basename(path)}
+
+    mock_upload.side_effect = upload
+    start = datetime.datetime.now(UTC).replace(hour=12, minute=0, second=0, microsecond=0) + datetime.timedelta(days=1)
+    quota = youtube_upload.QuotaLedger()
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")):
+        processed = upload_vids.process_videos(MagicMock(), names, start, MetadataCache(str(tmp_path / "c.sqlite3")),
+                                               quota=quota, upload_workers=1, stop_event=stop)
+
+    assert [job.name for job in processed] == ["a.mp4"]
+    assert sorted(os.listdir(videos_dir)) == ["b.mp4", "c.mp4"]
+    assert quota.remaining() == youtube_upload.QUOTA_DAILY_BUDGET - youtube_upload.QUOTA_INSERT_COST
+    with JobLedger(str(tmp_path / "jobs.sqlite3")) as ledger:
+        assert ledger.jobs("failed") == []
+        assert ledger.last_scheduled() == start
@@ -0,0 +1,186 @@
+import datetime
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dedup
+import upload_vids
+import youtube_client
+import youtube_upload
+from job_ledger import JobLedger
+from metadata_cache import MetadataCache, content_hash
+
+UTC = datetime.timezone.utc
+
+
+class FakeYouTube:
+    # videos.list behind BatchHttpRequest; `statuses` maps a video ID to the uploadStatus of each poll
+    def __init__(self, statuses):
+        self.statuses = {video_id: list(polls) for video_id, polls in statuses.items()}
+        self.calls = []
+        self.batches = 0
+
+    def videos(self):
+        return self
+
+    def list(self, part, id):
+        return id.split(",")
+
+    def item(self, video_id):
+        polls = self.statuses.get(video_id)
+        if not polls:
+            return None
+        status = polls.pop(0) if len(polls) > 1 else polls[0]
+        return {"id": video_id, "status": {"uploadStatus": status, "rejectionReason": "duplicate"}}
+
+    def new_batch_http_request(self, callback):
+        youtube = self
+
+        class Batch:
+            def __init__(self):
+                self.requests = []
+
+            def add(self, request, request_id):
+                self.requests.append((request_id, request))
+
+            def execute(self, http=None):
+                youtube.batches += 1
+                for request_id, ids in self.requests:
+                    youtube.calls.append(ids)
+                    items = [item for item in map(youtube.item, ids) if item]
+                    callback(request_id, {"items": items}, None)
+        return Batch()
+
+def test_statuses_are_fetched_in_batches_of_50():
+    """Test that 120 videos take three videos.list calls in a single HTTP batch, one quota unit each."""
+    ids = [f"v{i}" for i in range(120)]
+    statuses = {video_id: ["processed"] for video_id in ids[:100]}
+    statuses["v100"] = ["rejected"]
+    youtube = FakeYouTube(statuses)
+    quota = youtube_upload.QuotaLedger()
+
+    results = youtube_upload.fetch_statuses(youtube, ids, quota=quota)
+
+    assert youtube.batches == 1
+    assert [len(call) for call in youtube.calls] == [50, 50, 20]
+    assert quota.remaining() == youtube_upload.QUOTA_DAILY_BUDGET - 3
+    assert results["v0"] == (youtube_upload.PROCESSED, None)
+    assert results["v100"] == (youtube_upload.REJECTED, "duplicate")
+    assert results["v119"][0] == youtube_upload.MISSING
+
+def test_polling_backs_off_until_processed():
+    """Test that videos still processing are polled again with a growing delay, and finished ones are not."""
+    youtube = FakeYouTube({"a": ["uploaded", "uploaded", "processed"], "b": ["processed"]})
+    slept = []
+
+    with patch.object(youtube_upload, "VERIFY_POLL_DELAY", 15):
+        results = youtube_upload.wait_for_processing(youtube, ["a", "b"], timeout=600, sleep=slept.append)
+
+    assert results == {"a": (youtube_upload.PROCESSED, None), "b": (youtube_upload.PROCESSED, None)}
+    assert slept == [15, 30]
+    assert youtube.calls == [["a", "b"], ["a"], ["a"]]
+
+def test_older_tokens_cannot_verify():
+    """Test that a token.json without youtube.readonly keeps uploading, only without verification."""
+    from google.oauth2.credentials import Credentials
+
+    older = youtube_client.YouTubeClient(Credentials("token", scopes=[youtube_client.UPLOAD_SCOPE]))
+    assert not youtube_client.can_verify(older.service)
+    current = youtube_client.YouTubeClient(Credentials("token", scopes=youtube_client.SCOPES))
+    assert youtube_client.can_verify(current.service)
+    assert not youtube_client.can_verify(MagicMock())
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_files_are_deleted_only_after_youtube_processed_them(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that a processed upload deletes its file and a rejected one is queued again with its slot freed."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = np.ones(16000, dtype=np.float32)
+    mock_transcription.transcribe.return_value = "hello"
+    mock_metadata.return_value = ("Title", "Description #shorts")
+    mock_upload.side_effect = lambda youtube, path, date_time, **kwargs: {"id": "yt-" + os.path.basename(path)}
+
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    for name in ("a.mp4", "b.mp4"):
+        (videos_dir / name).write_bytes(b"video " + name.encode())
+    hashes = {name: content_hash(str(videos_dir / name)) for name in ("a.mp4", "b.mp4")}
+    frames = {name: [np.random.default_rng(seed).integers(0, 256, 72, dtype=np.uint8).tobytes()] * 8
+              for seed, name in enumerate(("a.mp4", "b.mp4"))}
+    youtube = FakeYouTube({"yt-a.mp4": ["uploaded", "processed"], "yt-b.mp4": ["rejected"]})
+    start = datetime.datetime.now(UTC).replace(hour=12, minute=0, second=0, microsecond=0) + datetime.timedelta(days=1)
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")), \
+            patch('dedup.extract_frames', side_effect=lambda path: frames[os.path.basename(path)]), \
+            patch.object(youtube_upload, 'VERIFY_POLL_DELAY', 0):
+        processed = upload_vids.process_videos(youtube, ["a.mp4", "b.mp4"], start,
+                                               MetadataCache(str(tmp_path / "c.sqlite3")), upload_workers=1,
+                                               verify=True)
+
+    assert sorted(job.name for job in processed) == ["a.mp4", "b.mp4"]
+    assert os.listdir(videos_dir) == ["b.mp4"]
+    with JobLedger(str(tmp_path / "jobs.sqlite3")) as ledger:
+        [uploaded] = ledger.jobs("uploaded")
+        [rejected] = ledger.jobs("failed")
+        assert uploaded["name"] == "a.mp4" and uploaded["youtube_id"] == "yt-a.mp4"
+        assert rejected["name"] == "b.mp4" and rejected["failed_stage"] == "verify"
+        assert rejected["last_error"] == "duplicate"
+        assert rejected["publish_at"] in [slot.isoformat() for slot in ledger.free_slots()]
+    with dedup.FingerprintIndex(str(tmp_path / "jobs.sqlite3")) as index:
+        assert index.match(hashes["a.mp4"]).exact
+        assert index.match(hashes["b.mp4"]) is None  # not its own duplicate when it is uploaded again
+
+def test_stop_event_ends_polling_between_checks():
+    """Test that setting the stop event ends the polling after the current check instead of at the timeout."""
+    import threading
+
+    youtube = FakeYouTube({"a": ["uploaded"]})
+    stop_event = threading.Event()
+
+    results = youtube_upload.wait_for_processing(youtube, ["a"], timeout=600, stop_event=stop_event,
+                                                 sleep=lambda delay: stop_event.set())
+
+    assert results == {"a": (youtube_upload.PENDING, None)}
+    assert youtube.calls == [["a"]]
+
+@patch('upload_vids.transcription')
+@patch('upload_vids.request_metadata')
+@patch('upload_vids.upload_video')
+def test_unfinished_uploads_are_checked_again_later(mock_upload, mock_metadata, mock_transcription, tmp_path):
+    """Test that verify_timeout=0 checks once and keeps the file, and a later check deletes it once processed."""
+    mock_transcription.default_pool_size.return_value = (1, 8)
+    mock_transcription.model_id.return_value = "base/int8"
+    mock_transcription.extract_audio.return_value = np.ones(16000, dtype=np.float32)
+    mock_transcription.transcribe.return_value = "hello"
+    mock_metadata.return_value = ("Title", "Description #shorts")
+    mock_upload.return_value = {"id": "yt-a"}
+
+    videos_dir = tmp_path / "videos"
+    videos_dir.mkdir()
+    (videos_dir / "a.mp4").write_bytes(b"video")
+    youtube = FakeYouTube({"yt-a": ["uploaded", "processed"]})
+    start = datetime.datetime.now(UTC) + datetime.timedelta(days=1)
+
+    with patch('upload_vids.VIDEO_FOLDER', str(videos_dir)), \
+            patch('upload_vids.LEDGER_FILE', str(tmp_path / "jobs.sqlite3")), \
+            patch('dedup.DEDUP_MODE', "off"), \
+            patch('youtube_client.can_verify', return_value=True), \
+            patch('time.sleep') as sleep:
+        upload_vids.process_videos(youtube, ["a.mp4"], start, MetadataCache(str(tmp_path / "c.sqlite3")),
+                                   upload_workers=1, verify=True, verify_timeout=0)
+        assert os.listdir(videos_dir) == ["a.mp4"]
+        assert [job["name"] for job in upload_vids.get_ledger().processing()] == ["a.mp4"]
+
+        assert upload_vids.verify_pending(youtube) == 0
+        sleep.assert_not_called()
+
+    assert os.listdir(videos_dir) == []
+    assert youtube.calls == [["yt-a"], ["yt-a"]]
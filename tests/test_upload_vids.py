@@ -28,7 +28,7 @@ def test_video_path():
     return None
 
 @patch('upload_vids.generate_metadata')
-@patch('upload_vids.MediaFileUpload')
+@patch('googleapiclient.http.MediaFileUpload')
 def test_upload_video(mock_media_file, mock_metadata, test_video_path):
     print("\nTesting upload_video...")
     
@@ -42,7 +42,7 @@ def test_upload_video(mock_media_file, mock_metadata, test_video_path):
     mock_youtube = MagicMock()
     mock_request = MagicMock()
     mock_youtube.videos().insert.return_value = mock_request
-    mock_request.execute.return_value = {"id": "12345"}
+    mock_request.next_chunk.return_value = (None, {"id": "12345"})
     
     # Date time for upload
     schedule_time = datetime.datetime(2026, 1, 24, 12, 0, 0)
@@ -61,6 +61,8 @@ def test_upload_video(mock_media_file, mock_metadata, test_video_path):
     assert kwargs['body']['status']['privacyStatus'] == "private"
     assert kwargs['body']['status']['publishAt'] == "2026-01-24T12:00:00Z"
     
-    mock_request.execute.assert_called_once()
+    mock_request.next_chunk.assert_called_once()
+    mock_media_file.assert_called_once_with(test_video_path, chunksize=upload_vids.youtube_upload.UPLOAD_CHUNK_SIZE, resumable=True)
+    assert response == {"id": "12345"}
     
     print("upload_video passed.")
@@ -0,0 +1,153 @@
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Add parent directory to path to import the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import channels
+import watch_daemon
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_file_written_in_place_waits_until_it_settles(tmp_path):
+    """Test that a growing file is only reported once it stopped changing, and partial downloads never are."""
+    clock = FakeClock()
+    watcher = watch_daemon.FolderWatcher(str(tmp_path), settle=10, use_inotify=False, clock=clock)
+    (tmp_path / "a.mp4").write_bytes(b"first chunk")
+    (tmp_path / "b.mp4.part").write_bytes(b"downloading")
+    watcher.add(os.listdir(tmp_path))
+    assert watcher.settled() == []
+
+    clock.now += 6
+    (tmp_path / "a.mp4").write_bytes(b"first chunk, second chunk")
+    assert watcher.settled() == []  # changed: the timer starts again
+    clock.now += 6
+    assert watcher.settled() == []
+    clock.now += 6
+    assert watcher.settled() == ["a.mp4"]
+    assert watcher.settled() == []  # reported once
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+def test_inotify_reports_renamed_files_at_once(tmp_path):
+    """Test that a video renamed into the folder is ready straight away and one copied in place has to settle."""
+    watcher = watch_daemon.FolderWatcher(str(tmp_path), settle=60)
+    try:
+        assert watcher.inotify is not None
+        (tmp_path / "a.mp4.part").write_bytes(b"video")
+        os.replace(tmp_path / "a.mp4.part", tmp_path / "a.mp4")
+        (tmp_path / "b.mp4").write_bytes(b"copied in place")
+        assert watcher.wait(1) == ["a.mp4"]
+        assert "b.mp4" in watcher.pending
+    finally:
+        watcher.close()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def get_health(port):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=5) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+def test_daemon_uploads_arrivals_and_stops_gracefully(tmp_path):
+    """Test that the daemon uploads a new video with the warm client, reports it on /health and stops on request."""
+    watcher = MagicMock()
+    arrivals = [["a.mp4"]]
+    watcher.wait.side_effect = lambda timeout: arrivals.pop() if arrivals else time.sleep(0.01) or []
+    (tmp_path / "a.mp4").write_bytes(b"video")
+    youtube = MagicMock()
+    uploaded = threading.Event()
+
+    def upload_batch(client, videos, keep_warm, stop_event, verify_timeout):
+        assert client is youtube and keep_warm and stop_event is daemon.stop_event and verify_timeout == 0
+        assert watch_daemon.upload_vids.VIDEO_FOLDER == str(tmp_path)  # the folder given to the daemon
+        uploaded.set()
+        return [MagicMock()] * len(videos)
+
+    quota = MagicMock()
+    quota.remaining.return_value = 10000
+    with patch('watch_daemon.WATCH_BATCH_SECONDS', 0), \
+            patch('watch_daemon.upload_vids.get_authenticated_service', return_value=youtube) as auth, \
+            patch('watch_daemon.upload_vids.get_quota_ledger', return_value=quota), \
+            patch('watch_daemon.upload_vids.queued_videos', return_value=[]), \
+            patch('watch_daemon.upload_vids.upload_batch', side_effect=upload_batch) as batch, \
+            patch('watch_daemon.upload_vids.release_warm_models') as release:
+        daemon = watch_daemon.WatchDaemon(str(tmp_path), port=free_port(), watcher=watcher)
+        thread = threading.Thread(target=daemon.run)
+        thread.start()
+        try:
+            assert uploaded.wait(5)
+            deadline = time.monotonic() + 5
+            while daemon.health()[1]["uploaded"] == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            status, state = get_health(daemon.port)
+            assert status == 200
+            assert state["status"] == "idle" and state["uploaded"] == 1
+            assert state["last_batch"] == {"videos": 1, "uploaded": 1}
+        finally:
+            daemon.stop()
+            thread.join(5)
+
+    assert not thread.is_alive()
+    auth.assert_called_once()
+    batch.assert_called_once()
+    release.assert_called_once()
+    watcher.close.assert_called_once()
+
+def test_daemon_serves_every_channel_with_its_settings(tmp_path):
+    """Test that arrivals in each channel's folder are uploaded with that channel's client and folder."""
+    science = channels.Channel("science", videos=str(tmp_path / "science"), ledger_file=str(tmp_path / "s.sqlite3"))
+    cooking = channels.Channel("cooking", videos=str(tmp_path / "cooking"), ledger_file=str(tmp_path / "c.sqlite3"))
+    arrivals = {science.videos: [["a.mp4"]], cooking.videos: [["b.mp4"]]}
+    for folder, names in arrivals.items():
+        os.makedirs(folder)
+        open(os.path.join(folder, names[0][0]), "wb").close()
+
+    def watcher(folder):
+        watcher = MagicMock()
+        watcher.wait.side_effect = lambda timeout: arrivals[folder].pop() if arrivals[folder] else time.sleep(0.01) or []
+        return watcher
+
+    batches = []
+
+    def upload_batch(client, videos, keep_warm, stop_event, verify_timeout):
+        batches.append((client, watch_daemon.upload_vids.VIDEO_FOLDER, videos))
+        if len(batches) == 2:
+            daemon.stop()
+        return videos
+
+    with patch('watch_daemon.WATCH_BATCH_SECONDS', 0), \
+            patch('watch_daemon.FolderWatcher', side_effect=watcher), \
+            patch('watch_daemon.upload_vids.get_authenticated_service', side_effect=lambda token_file: token_file), \
+            patch('watch_daemon.upload_vids.queued_videos', return_value=[]), \
+            patch('watch_daemon.upload_vids.upload_batch', side_effect=upload_batch), \
+            patch('watch_daemon.upload_vids.release_warm_models'):
+        daemon = watch_daemon.WatchDaemon(port=0, channel_list=[science, cooking])
+        thread = threading.Thread(target=daemon.run)
+        thread.start()
+        thread.join(5)
+
+    assert not thread.is_alive()
+    assert sorted(batches) == sorted([(cooking.token_file, cooking.videos, ["b.mp4"]),
+                                      (science.token_file, science.videos, ["a.mp4"])])
+    assert daemon.health()[1]["channels"] == {"science": {"queued": 0, "uploaded": 1},
+                                              "cooking": {"queued": 0, "uploaded": 1}}
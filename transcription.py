@@ -0,0 +1,242 @@
+import gc
+import multiprocessing
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+
+# Configuration (override through environment variables)
+WHISPER_MODEL_SIZE = os.environ.get("WHISPER_MODEL_SIZE", "base")
+# Model tiers tried per clip, cheapest first: the next one only gets a clip the previous one was unsure about.
+# A single size (or only WHISPER_MODEL_SIZE set) always uses that model.
+WHISPER_TIERS = os.environ.get("WHISPER_TIERS", os.environ.get("WHISPER_MODEL_SIZE", "tiny,base,small"))
+# Only clips with at most this much speech start on the first tier (tiny); longer ones start on the second
+WHISPER_SHORT_CLIP_SECONDS = float(os.environ.get("WHISPER_SHORT_CLIP_SECONDS", "15"))
+WHISPER_ESCALATE_LOGPROB = float(os.environ.get("WHISPER_ESCALATE_LOGPROB", "-0.8"))
+# Languages the first tiers are trusted with; small models are much weaker on the rest
+WHISPER_TIER_LANGUAGES = os.environ.get("WHISPER_TIER_LANGUAGES", "en").split(",")
+WHISPER_COMPUTE_TYPE = os.environ.get("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_CPU_THREADS = int(os.environ.get("WHISPER_CPU_THREADS", "0"))  # 0 = let CTranslate2 decide
+# Parallel mode: worker processes, each holding its own model (1 = transcribe in-process)
+TRANSCRIBE_WORKERS = int(os.environ.get("TRANSCRIBE_WORKERS", "0"))  # 0 = pick from the CPU count
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+# The transcript is only context for a title and description. "metadata" transcribes the speech only (VAD),
+# greedily, and stops at a budget; "full" transcribes the whole audio with beam search.
+TRANSCRIPT_MODE = os.environ.get("TRANSCRIPT_MODE", "metadata")
+TRANSCRIPT_MAX_CHARS = int(os.environ.get("TRANSCRIPT_MAX_CHARS", "800"))
+TRANSCRIPT_MAX_SECONDS = float(os.environ.get("TRANSCRIPT_MAX_SECONDS", "60"))  # of speech
+WHISPER_BEAM_SIZE = int(os.environ.get("WHISPER_BEAM_SIZE", "0"))  # 0 = greedy in metadata mode, 5 in full mode
+SAMPLE_RATE = 16000  # Whisper works on 16 kHz mono audio
+
+# Loaded models, keyed by (size, compute_type, cpu_threads)
+_models = {}
+_models_lock = threading.Lock()
+
+# faster_whisper (CTranslate2, PyAV, ...) is slow to import, so it is only loaded once something is transcribed
+WhisperModel = None
+
+def _whisper_model_class():
+    global WhisperModel
+    if WhisperModel is None:
+        from faster_whisper import WhisperModel as model_class
+        WhisperModel = model_class
+    return WhisperModel
+
+def get_model(size=None, compute_type=None, cpu_threads=None):
+    size = size or WHISPER_MODEL_SIZE
+    compute_type = compute_type or WHISPER_COMPUTE_TYPE
+    cpu_threads = WHISPER_CPU_THREADS if cpu_threads is None else cpu_threads
+    key = (size, compute_type, cpu_threads)
+
+    # Loading the weights takes longer than transcribing a short reel, so keep them warm
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            print(f"Loading Whisper model '{size}' ({compute_type}, {cpu_threads or 'auto'} threads)...")
+            # run on cpu always, the model is small so gpu acceleration is not needed
+            with instrumentation.measure("model_load"):
+                model = _whisper_model_class()(size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+            _models[key] = model
+    return model
+
+def parse_tiers(spec):
+    return [size.strip() for size in spec.split(",") if size.strip()]
+
+def model_id():
+    # Cache key: the WHISPER_TIERS chain and compute type; metadata mode keeps the key of older cached transcripts
+    model = f"{'>'.join(parse_tiers(WHISPER_TIERS))}/{WHISPER_COMPUTE_TYPE}"
+    return model if TRANSCRIPT_MODE == "metadata" else f"{model}/{TRANSCRIPT_MODE}"
+
+def unload_models():
+    # Drop every cached model so the memory can be reclaimed (e.g. before the upload stage)
+    with _models_lock:
+        if _models:
+            print(f"Unloading {len(_models)} Whisper model(s)...")
+        _models.clear()
+    gc.collect()
+
+def extract_audio(video_path):
+    # Decode the audio track once, straight to 16 kHz mono float32 PCM on stdout.
+    # No intermediate file, so concurrent runs cannot clobber each other.
+    import numpy as np
+
+    command = [
+        FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-i", video_path,
+        "-map", "0:a:0?", "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+        "-f", "f32le", "-",
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        error = result.stderr.decode(errors="replace").strip()
+        # Videos without an audio track map to no output stream at all
+        if "does not contain any stream" in error:
+            return np.zeros(0, dtype=np.float32)
+        raise RuntimeError(f"ffmpeg could not extract audio from {video_path}: {error}")
+
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+def speech_audio(audio, max_seconds=None):
+    # Only the stretches with speech (Silero VAD, bundled with faster-whisper), up to max_seconds of them
+    import numpy as np
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    budget = int((max_seconds or TRANSCRIPT_MAX_SECONDS) * SAMPLE_RATE)
+    pieces = []
+    for chunk in get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=500), sampling_rate=SAMPLE_RATE):
+        piece = audio[chunk["start"]:chunk["end"]][:budget]
+        pieces.append(piece)
+        budget -= len(piece)
+        if budget <= 0:
+            break
+    return np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)
+
+def decode(model, audio):
+    # One Whisper pass: (text, mean avg_logprob of the segments, detected language, its probability)
+    if TRANSCRIPT_MODE == "full":
+        segments, info = model.transcribe(audio, beam_size=WHISPER_BEAM_SIZE or 5)
+        segments = list(segments)
+    else:
+        # The VAD already cut out the silences; previous-text conditioning only slows greedy decoding down
+        segments, info = model.transcribe(audio, beam_size=WHISPER_BEAM_SIZE or 1, condition_on_previous_text=False)
+        segments = bounded(segments)
+    text = " ".join(segment.text.strip() for segment in segments)
+    logprob = sum(segment.avg_logprob for segment in segments) / len(segments) if segments else 0.0
+    return text, logprob, info.language, info.language_probability
+
+def bounded(segments, max_chars=None):
+    # Segments are decoded while they are iterated, so stopping at the budget skips the rest of the audio
+    max_chars = max_chars or TRANSCRIPT_MAX_CHARS
+    kept, length = [], 0
+    for segment in segments:
+        kept.append(segment)
+        length += len(segment.text.strip()) + 1
+        if length > max_chars:
+            break
+    return kept
+
+def escalation_reason(logprob, language, language_probability):
+    # Why the next tier should have another go at this clip, or None
+    if logprob < WHISPER_ESCALATE_LOGPROB:
+        return f"average log-probability {logprob:.2f}"
+    if language not in WHISPER_TIER_LANGUAGES and language_probability >= 0.5:
+        return f"language '{language}'"
+    return None
+
+def transcribe_passes(audio, model=None):
+    # Returns the text and one timing sample per step (VAD, each tier), so worker processes can hand
+    # them back to the parent's run report. An explicit model skips the tiers.
+    passes = []
+
+    def timed_pass(stage, func, *args):
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = func(*args)
+        passes.append({"stage": stage, "wall_seconds": time.perf_counter() - wall,
+                       "cpu_seconds": time.process_time() - cpu})
+        return result
+
+    if TRANSCRIPT_MODE != "full":
+        audio = timed_pass("vad", speech_audio, audio)
+        if audio.size == 0:
+            return "", passes  # music or silence: no model is even loaded
+    if model is not None:
+        return timed_pass("whisper", decode, model, audio)[0], passes
+
+    tiers = parse_tiers(WHISPER_TIERS)
+    if len(tiers) > 1 and len(audio) > WHISPER_SHORT_CLIP_SECONDS * SAMPLE_RATE:
+        tiers = tiers[1:]
+    for index, size in enumerate(tiers):
+        text, logprob, language, probability = timed_pass(f"whisper_{size}", decode, get_model(size), audio)
+        reason = escalation_reason(logprob, language, probability) if index + 1 < len(tiers) else None
+        passes[-1]["escalated"] = reason is not None
+        if reason is None:
+            break
+        print(f"Whisper '{size}' is not sure ({reason}), trying '{tiers[index + 1]}'...")
+    return text, passes
+
+def record_passes(passes):
+    for sample in passes:
+        instrumentation.record(**sample)
+
+def transcribe(audio, model=None):
+    text, passes = transcribe_passes(audio, model)
+    record_passes(passes)
+    return text
+
+def available_cpus():
+    # Respect CPU affinity / container limits where the platform exposes them
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def default_pool_size(cpus=None):
+    # Short reels do not keep more than ~2 intra-op threads busy, so spend the rest
+    # of the cores on more workers, keeping workers x threads == cores.
+    cpus = cpus or available_cpus()
+    workers = TRANSCRIBE_WORKERS or max(1, min(4, cpus // 2))
+    threads = max(1, cpus // workers)
+    return workers, threads
+
+def _init_worker(tiers, compute_type, cpu_threads):
+    # Runs once in every worker process: load the first tier up front so the first job is not slower.
+    # Higher tiers are loaded (and kept) the first time a clip escalates to them.
+    global WHISPER_TIERS, WHISPER_COMPUTE_TYPE, WHISPER_CPU_THREADS
+    WHISPER_TIERS, WHISPER_COMPUTE_TYPE, WHISPER_CPU_THREADS = tiers, compute_type, cpu_threads
+    get_model(parse_tiers(tiers)[0])
+
+def _transcribe_in_worker(audio):
+    return transcribe_passes(audio)  # the parent records the passes
+
+class TranscriptionPool:
+    # Fans transcription out to worker processes; results are returned in submission order
+    def __init__(self, workers=None, cpu_threads=None, tiers=None, compute_type=None):
+        self.workers = workers or default_pool_size()[0]
+        self.cpu_threads = cpu_threads or max(1, available_cpus() // self.workers)
+        print(f"Starting {self.workers} transcription worker(s) with {self.cpu_threads} thread(s) each...")
+
+        # spawn instead of fork: the parent process is already running pipeline threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(tiers or WHISPER_TIERS, compute_type or WHISPER_COMPUTE_TYPE, self.cpu_threads),
+        )
+
+    def submit(self, audio):
+        return self._executor.submit(_transcribe_in_worker, audio)
+
+    def transcribe(self, audio):
+        return self._result(self.submit(audio))
+
+    def _result(self, future):
+        # The passes are recorded in the calling thread, so they land in the run report of the video
+        text, passes = future.result()
+        record_passes(passes)
+        return text
+
+    def close(self):
+        # Worker processes exit and take their models with them
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -1,146 +1,173 @@
+import argparse
+import bisect
+import contextlib
 import datetime
-import json
 import os
+import threading
+import time
 
-import ollama
-from faster_whisper import WhisperModel
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from moviepy import VideoFileClip
+import dedup
+import instrumentation
+import job_ledger
+import media_prep
+import metadata_cache
+import metadata_engine
+import retry
+import schedule_planner
+import transcription
+import youtube_client
+import youtube_upload
+from pipeline import Pipeline, Stage
 
 # Configuration
 VIDEO_FOLDER = "videos"
-STATE_FILE = "schedule_state.json"
-CLIENT_SECRETS_FILE = "client_secrets.json"
-OLLAMA_MODEL = "gemma3:1b"  # Text-only model
-SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
-
-def get_authenticated_service():
-    creds = None
-    # The file token.json stores the user's access and refresh tokens
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            print("Refreshing access token...")
-            creds.refresh(Request())
-        else:
-            print("Fetching new tokens...")
-            flow = InstalledAppFlow.from_client_secrets_file(
-                CLIENT_SECRETS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        # Save the credentials for the next run
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-            
+STATE_FILE = "schedule_state.json"  # pre-ledger state, imported once
+LEDGER_FILE = job_ledger.LEDGER_FILE
+CLIENT_SECRETS_FILE = youtube_client.CLIENT_SECRETS_FILE
+SCOPES = youtube_client.SCOPES
+
+FALLBACK_METADATA = ("Daily Upload", "Check this out! #shorts")
+
+def get_authenticated_service(token_file=None):
+    # The Google client libraries are slow to import and only needed once there is something to upload.
+    # The client (and its token refresh) is shared by the whole process, e.g. every batch of the watch daemon.
+    # token_file selects the channel (see channels.py); the default is youtube_client.TOKEN_FILE.
+    youtube = youtube_client.get_client(token_file).service
     print("Authentication successful!")
-    return build("youtube", "v3", credentials=creds)
+    return youtube
+
+_ledgers = {}
+_ledger_lock = threading.Lock()
+
+def get_ledger():
+    # One ledger per file (one per channel) and process, shared by the pipeline threads.
+    # The old JSON state is imported on first use.
+    with _ledger_lock:
+        ledger = _ledgers.get(LEDGER_FILE)
+        if ledger is None:
+            ledger = _ledgers[LEDGER_FILE] = job_ledger.JobLedger(LEDGER_FILE)
+            ledger.migrate_json(STATE_FILE)
+        return ledger
 
 def get_next_schedule_time():
-    # Load state
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, 'r') as f:
-            state = json.load(f)
-        last_date = datetime.datetime.fromisoformat(state['last_scheduled_date'])
-        next_date = last_date + datetime.timedelta(days=1)
-    else:
-        # Start from today if no state exists
-        next_date = datetime.datetime.now()
+    # First publish slot after the latest uploaded one, or after now if nothing was scheduled yet.
+    # Slots come from PUBLISH_SLOTS / BLACKOUT_DATES in SCHEDULE_TIMEZONE and are returned in UTC.
+    now = datetime.datetime.now(datetime.timezone.utc)
+    last_date = get_ledger().last_scheduled()
+    return next(schedule_planner.SchedulePlanner().upcoming(max(filter(None, (last_date, now)))))
+
+def format_slot(slot):
+    return f"{schedule_planner.local_time(slot):%Y-%m-%d %H:%M %Z}"
+
+def plan_schedule(count, persist=True):
+    # Slots for the whole backlog in one pass. Stored in the ledger, so the upload stage only reads the plan.
+    # Slots already planned are kept unless they are in the past or the slot configuration changed.
+    ledger = get_ledger()
+    planner = schedule_planner.SchedulePlanner()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    planned = [slot for slot in ledger.free_slots() if slot > now and planner.is_slot(slot)]
+    if len(planned) < count:
+        after = max(planned[-1:] + [get_next_schedule_time() - datetime.timedelta(seconds=1)])
+        planned += planner.plan(count - len(planned), after)
+    if persist:
+        ledger.replace_free_slots(planned)
+    return planned
+
+def caption_path(video_path):
+    # Instagram caption saved next to the video by the downloaders, if any
+    return os.path.splitext(video_path)[0] + ".txt"
+
+def read_caption(video_path):
+    try:
+        with open(caption_path(video_path), encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+def metadata_context(transcript, video_path):
+    # Reels without speech (music, silence) fall back to their Instagram caption
+    if transcript.strip():
+        return transcript
+    caption = read_caption(video_path)
+    if caption:
+        print("No speech, using the Instagram caption instead.")
+    return caption or transcript
 
-    # Force 12:00 PM (noon) roughly matches CEST noon depending on your local time
-    # YouTube expects ISO 8601 (YYYY-MM-DDThh:mm:ss.sZ)
-    scheduled_time = next_date.replace(hour=12, minute=0, second=0, microsecond=0)
-    
-    return scheduled_time
+def remove_video(path):
+    os.remove(path)
+    if os.path.exists(caption_path(path)):
+        os.remove(caption_path(path))
+
+def set_aside(path, folder=None):
+    # Moves the video (and its caption) out of the queue
+    target = retry.quarantine(path, folder)
+    if os.path.exists(caption_path(path)):
+        retry.quarantine(caption_path(path), folder)
+    return target
 
 def get_transcript(video_path):
     print("Extracting video transcript...")
 
-    # Extract audio from video temporarily
-    try:
-        video = VideoFileClip(video_path)
-        audio_path = "temp_audio.mp3"
-        video.audio.write_audiofile(audio_path, logger=None)
-    finally:
-        if 'video' in locals():
-            video.close()
-    
-    # Load lightweight model ('tiny' or 'base' is enough for context)
-    # run on cpu always, the model is small so gpu acceleration is not needed
-    model = WhisperModel("base", device="cpu", compute_type="int8")
-    
-    # Transcribe
-    segments, _ = model.transcribe(audio_path, beam_size=5)
-    
-    # Clean up
-    transcript = " ".join([segment.text for segment in segments])
-    if os.path.exists(audio_path):
-        os.remove(audio_path)
-    
-    return transcript
+    # Decode the audio track in memory (16 kHz mono PCM)
+    audio = transcription.extract_audio(video_path)
+    return transcribe_audio(audio)
+
+def transcribe_audio(audio, transcriber=None):
+    if audio.size == 0:
+        print("Video has no audio track.")
+        return ""
+
+    # Lightweight model ('tiny' or 'base' is enough for context), loaded once per process
+    return (transcriber or transcription.transcribe)(audio)
 
 def generate_metadata(video_path):
     print("Generating metadata...")
 
-    # Get transcript
-    transcript = get_transcript(video_path)
+    # Retries and re-runs only pay for the upload: reuse earlier results for the same video contents
+    with metadata_cache.MetadataCache() as cache:
+        digest = metadata_cache.content_hash(video_path)
+        metadata = cached_metadata(cache, digest)
+        if metadata:
+            return metadata
 
-    # Ask Ollama 
-    print("Asking Ollama to generate title/description...")
-    prompt = f"""
-    You are a YouTube Shorts creator. The text below is the spoken content of your video.
-    CONTENT: "{transcript}"
-
-    TASK:
-    Write a viral Title and Description to post on YouTube.
-
-    CRITICAL RULES:
-    1. Speak directly to the audience (use "You", "Your").
-    2. STRICTLY FORBIDDEN: Do not use words like "transcript", "video", "audio", "summary", or "text".
-    3. Make it sound immediate and urgent.
-
-    EXAMPLE OUTPUT (Follow this style):
-    {{"title": "Your Phone is DIRTY 🦠", "description": "You won't believe how much bacteria is crawling on your screen right now."}}
-
-    OUTPUT FORMAT:
-    Return ONLY valid JSON.
-    """
-    
-    # Initialize client explicitly
+        # Get transcript
+        transcript = cache.get_transcript(digest, transcription.model_id())
+        if transcript is None:
+            transcript = get_transcript(video_path)
+            cache.put_transcript(digest, transcription.model_id(), transcript)
+        return cache_metadata(cache, digest, metadata_context(transcript, video_path))
+
+def cached_metadata(cache, digest):
+    metadata = cache.get_metadata(digest, *metadata_key())
+    if metadata:
+        print(f"Using cached metadata: {metadata[0]}")
+    return metadata
+
+def cache_metadata(cache, digest, transcript, engine=None):
+    # Only real Ollama answers are cached, never the fallback
     try:
-        host = os.environ.get('OLLAMA_HOST', 'http://host.docker.internal:11434')
-        if "127.0.0.1" in host or "localhost" in host:
-             # Fallback if env var is weird, but try to use what's given
-             pass
-        
-        client = ollama.Client(host=host)
-        
-        response = client.chat(model=OLLAMA_MODEL, messages=[
-            {'role': 'user', 'content': prompt}
-        ], format='json', options={'num_gpu': 0}) # Force CPU to save memory
-        content = response['message']['content']
-        print(f"Ollama response: {content}")
-        
-        data = json.loads(content)
-        if 'title' in data and 'description' in data:
-            title = data['title']
-            desc = data['description']
-        else:
-            title = "Daily Short"
-            desc = "Cool video #shorts"
-            
-        return title.strip(), desc.strip() + " #shorts"
+        metadata = retry.call_with_retry(request_metadata, transcript, engine, stage="Ollama")
     except Exception as e:
         print(f"Metadata generation failed: {e}")
-        return "Daily Upload", "Check this out! #shorts"
+        return FALLBACK_METADATA
+    cache.put_metadata(digest, *metadata_key(), *metadata)
+    return metadata
 
-def upload_video(youtube, path, date_time):
-    title, description = generate_metadata(path)
-    print(f"Uploading: {title} for {date_time}")
+def request_metadata(transcript, engine=None):
+    # Ask Ollama 
+    print("Asking Ollama to generate title/description...")
+    with instrumentation.measure("ollama"):
+        return (engine or metadata_engine.get_engine()).generate(transcript)
+
+def metadata_key():
+    # Everything besides the video contents that changes the generated metadata
+    engine = metadata_engine.get_engine()
+    return transcription.model_id(), engine.model, metadata_engine.PROMPT_VERSION
+
+def upload_video(youtube, path, date_time, metadata=None, session=None, on_progress=None, http=None, quota=None):
+    # The pipeline generates metadata in an earlier stage and passes it in
+    title, description = metadata or generate_metadata(path)
+    print(f"Uploading: {title} for {schedule_planner.publish_at(date_time)}")
 
     request_body = {
         "snippet": {
@@ -150,52 +177,563 @@ def upload_video(youtube, path, date_time):
         },
         "status": {
             "privacyStatus": "private", # Must be private to schedule via API
-            "publishAt": date_time.isoformat() + "Z", # UTC time
+            "publishAt": schedule_planner.publish_at(date_time), # UTC time
             "selfDeclaredMadeForKids": False
         }
     }
 
-    media = MediaFileUpload(path, chunksize=-1, resumable=True)
-    request = youtube.videos().insert(
-        part="snippet,status",
-        body=request_body,
-        media_body=media
-    )
-    response = request.execute()
+    from googleapiclient.http import MediaFileUpload
+
+    def make_request():
+        # Chunked so an interrupted upload can continue from the last acknowledged byte
+        media = MediaFileUpload(path, chunksize=youtube_upload.UPLOAD_CHUNK_SIZE, resumable=True)
+        return youtube.videos().insert(
+            part="snippet,status",
+            body=request_body,
+            media_body=media
+        )
+
+    response = youtube_upload.resumable_upload(make_request, session, on_progress, http, quota)
     return response
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Schedule the videos in videos/ as YouTube Shorts.")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.add_parser("status", help="show the queue, the next publish slot and today's quota")
+    commands.add_parser("plan", help="show the slot every queued video would get, without processing anything")
+    commands.add_parser("run", help="transcribe, write metadata and upload the queue (default)")
+    commands.add_parser("dry-run", help="transcribe and write metadata, but do not upload or touch the schedule")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        show_status()
+    elif args.command == "plan":
+        show_plan()
+    else:
+        run(dry_run=args.command == "dry-run")
+
+def queued_videos():
+    # Sorted so every run sees the backlog in the same order
+    return sorted(f for f in os.listdir(VIDEO_FOLDER) if f.endswith(('.mp4', '.mov')))
+
+def print_estimate(count):
+    # Rolling average of the seconds per video measured by the last runs on this machine
+    eta, runs = instrumentation.estimate_seconds(count)
+    basis = f"average of the last {runs} runs" if runs else "no measured runs yet, assuming 1 minute per video"
+    print(f"Estimated time: {instrumentation.format_duration(eta)} ({basis}).")
+
+def run(dry_run=False):
     print("Starting script...")
-    youtube = get_authenticated_service()
-    videos = [f for f in os.listdir(VIDEO_FOLDER) if f.endswith(('.mp4', '.mov'))]
+    videos = queued_videos()
     print(f"Found {len(videos)} videos to process.")
-    print(f"Estimated time on CPU: {len(videos)} minutes.") # 1 min per video
-    # print(f"Estimated time on GPU: {len(videos) / 12} minutes.") # 20s per video, but usually does not use gpu acceleration
-
+    if not videos:
+        return  # nothing to do: no auth, no models, no heavy imports
+    print_estimate(len(videos))
     current_schedule = get_next_schedule_time()
 
-    for video in videos:
-        print(f"Processing video: {video}. This may take a while.")
-        video_path = os.path.join(VIDEO_FOLDER, video)
-        
-        # If upload fails, video will not be deleted
+    if dry_run:
+        processed = process_videos(None, videos, current_schedule, dry_run=True)
+        print(f"Prepared {len(processed)} of {len(videos)} videos. Nothing was uploaded.")
+        return
+
+    upload_batch(get_authenticated_service(), videos, current_schedule)
+
+def upload_batch(youtube, videos, current_schedule=None, keep_warm=False, stop_event=None, verify_timeout=None):
+    # Plans, processes and uploads `videos` as one measured run; also used by the watch daemon for every batch.
+    # verify_timeout=0 checks the uploads once instead of waiting for YouTube to process them.
+    current_schedule = current_schedule or get_next_schedule_time()
+    planned = plan_schedule(len(videos))
+    print(f"Planned publish slots up to {format_slot(planned[len(videos) - 1])}.")
+
+    instrumentation.start_run()
+    quota = get_quota_ledger()
+    print(f"YouTube quota left today: {quota.remaining()} units (~{quota.remaining() // youtube_upload.QUOTA_INSERT_COST} uploads).")
+
+    processed = []
+    try:
+        processed = process_videos(youtube, videos, current_schedule, quota=quota, keep_warm=keep_warm,
+                                   stop_event=stop_event, verify_timeout=verify_timeout)
+    finally:
+        report = instrumentation.finish_run(found=len(videos), processed=len(processed))
+    print(f"Uploaded {len(processed)} of {len(videos)} videos in {instrumentation.format_duration(report['wall_seconds'])}.")
+    print_media_savings(report['stages'])
+    failures = get_ledger().counts().get(job_ledger.FAILED, 0)
+    if failures:
+        print(f"{failures} videos failed and will be retried next run (quarantined after {retry.QUARANTINE_AFTER} failed runs).")
+    return processed
+
+def print_media_savings(stages):
+    # What the prepare stage saved, in bytes and in upload time at this run's measured upload rate
+    saved = stages.get("prepare", {}).get("saved_bytes", 0)
+    rate = stages.get("upload", {}).get("bytes_per_second")
+    if not saved:
+        return
+    estimate = f", about {instrumentation.format_duration(saved / rate)} of upload time" if rate else ""
+    print(f"Preparing the videos saved {saved / 2 ** 20:.1f} MiB{estimate}.")
+
+def show_status():
+    ledger = get_ledger()
+    counts = ledger.counts()
+    videos = queued_videos()
+    size = sum(os.path.getsize(os.path.join(VIDEO_FOLDER, video)) for video in videos)
+    print(f"Queued videos: {len(videos)} ({size / 1024 / 1024:.1f} MiB in {VIDEO_FOLDER}/)")
+    print(f"Uploaded so far: {counts.get(job_ledger.UPLOADED, 0)}")
+    last = ledger.last_scheduled()
+    print(f"Last scheduled: {format_slot(last) if last else '-'}")
+
+    slots = load_slots(get_next_schedule_time())
+    if slots.free:
+        print(f"Planned slots: {len(slots.free)} (up to {format_slot(slots.free[-1])})")
+    print(f"Next publish slot: {format_slot(slots.take())}")
+    if counts.get(job_ledger.PROCESSING):
+        print(f"Waiting for YouTube processing: {counts[job_ledger.PROCESSING]} (files kept until verified)")
+    if counts.get(job_ledger.UPLOADING):
+        print(f"Unfinished uploads (resumed next run): {counts[job_ledger.UPLOADING]}")
+    if counts.get(job_ledger.FAILED):
+        print(f"Failing videos: {counts[job_ledger.FAILED]} (quarantined after {retry.QUARANTINE_AFTER} failed runs)")
+    if counts.get(job_ledger.DUPLICATE):
+        print(f"Duplicates set aside: {counts[job_ledger.DUPLICATE]} (in {dedup.DUPLICATE_FOLDER}/)")
+    if os.path.isdir(retry.QUARANTINE_FOLDER) and os.listdir(retry.QUARANTINE_FOLDER):
+        print(f"Quarantined videos: {len(os.listdir(retry.QUARANTINE_FOLDER))} in {retry.QUARANTINE_FOLDER}/")
+
+    quota = get_quota_ledger()
+    print(f"YouTube quota left today: {quota.remaining()} units (~{quota.remaining() // youtube_upload.QUOTA_INSERT_COST} uploads)")
+    history = instrumentation.load_history()
+    if history:
+        last = history[-1]
+        print(f"Last run: {last['finished_at']}, {last['videos']} videos in {instrumentation.format_duration(last['wall_seconds'])}")
+
+def show_plan():
+    # Plans (and stores) a slot for every queued video, in queue order, without hashing, transcribing or uploading anything
+    videos = queued_videos()
+    if not videos:
+        print("Nothing queued.")
+        return
+    planned = plan_schedule(len(videos))
+    uploads = get_quota_ledger().remaining() // youtube_upload.QUOTA_INSERT_COST
+    for index, (video, slot) in enumerate(zip(videos, planned)):
+        print(f"{format_slot(slot)}  {video}" + ("" if index < uploads else " (next run, quota)"))
+    unfinished = get_ledger().counts().get(job_ledger.UPLOADING)
+    if unfinished:
+        print(f"{unfinished} unfinished uploads keep the slot they were started with.")
+    print_estimate(min(len(videos), uploads))
+
+def record_failure(job, stage, error):
+    # Failed runs are counted per video; one that keeps failing is moved to the quarantine folder
+    ledger = get_ledger()
+    if job.id is None:
+        job.id = ledger.discover(job.name, job.content_hash)['id']  # failed before it could be looked up
+    quarantine_if_failing(job.id, job.path, ledger.record_failure(job.id, stage, error))
+
+def quarantine_if_failing(job_id, path, failures):
+    if failures >= retry.QUARANTINE_AFTER and os.path.exists(path):
+        target = set_aside(path)
+        get_ledger().update(job_id, job_ledger.QUARANTINED)
+        print(f"{os.path.basename(path)} failed {retry.QUARANTINE_AFTER} runs in a row, moved to {target}.")
+
+def verify_uploads(youtube, quota=None, fingerprints=None, stop_event=None, timeout=None):
+    # Waits for YouTube to finish processing what was sent (by this run and earlier ones) with batched status
+    # checks. Only then is a file deleted, or, when YouTube rejected the upload, queued again.
+    # timeout=0 checks once without waiting: what is still processing stays `processing` in the ledger and is
+    # checked again later. Returns the number of uploads still waiting.
+    ledger = get_ledger()
+    jobs = {job['youtube_id']: job for job in ledger.processing() if job['youtube_id']}
+    if not jobs:
+        return 0
+    print(f"Checking that YouTube processed {len(jobs)} uploads...")
+    try:
+        with upload_connection(youtube) as http, instrumentation.measure("verify"):
+            statuses = youtube_upload.wait_for_processing(youtube, list(jobs), http=http, quota=quota,
+                                                          timeout=timeout, stop_event=stop_event)
+    except Exception as e:
+        print(f"Could not check the uploads ({e}), trying again later.")
+        return len(jobs)
+
+    now, counts = time.time(), {}
+    for youtube_id, job in jobs.items():
+        outcome, reason = statuses.get(youtube_id, (youtube_upload.PENDING, None))
+        if outcome == youtube_upload.MISSING and now - (job['uploaded_at'] or now) > youtube_upload.VERIFY_MISSING_AFTER:
+            outcome = youtube_upload.REJECTED
+        counts[outcome] = counts.get(outcome, 0) + 1
+        path = os.path.join(VIDEO_FOLDER, job['name'])
+        if outcome == youtube_upload.PROCESSED:
+            ledger.mark_verified(job['id'])
+            if os.path.exists(path):
+                remove_video(path)
+        elif outcome == youtube_upload.REJECTED:
+            print(f"YouTube did not accept {job['name']} ({youtube_id}): {reason}. It goes back into the queue.")
+            if fingerprints:
+                fingerprints.forget_upload(job['content_hash'])
+            quarantine_if_failing(job['id'], path, ledger.reject(job['id'], reason))
+    waiting = counts.get(youtube_upload.PENDING, 0) + counts.get(youtube_upload.MISSING, 0)
+    print(f"Verified {counts.get(youtube_upload.PROCESSED, 0)} uploads, {counts.get(youtube_upload.REJECTED, 0)} rejected"
+          + (f", {waiting} still processing (checked again later)." if waiting else "."))
+    return waiting
+
+def verify_pending(youtube, stop_event=None, timeout=0):
+    # One status check of the uploads still processing, without waiting by default: the watch daemon and
+    # multi-channel runs call this between batches instead of blocking the other channels
+    if not youtube_client.can_verify(youtube) or not get_ledger().processing():
+        return 0
+    with dedup.FingerprintIndex(LEDGER_FILE) as fingerprints:
+        return verify_uploads(youtube, get_quota_ledger(), fingerprints, stop_event, timeout)
+
+def get_quota_ledger():
+    ledger = get_ledger()
+    return youtube_upload.QuotaLedger(ledger.quota_spent(), ledger.save_quota)
+
+class SlotAllocator:
+    # Hands out publish slots in order: the planned ones first (slots of failed uploads go back into
+    # the plan, so a failure does not leave a hole in the schedule), then more from `upcoming` if the plan runs short.
+    # `after` is the end of the schedule so far: earlier slots that are not free are taken.
+    def __init__(self, planned, upcoming, after):
+        self.free = sorted(planned)
+        self.upcoming = iter(upcoming)
+        self.last = after
+        self._lock = threading.Lock()
+
+    def _next(self):
+        self.last = next(self.upcoming)
+        return self.last
+
+    def take(self):
+        with self._lock:
+            if self.free:
+                return self.free.pop(0)
+            return self._next()
+
+    def claim(self, slot):
+        # Take one specific slot (the one an unfinished upload session was started with)
+        with self._lock:
+            if slot in self.free:
+                self.free.remove(slot)
+                return True
+            if slot <= self.last:
+                return False  # already handed out
+            # Slots skipped on the way stay available
+            while self._next() < slot:
+                bisect.insort(self.free, self.last)
+            if self.last > slot:
+                bisect.insort(self.free, self.last)  # the session's slot is not on the current plan
+            return True
+
+    def release(self, slot):
+        with self._lock:
+            bisect.insort(self.free, slot)
+        # Stays free in the ledger until a later upload commits to it
+        get_ledger().add_free_slot(slot)
+
+def load_slots(next_slot):
+    # The stored plan first (ones already in the past are dropped), then further slots from the planner
+    now = datetime.datetime.now(datetime.timezone.utc)
+    planned = [slot for slot in get_ledger().free_slots() if slot > now]
+    after = max(planned[-1:] + [schedule_planner.to_utc(next_slot) - datetime.timedelta(seconds=1)])
+    return SlotAllocator(planned, schedule_planner.SchedulePlanner().upcoming(after), after)
+
+def upload_connection(youtube):
+    # Keep-alive connection borrowed from the client's pool for one upload. A service that was not built by
+    # a YouTubeClient uploads over its own connection (http=None).
+    client = youtube_client.client_for(youtube)
+    return client.connection() if client else contextlib.nullcontext()
+
+# Transcription worker processes kept between batches (keep_warm)
+_warm_pool = None
+
+def release_warm_models():
+    # Counterpart of keep_warm, for when the daemon shuts down
+    global _warm_pool
+    if _warm_pool is not None:
+        _warm_pool.close()
+        _warm_pool = None
+    transcription.unload_models()
+    engine = metadata_engine.get_engine()
+    engine.release()
+    engine.close()
+
+class VideoJob:
+    # One video travelling through the processing pipeline
+    def __init__(self, video):
+        self.id = None  # row in the job ledger
+        self.name = video
+        self.path = os.path.join(VIDEO_FOLDER, video)
+        self.upload_path = self.path  # a remuxed or transcoded copy after the prepare stage
+        self.content_hash = None
+        self.audio = None
+        self.transcript = None
+        self.title = None
+        self.description = None
+        self.publish_at = None
+        self.session = None
+        self.quota_reserved = False
+        self.response = None
+
+def extract_audio_stage(job):
+    if job.transcript is not None:
+        return job  # transcript came from the cache
+    print(f"Processing video: {job.name}. This may take a while.")
+    job.audio = transcription.extract_audio(job.path)
+    return job
+
+def process_videos(youtube, videos, current_schedule, cache=None, engine=None, quota=None, upload_workers=None,
+                   dry_run=False, keep_warm=False, stop_event=None, verify=None, verify_timeout=None):
+    # CPU-bound stages (audio, Whisper, Ollama) work on the next videos while the current ones upload.
+    # A single schedule worker reserves quota and hands out slots in order, several upload workers
+    # send videos in parallel, and a file is only deleted by the commit stage once its upload has been confirmed.
+    # Every step is recorded in the job ledger, so a run that dies halfway knows where each video stood.
+    # dry_run stops after the metadata: slots are only previewed, nothing is uploaded, deleted or written to the ledger.
+    # keep_warm leaves Whisper (and its worker processes) and the Ollama model loaded for the next batch.
+    # Once stop_event is set, uploads in flight finish and the other videos are left for the next run.
+    # verify (default: when the credentials allow it) keeps each file until YouTube has processed its upload;
+    # verify_timeout limits how long the run waits for that (default VERIFY_TIMEOUT_SECONDS, 0 = check once).
+    cache = cache or metadata_cache.MetadataCache()
+    fingerprints = dedup.FingerprintIndex(LEDGER_FILE)
+    quota = quota or youtube_upload.QuotaLedger()
+    upload_workers = upload_workers or youtube_upload.UPLOAD_WORKERS
+    ledger = get_ledger()
+    slots = load_slots(current_schedule)
+    engine = engine or metadata_engine.get_engine()
+    verify = not dry_run and (youtube_client.can_verify(youtube) if verify is None else verify)
+    workers, _ = transcription.default_pool_size()
+    if len(videos) <= 1:
+        workers = 1
+    pool = None
+    pool_lock = threading.Lock()
+
+    def transcriber():
+        # Parallel mode: worker processes (each with its own model) are only started when something misses the cache
+        nonlocal pool
+        if workers <= 1:
+            return None
+        with pool_lock:
+            if pool is None:
+                pool = _warm_pool if keep_warm and _warm_pool else transcription.TranscriptionPool(workers)
+            return pool.transcribe
+
+    def release_models():
+        global _warm_pool
+        if keep_warm:
+            _warm_pool = pool or _warm_pool
+            return
+        if pool is not None:
+            pool.close()
+        transcription.unload_models()
+
+    def track(job, state, **fields):
+        if not dry_run:
+            ledger.update(job.id, state, **fields)
+
+    def cache_lookup_stage(job):
+        job.content_hash = metadata_cache.content_hash(job.path)
+        # A byte-identical copy next to the original gets its own job (set aside as a duplicate below)
+        record = ledger.find(job.content_hash) if dry_run else ledger.discover(job.name, job.content_hash,
+                                                                                held=set(queued_videos()))
+        if record and record['state'] == job_ledger.UPLOADED:
+            # An earlier run uploaded it but stopped before deleting the file
+            print(f"{job.name} was already uploaded as {record['youtube_id']} for {record['publish_at']}, skipping.")
+            if not dry_run:
+                fingerprints.mark_uploaded(job.content_hash, record['youtube_id'])
+                remove_video(job.path)
+            return None
+        if record and record['state'] == job_ledger.PROCESSING:
+            print(f"{job.name} was uploaded as {record['youtube_id']}, waiting for YouTube to process it.")
+            return None
+        job.id = record and record['id']
+        metadata = cached_metadata(cache, job.content_hash)
+        if metadata:
+            job.title, job.description = metadata
+            job.transcript = ""
+        else:
+            job.transcript = cache.get_transcript(job.content_hash, transcription.model_id())
+        return job
+
+    def dedup_stage(job):
+        # Before Whisper and Ollama: a copy of an uploaded video would waste them, the quota and a publish slot
+        if dedup.DEDUP_MODE == "off":
+            return job
+
+        def audio():
+            return job.audio if job.audio is not None else transcription.extract_audio(job.path)
+
+        try:
+            fingerprint = fingerprints.fingerprint(job.content_hash, job.path, audio, store=not dry_run)
+        except Exception as e:
+            print(f"Could not fingerprint {job.name} ({e}), only checking for identical files.")
+            fingerprint = None
+        match = fingerprints.match(job.content_hash, fingerprint)
+        if match:
+            kind = "a duplicate of" if match.duplicate else "similar to"
+            earlier = f"uploaded as {match.youtube_id}" if match.youtube_id else "earlier in this run"
+            print(f"{job.name} is {kind} {match.name} ({earlier}): {match.describe()}.")
+            if match.duplicate and dedup.DEDUP_MODE == "skip":
+                if not dry_run:
+                    target = set_aside(job.path, dedup.DUPLICATE_FOLDER)
+                    track(job, job_ledger.DUPLICATE, duplicate_of=match.youtube_id or match.name)
+                    print(f"Moved it to {target} instead of uploading it.")
+                return None
+        fingerprints.claim(job.content_hash)
+        return job
+
+    def transcribe_stage(job):
+        if job.transcript is not None:
+            return job
+        print(f"Transcribing {job.name}...")
+        job.transcript = retry.call_with_retry(transcribe_audio, job.audio, transcriber(), stage="Transcription")
+        job.audio = None  # PCM is not needed anymore
+        cache.put_transcript(job.content_hash, transcription.model_id(), job.transcript)
+        track(job, job_ledger.TRANSCRIBED)
+        return job
+
+    def metadata_stage(job):
+        if job.title is None:
+            print(f"Generating metadata for {job.name}...")
+            context = metadata_context(job.transcript, job.path)
+            job.title, job.description = cache_metadata(cache, job.content_hash, context, engine)
+        track(job, job_ledger.METADATA_READY, title=job.title)
+        return job
+
+    def prepare_stage(job):
+        # Faststart remux (and with MEDIA_PREP=transcode a re-encode of oversized files) before the upload;
+        # a file that cannot be prepared is uploaded as it is
         try:
-            upload_video(youtube, video_path, current_schedule)
-            
-            # Delete video after upload
-            os.remove(video_path)
-            
-            # Update Schedule State
-            with open(STATE_FILE, 'w') as f:
-                json.dump({'last_scheduled_date': current_schedule.isoformat()}, f)
-            
-            # Increment for next loop
-            current_schedule += datetime.timedelta(days=1)
-            
+            prepared = media_prep.prepare(job.path, job.content_hash)
         except Exception as e:
-            print(f"Failed to upload {video}: {e}")
-            # break the loop if upload fails
-            break
+            print(f"Could not prepare {job.name} ({e}), uploading the original.")
+            return job
+        job.upload_path = prepared.path
+        if prepared.action:
+            if not prepared.cached:
+                instrumentation.add(saved_bytes=prepared.saved_bytes)  # a reused copy was counted by its own run
+            print(f"{job.name}: {media_prep.DONE[prepared.action]}, {prepared.saved_bytes / 2 ** 20:.1f} MiB smaller.")
+            if not prepared.cached and ledger.session(job.id):
+                # A new encode may not match the bytes an earlier run already sent: start that upload over
+                ledger.save_session(job.id, None, None)
+        return job
+
+    def schedule_stage(job):
+        # Continue an upload that an earlier run left unfinished: same contents, same slot, no new insert
+        session = ledger.session(job.id)
+        if session and session['publish_at'] and slots.claim(session['publish_at']):
+            job.session = session
+            job.publish_at = session['publish_at']
+            track(job, job_ledger.UPLOADING)
+            return job
+
+        # Stop issuing inserts once today's budget is spent; the rest waits for the next run
+        if not quota.reserve():
+            raise youtube_upload.QuotaExhausted("Daily YouTube quota used up")
+        job.quota_reserved = True
+        job.publish_at = slots.take()
+        track(job, job_ledger.UPLOADING, publish_at=job_ledger.format_slot(job.publish_at), upload_uri=None,
+              upload_offset=None)
+        return job
+
+    def upload_stage(job):
+        def save_session(progress):
+            with instrumentation.measure("state_write"):
+                ledger.save_session(job.id, progress['uri'], progress['offset'])
+
+        def attempt():
+            # A retry continues from the last chunk YouTube acknowledged instead of starting over
+            session = ledger.session(job.id) or job.session
+            return upload_video(youtube, job.upload_path, job.publish_at, metadata=(job.title, job.description),
+                                session=session, on_progress=save_session, http=http, quota=quota)
+
+        with upload_connection(youtube) as http:
+            job.response = retry.call_with_retry(attempt, stage="Upload")
+        # Bytes sent by this run, for the upload rate in the run report
+        instrumentation.add(bytes=os.path.getsize(job.upload_path) - (job.session or {}).get('offset', 0))
+        return job
+
+    def commit_stage(job):
+        # Record the upload first: if the run dies before the delete, the next run skips the file instead of uploading it twice
+        with instrumentation.measure("state_write"):
+            ledger.mark_uploaded(job.id, (job.response or {}).get('id'), job.publish_at,
+                                 job_ledger.PROCESSING if verify else job_ledger.UPLOADED)
+            fingerprints.mark_uploaded(job.content_hash, (job.response or {}).get('id'))
+        media_prep.discard(job.content_hash)
+
+        # Delete video (and caption) after upload; with verification once YouTube has processed it
+        if not verify:
+            remove_video(job.path)
+        return job
+
+    def preview_stage(job):
+        job.publish_at = slots.take()  # not persisted
+        print(f"Would upload {job.name} for {format_slot(job.publish_at)}: {job.title} | {job.description}")
+        return job
+
+    def on_error(job, stage, e):
+        if dry_run:
+            print(f"Failed to prepare {job.name} ({stage}): {e}")
+            return False
+        # The video is not deleted either way; its slot goes to the next video
+        if stage == "upload":
+            slots.release(job.publish_at)
+        if retry.classify(e) == retry.FATAL_RUN:
+            # Auth or quota problems: every other video would fail the same way
+            if isinstance(e, youtube_upload.QuotaExhausted):
+                print(f"{e}. {job.name} and the remaining videos are carried over to the next run.")
+            else:
+                print(f"Stopping the run, {job.name} ({stage}): {e}")
+            return True
+        print(f"Failed to upload {job.name} ({stage}): {e}. Continuing with the next video.")
+        record_failure(job, stage, e)
+        return False
+
+    def on_discard(job, stage):
+        # Scheduled but never sent (the run stopped): free the slot and the reserved quota
+        if stage == "upload":
+            slots.release(job.publish_at)
+            if job.quota_reserved:
+                quota.refund()
+
+    def stage(name, func, **options):
+        # Every stage is timed per video for the run report
+        timed = instrumentation.timed(name, func)
+
+        def run_stage(job):
+            if stop_event is not None and stop_event.is_set() and name != "commit":
+                # Uploads already sending finish; everything else stays queued (slot and quota handed back)
+                pipeline.stop(stage="upload")
+                on_discard(job, name)
+                return None
+            return timed(job)
+        return Stage(name, run_stage, **options)
+
+    def release_engine():
+        if not keep_warm:
+            engine.release()
+
+    pipeline = Pipeline([
+        stage("cache_lookup", cache_lookup_stage),
+        stage("extract_audio", extract_audio_stage),
+        # One worker, so every video is checked against the ones before it in the same run
+        stage("dedup", dedup_stage),
+        # Free the Whisper weights as soon as the last video is transcribed, before the remaining uploads.
+        # With several workers the results are re-sequenced so slots are still handed out in order.
+        stage("transcribe", transcribe_stage, workers=workers, ordered=True, on_finish=release_models),
+        # Several prompts in flight over one shared client; Ollama keeps the model loaded until the last one
+        stage("metadata", metadata_stage, workers=engine.concurrency, ordered=True, on_finish=release_engine),
+    ] + ([stage("preview", preview_stage)] if dry_run else [
+        # ffmpeg in a bounded pool; ordered, so slots are still handed out in queue order
+        stage("prepare", prepare_stage, workers=media_prep.MEDIA_PREP_WORKERS, ordered=True),
+        stage("schedule", schedule_stage),
+        stage("upload", upload_stage, workers=upload_workers),
+        stage("commit", commit_stage),
+    ]), error_handler=on_error, discard_handler=on_discard)
+    try:
+        processed = pipeline.run(VideoJob(video) for video in videos)
+        if verify:
+            verify_uploads(youtube, quota, fingerprints, stop_event, verify_timeout)
+        return processed
+    finally:
+        removed = cache.prune()
+        if removed:
+            print(f"Evicted {removed} old cache entries.")
+        if not dry_run:
+            media_prep.prune()
+        cache.close()
+        fingerprints.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
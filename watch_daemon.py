@@ -0,0 +1,325 @@
+# Long-running replacement for the nightly cron job: watches videos/ and uploads new videos as they arrive.
+# Whisper, the Ollama model and the YouTube client stay loaded between videos, and files that are still
+# being written (scp, a download in progress) are only picked up once they are complete.
+# With a channels.json, every channel's folder is watched and the channels take turns (see channels.py).
+
+import ctypes
+import ctypes.util
+import datetime
+import json
+import os
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import channels
+import upload_vids
+
+# Configuration
+# A file written in place counts as complete once its size and mtime stop changing for this long.
+# Files renamed into the folder (the downloaders write to .part and rename) are complete straight away.
+WATCH_SETTLE_SECONDS = float(os.environ.get("WATCH_SETTLE_SECONDS", "10"))
+# Arrivals within this window are uploaded as one batch
+WATCH_BATCH_SECONDS = float(os.environ.get("WATCH_BATCH_SECONDS", "3"))
+# The whole folder is checked again this often: failed videos, videos held back by the daily quota
+WATCH_RESCAN_SECONDS = float(os.environ.get("WATCH_RESCAN_SECONDS", "3600"))
+# Uploads still being processed by YouTube are checked this often (one status check, never a wait)
+WATCH_VERIFY_SECONDS = float(os.environ.get("WATCH_VERIFY_SECONDS", "120"))
+# Polling interval when inotify is not available (not Linux)
+WATCH_POLL_SECONDS = float(os.environ.get("WATCH_POLL_SECONDS", "5"))
+# Health endpoint: GET /health on this port, 0 disables it
+HEALTH_PORT = int(os.environ.get("HEALTH_PORT", "8080"))
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov')
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_EVENT = struct.Struct("iIII")
+
+class Inotify:
+    # Minimal inotify binding through libc, so the daemon needs no extra package
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"cannot watch {folder}")
+
+    def read(self, timeout):
+        # (mask, name) of the events within `timeout` seconds
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events, offset = [], 0
+        while offset < len(data):
+            _, mask, _, length = IN_EVENT.unpack_from(data, offset)
+            offset += IN_EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append((mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class FolderWatcher:
+    # Reports each complete video in `folder` once. Uses inotify on Linux and polls the folder elsewhere.
+    def __init__(self, folder, settle=None, poll=None, use_inotify=True, clock=time.monotonic):
+        self.folder = folder
+        self.settle = WATCH_SETTLE_SECONDS if settle is None else settle
+        self.poll = poll or WATCH_POLL_SECONDS
+        self.clock = clock
+        self.pending = {}  # name -> (size, mtime, unchanged since)
+        self.listed = set()  # polling: the folder as of the last look
+        self.next_poll = 0
+        self.inotify = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self.inotify = Inotify(folder)
+            except OSError as e:
+                print(f"inotify is not available ({e}), polling {folder}/ every {self.poll:g}s instead.")
+
+    def close(self):
+        if self.inotify:
+            self.inotify.close()
+
+    def add(self, names):
+        # Candidates from a folder scan; they still have to settle (one may be half-copied)
+        for name in names:
+            if is_video(name) and name not in self.pending:
+                self.pending[name] = None
+
+    def wait(self, timeout):
+        # Waits up to `timeout` seconds for activity and returns the videos that are complete now
+        ready = []
+        if self.inotify:
+            for mask, name in self.inotify.read(timeout):
+                if not is_video(name):
+                    continue  # *.part, captions
+                if mask & IN_MOVED_TO:
+                    self.pending.pop(name, None)
+                    ready.append(name)  # renamed into place: the writer is done
+                else:
+                    self.pending[name] = None  # (re)start the settle timer
+        else:
+            time.sleep(timeout)
+            if self.clock() >= self.next_poll:
+                self.next_poll = self.clock() + self.poll
+                listing = set(os.listdir(self.folder))
+                self.add(sorted(listing - self.listed))  # only new names; the rescan retries the rest
+                self.listed = listing
+        return ready + self.settled()
+
+    def settled(self):
+        ready, now = [], self.clock()
+        for name, seen in list(self.pending.items()):
+            try:
+                stat = os.stat(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                del self.pending[name]
+                continue
+            if seen is None or seen[:2] != (stat.st_size, stat.st_mtime):
+                self.pending[name] = (stat.st_size, stat.st_mtime, now)
+            elif stat.st_size and now - seen[2] >= self.settle:
+                del self.pending[name]
+                ready.append(name)
+        return ready
+
+def is_video(name):
+    return name.endswith(VIDEO_EXTENSIONS)
+
+class WatchDaemon:
+    # Uploads videos as the watchers report them, one batch (one channel's turn) at a time, and serves its
+    # state on /health. `watcher` replaces the folder watcher of a single channel.
+    def __init__(self, folder=None, port=None, watcher=None, channel_list=None):
+        self.channels = channel_list or [channels.Channel(videos=folder)]
+        self.port = HEALTH_PORT if port is None else port
+        self.watchers = {self.channels[0].label: watcher} if watcher and len(self.channels) == 1 else {}
+        self.stop_event = threading.Event()
+        self.schedule = channels.RoundRobin(self.channels)
+        self.services = {}
+        self.server = None
+        self.state = {
+            "status": "starting",
+            "started_at": now_iso(),
+            "last_batch_at": None,
+            "last_batch": None,
+            "last_error": None,
+            "uploaded": 0,
+            "queued": 0,
+            "channels": {channel.label: {"queued": 0, "uploaded": 0} for channel in self.channels},
+        }
+        self._started = self._last_tick = time.monotonic()
+        self._lock = threading.Lock()
+
+    def stop(self, *_):
+        # Signal handler: the current batch finishes its uploads in flight, then the daemon exits
+        if not self.stop_event.is_set():
+            print("Stopping: finishing the uploads in flight...")
+        self.stop_event.set()
+        self.set_state(status="stopping")
+
+    def set_state(self, **values):
+        with self._lock:
+            self.state.update(values)
+
+    def health(self):
+        # Healthy while the loop keeps ticking; a batch can take minutes, so that counts as alive
+        with self._lock:
+            state = dict(self.state, uptime_seconds=round(time.monotonic() - self._started))
+            idle_for = time.monotonic() - self._last_tick
+        healthy = state["status"] == "processing" or (state["status"] != "stopping" and idle_for < 60)
+        return healthy, state
+
+    def serve_health(self):
+        daemon = self
+
+        class HealthHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/health"):
+                    self.send_error(404)
+                    return
+                healthy, state = daemon.health()
+                body = json.dumps(state).encode()
+                self.send_response(200 if healthy else 503)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Docker's HEALTHCHECK would fill the log
+
+        self.server = ThreadingHTTPServer(("", self.port), HealthHandler)
+        threading.Thread(target=self.server.serve_forever, name="health", daemon=True).start()
+        print(f"Health endpoint on port {self.server.server_address[1]}.")
+
+    def run(self):
+        for channel in self.channels:
+            os.makedirs(channel.videos, exist_ok=True)
+        if self.port:
+            self.serve_health()
+        for channel in self.channels:
+            if channel.label not in self.watchers:
+                self.watchers[channel.label] = FolderWatcher(channel.videos)
+        try:
+            # Authenticated once per channel; the credentials refresh their access token themselves
+            for channel in self.channels:
+                self.services[channel.label] = channel.youtube()
+            self.set_state(status="idle")
+            print(f"Watching {', '.join(channel.videos + '/' for channel in self.channels)} for new videos.")
+            next_rescan = next_verify = 0
+            while not self.stop_event.is_set():
+                self._last_tick = time.monotonic()
+                if time.monotonic() >= next_rescan:
+                    # Whatever is already queued: videos from before the start, failures, quota carry-over
+                    for channel in self.channels:
+                        self.watchers[channel.label].add(channel.queued_videos())
+                    next_rescan = time.monotonic() + WATCH_RESCAN_SECONDS
+                if time.monotonic() >= next_verify:
+                    self.verify_pending()
+                    next_verify = time.monotonic() + WATCH_VERIFY_SECONDS
+                self.poll(1)
+                if self.schedule.queued() and not self.stop_event.is_set():
+                    self.collect_batch()
+                    # One turn, then back to the watchers: new arrivals of every channel join the rotation
+                    self.process(*self.schedule.next_turn())
+        finally:
+            self.shutdown()
+
+    def poll(self, timeout):
+        # Up to `timeout` seconds in total, shared by the channels' watchers
+        for channel in self.channels:
+            self.enqueue(channel, self.watchers[channel.label].wait(timeout / len(self.channels)))
+
+    def enqueue(self, channel, names):
+        self.schedule.add(channel, names)
+        self.update_queued()
+
+    def update_queued(self):
+        with self._lock:
+            self.state["queued"] = self.schedule.queued()
+            for channel in self.channels:
+                self.state["channels"][channel.label]["queued"] = self.schedule.queued(channel)
+
+    def collect_batch(self):
+        # A burst of downloads becomes one batch (one run report, one slot plan)
+        deadline = time.monotonic() + WATCH_BATCH_SECONDS
+        while not self.stop_event.is_set() and time.monotonic() < deadline:
+            self.poll(max(0, min(1, deadline - time.monotonic())))
+
+    def process(self, channel, names):
+        prefix = f"[{channel.label}] " if channel.name else ""
+        videos = sorted(name for name in names if os.path.exists(os.path.join(channel.videos, name)))
+        self.update_queued()
+        if not videos:
+            return
+        if not channels.has_quota(channel):
+            # Picked up again by the rescan
+            print(f"{prefix}{len(videos) + len(self.schedule.drop(channel))} new videos wait for tomorrow's quota.")
+            self.update_queued()
+            return
+        print(f"{prefix}Processing {len(videos)} new videos: {', '.join(videos)}")
+        self.set_state(status="processing")
+        try:
+            with channel.activate():
+                # Uploads YouTube is still processing are left to verify_pending, not waited for
+                processed = upload_vids.upload_batch(self.services[channel.label], videos, keep_warm=True,
+                                                     stop_event=self.stop_event, verify_timeout=0)
+        except Exception as e:
+            # The daemon keeps running; the videos are still in the folder and the rescan retries them
+            print(f"{prefix}Batch failed: {e}")
+            self.set_state(last_error=f"{now_iso()} {prefix}{type(e).__name__}: {e}")
+            processed = []
+        with self._lock:
+            self.state["uploaded"] += len(processed)
+            self.state["channels"][channel.label]["uploaded"] += len(processed)
+            self.state.update(last_batch_at=now_iso(), last_batch={"videos": len(videos), "uploaded": len(processed)})
+        if not self.stop_event.is_set():
+            self.set_state(status="idle")
+
+    def verify_pending(self):
+        # One status check per channel of the uploads still processing; the files of the finished ones go
+        for channel in self.channels:
+            prefix = f"[{channel.label}] " if channel.name else ""
+            try:
+                with channel.activate():
+                    upload_vids.verify_pending(self.services[channel.label], self.stop_event)
+            except Exception as e:
+                print(f"{prefix}Could not check the uploads: {e}")
+
+    def shutdown(self):
+        self.set_state(status="stopping")
+        for watcher in self.watchers.values():
+            watcher.close()
+        upload_vids.release_warm_models()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        print("Watch daemon stopped.")
+
+def now_iso():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+
+def main():
+    daemon = WatchDaemon(channel_list=channels.load_channels())
+    signal.signal(signal.SIGTERM, daemon.stop)  # docker stop
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run()
+
+if __name__ == "__main__":
+    main()
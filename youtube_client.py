@@ -0,0 +1,215 @@
+import contextlib
+import datetime
+import json
+import os
+import queue
+import threading
+import weakref
+
+# Configuration
+CLIENT_SECRETS_FILE = "client_secrets.json"
+TOKEN_FILE = os.environ.get("YOUTUBE_TOKEN_FILE", "token.json")
+UPLOAD_SCOPE = "https://www.googleapis.com/auth/youtube.upload"
+READONLY_SCOPE = "https://www.googleapis.com/auth/youtube.readonly"  # videos.list, to verify uploads
+SCOPES = [UPLOAD_SCOPE, READONLY_SCOPE]
+# Optional copy of the YouTube discovery document; without it the one bundled with google-api-python-client is used.
+# Either way the service is built without fetching anything over the network.
+DISCOVERY_FILE = os.environ.get("YOUTUBE_DISCOVERY_FILE", "")
+# The access token is refreshed this long before it expires, so a long upload never runs into an expired token
+TOKEN_REFRESH_MARGIN = int(os.environ.get("YOUTUBE_TOKEN_REFRESH_MARGIN", "300"))
+HTTP_TIMEOUT = int(os.environ.get("YOUTUBE_HTTP_TIMEOUT", "120"))
+
+def login(scopes=None, token_file=None):
+    # Browser consent flow; the refresh token in token.json is what every later run uses.
+    # With several channels, each one logs in with its own Google account into its own token file.
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_FILE, scopes or SCOPES)
+    creds = flow.run_local_server(port=0)
+    save_credentials(creds, token_file)
+    return creds
+
+def save_credentials(creds, token_file=None):
+    with open(token_file or TOKEN_FILE, 'w') as token:
+        token.write(creds.to_json())
+
+def load_credentials(scopes=None, token_file=None):
+    # token.json if it is usable, refreshed if it expired, a new login otherwise
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+
+    token_file = token_file or TOKEN_FILE
+    creds = None
+    if os.path.exists(token_file):
+        # With the scopes it was granted: asking a refresh for more would fail
+        creds = Credentials.from_authorized_user_file(token_file)
+    if creds and creds.valid:
+        return warn_missing_scopes(creds, scopes, token_file)
+    if creds and creds.expired and creds.refresh_token:
+        print("Refreshing access token...")
+        creds.refresh(Request())
+        save_credentials(creds, token_file)
+        return warn_missing_scopes(creds, scopes, token_file)
+    print("Fetching new tokens...")
+    return login(scopes, token_file)
+
+def warn_missing_scopes(creds, scopes=None, token_file=None):
+    if not creds.has_scopes(scopes or SCOPES):
+        print(f"{token_file or TOKEN_FILE} was created without the youtube.readonly scope: uploads are not verified "
+              "until get_auth_token.py is run again.")
+    return creds
+
+def can_verify(youtube):
+    # Checking the processing status needs a user login with youtube.readonly (tokens of older versions lack it)
+    from google.oauth2.credentials import Credentials
+
+    client = client_for(youtube)
+    creds = client.credentials if client else None
+    return isinstance(creds, Credentials) and creds.has_scopes([READONLY_SCOPE])
+
+_discovery = None
+_discovery_lock = threading.Lock()
+
+def discovery_document():
+    # Parsed once per process
+    global _discovery
+    with _discovery_lock:
+        if _discovery is None:
+            if DISCOVERY_FILE and os.path.exists(DISCOVERY_FILE):
+                with open(DISCOVERY_FILE, encoding="utf-8") as f:
+                    _discovery = json.load(f)
+            else:
+                from googleapiclient.discovery_cache import get_static_doc
+                _discovery = json.loads(get_static_doc("youtube", "v3"))
+        return _discovery
+
+def authorized_http(credentials):
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+
+    return AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+
+class ConnectionPool:
+    # Keep-alive connections sharing one set of credentials. httplib2 connections are not thread-safe, so each
+    # one is lent to a single thread at a time and comes back afterwards, outliving the worker threads.
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self._idle = queue.LifoQueue()  # the most recently used connection is the most likely to still be open
+        self._lock = threading.Lock()
+        self.created = 0
+
+    @contextlib.contextmanager
+    def connection(self):
+        try:
+            http = self._idle.get_nowait()
+        except queue.Empty:
+            http = authorized_http(self.credentials)
+            with self._lock:
+                self.created += 1
+        try:
+            yield http
+        finally:
+            self._idle.put(http)
+
+_pools = weakref.WeakKeyDictionary()
+_pools_lock = threading.Lock()
+
+def connection_pool(credentials):
+    # One pool per set of credentials
+    with _pools_lock:
+        pool = _pools.get(credentials)
+        if pool is None:
+            pool = _pools[credentials] = ConnectionPool(credentials)
+        return pool
+
+_service_clients = weakref.WeakKeyDictionary()
+
+def client_for(service):
+    # The YouTubeClient a service was built by (None for services built elsewhere, e.g. test doubles)
+    try:
+        return _service_clients.get(service)
+    except TypeError:
+        return None  # not weak-referenceable
+
+class YouTubeClient:
+    # One set of credentials for the whole process, with a service for single calls and a pool of connections
+    # for the upload workers. A background thread refreshes the access token ahead of its expiry.
+    # `discovery` replaces the discovery document (the benchmark points it at a local stand-in).
+    def __init__(self, credentials, refresh_margin=None, token_file=None, discovery=None):
+        self.credentials = credentials
+        self.token_file = token_file or TOKEN_FILE
+        self.discovery = discovery
+        self.refresh_margin = TOKEN_REFRESH_MARGIN if refresh_margin is None else refresh_margin
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+        self._service = None
+        self._service_lock = threading.Lock()
+
+    @property
+    def service(self):
+        # Built once from the local discovery document
+        from googleapiclient.discovery import build_from_document
+
+        with self._service_lock:
+            if self._service is None:
+                self._service = build_from_document(self.discovery or discovery_document(),
+                                                    http=authorized_http(self.credentials))
+                _service_clients[self._service] = self
+            return self._service
+
+    def connection(self):
+        return connection_pool(self.credentials).connection()
+
+    def seconds_until_refresh(self):
+        expiry = getattr(self.credentials, 'expiry', None)  # naive UTC, like google-auth
+        if expiry is None:
+            return None  # never expires (or not known yet)
+        left = (expiry - datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)).total_seconds()
+        return max(0, left - self.refresh_margin)
+
+    def refresh(self):
+        from google.auth.transport.requests import Request
+
+        with self._refresh_lock:
+            self.credentials.refresh(Request())
+            save_credentials(self.credentials, self.token_file)
+
+    def start_refresher(self):
+        if self._refresher is None and getattr(self.credentials, 'refresh_token', None):
+            self._refresher = threading.Thread(target=self._refresh_loop, name="token-refresh", daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            wait = self.seconds_until_refresh()
+            if self._stop.wait(self.refresh_margin if wait is None else wait):
+                return
+            if self.seconds_until_refresh() not in (None, 0):
+                continue  # refreshed by a request in the meantime
+            try:
+                self.refresh()
+                print("Refreshed the YouTube access token.")
+            except Exception as e:
+                # Requests still refresh on a 401 themselves; try again in a minute
+                print(f"Could not refresh the YouTube access token: {e}")
+                if self._stop.wait(60):
+                    return
+
+    def close(self):
+        self._stop.set()
+
+_clients = {}
+_client_lock = threading.Lock()
+
+def get_client(token_file=None):
+    # Process-wide client per token file (one per channel): every batch and upload worker of that channel shares
+    # the credentials, the token refresh and the connections
+    token_file = token_file or TOKEN_FILE
+    with _client_lock:
+        client = _clients.get(token_file)
+        if client is None:
+            client = _clients[token_file] = YouTubeClient(load_credentials(token_file=token_file),
+                                                          token_file=token_file)
+            client.start_refresher()
+        return client
@@ -0,0 +1,208 @@
+import datetime
+import json
+import os
+import threading
+import time
+from zoneinfo import ZoneInfo
+
+from googleapiclient.errors import HttpError
+
+# Bytes sent per request. Must be a multiple of 256 KiB; larger chunks mean fewer round trips,
+# smaller ones mean less to resend after a dropped connection.
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE_MB", "8")) * 1024 * 1024
+# videos().insert calls running at the same time
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "2"))
+
+# YouTube Data API quota: every project gets a daily budget that resets at midnight Pacific time
+QUOTA_DAILY_BUDGET = int(os.environ.get("YOUTUBE_QUOTA_BUDGET", "10000"))
+QUOTA_INSERT_COST = 1600  # units per videos.insert
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+QUOTA_ERROR_REASONS = ("quotaExceeded", "dailyLimitExceeded", "uploadLimitExceeded")
+
+# Verification: videos.list takes up to 50 IDs per call (1 quota unit), and one HTTP batch carries up to 1000 calls
+VERIFY_IDS_PER_CALL = 50
+VERIFY_CALLS_PER_BATCH = 1000
+# How long a run waits for YouTube to finish processing its uploads; unfinished ones are checked again next run
+VERIFY_TIMEOUT = int(os.environ.get("VERIFY_TIMEOUT_SECONDS", "600"))
+VERIFY_POLL_DELAY = float(os.environ.get("VERIFY_POLL_SECONDS", "15"))  # doubled after every check
+VERIFY_MAX_POLL_DELAY = 120
+# A video still not listed this long after its upload counts as deleted
+VERIFY_MISSING_AFTER = 24 * 3600
+
+# Processing outcome of an uploaded video
+PROCESSED = "processed"
+REJECTED = "rejected"
+PENDING = "pending"
+MISSING = "missing"  # not listed (yet): deleted, or not visible right after the upload
+
+
+class QuotaExhausted(Exception):
+    pass
+
+
+def quota_day(now=None):
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return now.astimezone(QUOTA_TIMEZONE).date().isoformat()
+
+class QuotaLedger:
+    # Local record of quota units spent per Pacific-time day.
+    # Units are reserved before an insert is issued, so parallel workers never overshoot the budget.
+    def __init__(self, spent=None, save=None, budget=None, now=None):
+        self.budget = QUOTA_DAILY_BUDGET if budget is None else budget
+        self._now = now or (lambda: datetime.datetime.now(datetime.timezone.utc))
+        self._save = save  # called with the {day: units} dict whenever it changes
+        self._lock = threading.Lock()
+        self._exhausted = set()  # days YouTube itself reported as used up
+        today = quota_day(self._now())
+        # Older days do not matter anymore
+        self.spent = {day: units for day, units in (spent or {}).items() if day >= today}
+
+    def remaining(self):
+        with self._lock:
+            return max(0, self.budget - self.spent.get(quota_day(self._now()), 0))
+
+    def reserve(self, units=QUOTA_INSERT_COST):
+        with self._lock:
+            day = quota_day(self._now())
+            if self.spent.get(day, 0) + units > self.budget:
+                return False
+            self.spent[day] = self.spent.get(day, 0) + units
+            self._persist()
+            return True
+
+    def refund(self, units=QUOTA_INSERT_COST):
+        # A reservation that never turned into an insert
+        with self._lock:
+            day = quota_day(self._now())
+            if day in self._exhausted:
+                return
+            self.spent[day] = max(0, self.spent.get(day, 0) - units)
+            self._persist()
+
+    def exhaust(self):
+        # YouTube says the quota is gone (e.g. used by another client): stop for the rest of the day
+        with self._lock:
+            day = quota_day(self._now())
+            self._exhausted.add(day)
+            self.spent[day] = max(self.budget, self.spent.get(day, 0))
+            self._persist()
+
+    def _persist(self):
+        if self._save:
+            self._save(dict(self.spent))
+
+def is_quota_error(error):
+    if not isinstance(error, HttpError) or error.resp.status not in (403, 429):
+        return False
+    try:
+        reasons = [item.get("reason") for item in json.loads(error.content)["error"]["errors"]]
+    except (ValueError, KeyError, TypeError):
+        reasons = []
+    return any(reason in QUOTA_ERROR_REASONS for reason in reasons)
+
+def resume_session(request, session, http=None):
+    # Points `request` at a saved upload session, continuing from what the server actually received: an empty
+    # PUT with "Content-Range: bytes */<size>" answers 308 with the Range it has (or 200/201 when it has it all).
+    # Returns the response of an upload that already completed, None otherwise.
+    resp, content = (http or request.http).request(
+        session["uri"], method="PUT", body=b"",
+        headers={"Content-Length": "0", "Content-Range": f"bytes */{request.resumable.size()}"})
+    if resp.status in (200, 201):
+        return request.postproc(resp, content)
+    if resp.status != 308:
+        raise HttpError(resp, content, uri=session["uri"])
+    request.resumable_uri = session["uri"]
+    request.resumable_progress = int(resp["range"].split("-")[1]) + 1 if "range" in resp else 0
+    return None
+
+def resumable_upload(make_request, session=None, on_progress=None, http=None, quota=None):
+    # make_request() builds a fresh videos().insert request with a resumable MediaFileUpload.
+    # session is {"uri": ..., "offset": ...} saved by on_progress during an earlier, interrupted attempt.
+    # http overrides the request's transport (httplib2 connections must not be shared between threads).
+    request = make_request()
+    if session:
+        print(f"Resuming upload from byte {session['offset']}...")
+
+    response = None
+    while response is None:
+        try:
+            if session:
+                status, response = None, resume_session(request, session, http)
+            else:
+                status, response = request.next_chunk(http=http)
+        except HttpError as e:
+            # Upload sessions expire after about a week; start over if the old one is gone
+            if session and e.resp.status in (404, 410):
+                print("Saved upload session expired, starting from byte 0.")
+                # A new session is a new insert, which costs quota again
+                if quota and not quota.reserve():
+                    raise QuotaExhausted("Daily YouTube quota used up")
+                return resumable_upload(make_request, None, on_progress, http, quota)
+            if is_quota_error(e):
+                if quota:
+                    quota.exhaust()
+                raise QuotaExhausted(f"YouTube rejected the upload: {e}") from e
+            raise
+        session = None
+
+        if response is None and request.resumable_uri:
+            if status:
+                print(f"Uploaded {int(status.progress() * 100)}%")
+            if on_progress:
+                on_progress({"uri": request.resumable_uri, "offset": request.resumable_progress})
+    return response
+
+def processing_status(item):
+    # (outcome, reason) of one videos.list item
+    status = item.get("status", {})
+    upload_status = status.get("uploadStatus")
+    if upload_status == "processed":
+        return PROCESSED, None
+    if upload_status in ("failed", "rejected", "deleted"):
+        return REJECTED, status.get("failureReason") or status.get("rejectionReason") or upload_status
+    details = item.get("processingDetails", {})
+    if details.get("processingStatus") in ("failed", "terminated"):
+        return REJECTED, details.get("processingFailureReason") or details["processingStatus"]
+    return PENDING, None
+
+def fetch_statuses(youtube, video_ids, http=None, quota=None):
+    # Processing outcome of every video: videos.list calls of 50 IDs, sent together in HTTP batches.
+    # Videos whose call failed are left out (and polled again).
+    results = {}
+    calls = [video_ids[i:i + VERIFY_IDS_PER_CALL] for i in range(0, len(video_ids), VERIFY_IDS_PER_CALL)]
+    for first in range(0, len(calls), VERIFY_CALLS_PER_BATCH):
+        group = calls[first:first + VERIFY_CALLS_PER_BATCH]
+        if quota and not quota.reserve(len(group)):
+            raise QuotaExhausted("Daily YouTube quota used up, uploads are verified next run")
+
+        def answered(request_id, response, exception, group=group):
+            if exception is not None:
+                print(f"Could not check the status of {len(group[int(request_id)])} videos: {exception}")
+                return
+            found = {item["id"]: processing_status(item) for item in response.get("items", [])}
+            for video_id in group[int(request_id)]:
+                results[video_id] = found.get(video_id, (MISSING, "not found on the channel"))
+
+        batch = youtube.new_batch_http_request(callback=answered)
+        for index, ids in enumerate(group):
+            batch.add(youtube.videos().list(part="status,processingDetails", id=",".join(ids)), request_id=str(index))
+        batch.execute(http=http)
+    return results
+
+def wait_for_processing(youtube, video_ids, http=None, quota=None, timeout=None, sleep=None, clock=time.monotonic,
+                        stop_event=None):
+    # Polls with backoff until every video is processed or rejected, or the timeout is reached
+    # (timeout=0: a single check). Returns {video_id: (outcome, reason)}; videos never answered for are left out.
+    # Setting stop_event ends the polling between two checks; a sleep that returns True does the same.
+    sleep = sleep or (stop_event.wait if stop_event else time.sleep)
+    deadline = clock() + (VERIFY_TIMEOUT if timeout is None else timeout)
+    delay, statuses, waiting = VERIFY_POLL_DELAY, {}, list(video_ids)
+    while waiting and not (stop_event and stop_event.is_set()):
+        statuses.update(fetch_statuses(youtube, waiting, http, quota))
+        waiting = [video_id for video_id in waiting if statuses.get(video_id, (PENDING,))[0] in (PENDING, MISSING)]
+        if not waiting or clock() + delay > deadline:
+            break
+        if sleep(delay):
+            break
+        delay = min(delay * 2, VERIFY_MAX_POLL_DELAY)
+    return statuses